@@ -13,20 +13,50 @@ cd "$SCRIPT_DIR/$REPONAME"
 BOOST_CI_SRC_FOLDER=$(pwd)
 
 outputlocation="$BOOST_CI_SRC_FOLDER/gcovr"
-rm -rf $outputlocation || true
-mkdir -p $outputlocation
 
-if [[ -f "$BOOST_CI_SRC_FOLDER/coverage_filtered.info" ]]; then
+# Publish-diff mode: render into a staging directory and only replace the
+# files in $outputlocation whose content changed (see scripts/publish_diff.py).
+# Enable with PUBLISH_DIFF=1 ./build.sh
+if [[ "${PUBLISH_DIFF:-0}" == "1" ]]; then
+    renderlocation="$BOOST_CI_SRC_FOLDER/gcovr-staging"
+    # Pin the footer timestamp so identical coverage renders identical pages
+    if [[ -z "${SOURCE_DATE_EPOCH:-}" ]]; then
+        SOURCE_DATE_EPOCH=$(git -C "$BOOST_CI_SRC_FOLDER" log -1 --format=%ct 2>/dev/null || true)
+        [[ -n "$SOURCE_DATE_EPOCH" ]] && export SOURCE_DATE_EPOCH
+    fi
+else
+    renderlocation="$outputlocation"
+fi
+rm -rf $renderlocation || true
+mkdir -p $renderlocation
+
+# Optional badges for every directory and file (badges/<path>/).
+# Enable with NODE_BADGES=1 ./build.sh
+BADGE_ARGS=""
+if [[ "${NODE_BADGES:-0}" == "1" ]]; then
+    BADGE_ARGS="--per-node"
+fi
+
+# Heatmap mode: render from the tracefile of an instrumented bench run and
+# colour lines by hit count (see scripts/build_heatmap.py).
+# Enable with HEATMAP_TRACEFILE=/path/to/bench.info ./build.sh
+if [[ -n "${HEATMAP_TRACEFILE:-}" && ! -f "$HEATMAP_TRACEFILE" ]]; then
+    echo "Error: HEATMAP_TRACEFILE $HEATMAP_TRACEFILE is not a file" >&2
+    exit 1
+fi
+TRACEFILE="${HEATMAP_TRACEFILE:-$BOOST_CI_SRC_FOLDER/coverage_filtered.info}"
+
+if [[ -f "$TRACEFILE" ]]; then
     # Local/macOS workaround: gcovr cannot read .gcda coverage files directly on macOS,
     # so we convert the .info file (from lcov) to Cobertura XML format instead.
     # The .info file contains absolute paths from the original build environment,
     # which we auto-detect and rewrite to match the local machine's paths.
     # Use 'boost-root' as anchor since it's consistently named across all builds
-    ORIGINAL_PATH=$(grep -m1 "^SF:" "$BOOST_CI_SRC_FOLDER/coverage_filtered.info" | sed 's|^SF:||' | sed 's|/boost-root/.*||')
+    ORIGINAL_PATH=$(grep -m1 "^SF:" "$TRACEFILE" | sed 's|^SF:||' | sed 's|/boost-root/.*||')
     TEMP_COVERAGE="/tmp/coverage_local.info"
     TEMP_XML="/tmp/coverage.xml"
 
-    sed "s|$ORIGINAL_PATH|$SCRIPT_DIR|g" "$BOOST_CI_SRC_FOLDER/coverage_filtered.info" > "$TEMP_COVERAGE"
+    sed "s|$ORIGINAL_PATH|$SCRIPT_DIR|g" "$TRACEFILE" > "$TEMP_COVERAGE"
     lcov_cobertura "$TEMP_COVERAGE" -o "$TEMP_XML"
     sed -i.bak "s|filename=\"\.\./boost-root/|filename=\"$SCRIPT_DIR/boost-root/|g" "$TEMP_XML"
 
@@ -37,13 +67,29 @@ if [[ -f "$BOOST_CI_SRC_FOLDER/coverage_filtered.info" ]]; then
         --html-nested \
         --html-template-dir "$SCRIPT_DIR/templates/html" \
         --html-title "$REPONAME" \
-        --output "$outputlocation/index.html"
+        --output "$renderlocation/index.html"
 
     # Generate tree.json for sidebar navigation
-    python3 "$SCRIPT_DIR/scripts/build_tree.py" "$outputlocation"
+    python3 "$SCRIPT_DIR/scripts/build_tree.py" "$renderlocation"
+
+    # Generate the full-text source search index
+    python3 "$SCRIPT_DIR/scripts/build_search_index.py" "$renderlocation"
+
+    # Colour source lines by hit count (heatmap mode only)
+    if [[ -n "${HEATMAP_TRACEFILE:-}" ]]; then
+        python3 "$SCRIPT_DIR/scripts/build_heatmap.py" "$renderlocation" "$HEATMAP_TRACEFILE"
+    fi
+
+    # Generate compact "uncovered only" source pages (optional)
+    if [[ "${COMPACT_PAGES:-0}" == "1" ]]; then
+        python3 "$SCRIPT_DIR/scripts/build_compact_pages.py" "$renderlocation"
+    fi
+
+    # Fold template instantiations on the functions page into one row each
+    python3 "$SCRIPT_DIR/scripts/aggregate_functions.py" "$renderlocation"
 
     # Generate coverage badges
-    python3 "$SCRIPT_DIR/scripts/generate_badges.py" "$outputlocation"
+    python3 "$SCRIPT_DIR/scripts/generate_badges.py" "$renderlocation" $BADGE_ARGS
 else
     # CI/Linux: gcovr reads coverage data directly
     cd ../boost-root
@@ -57,13 +103,110 @@ else
         --exclude '.*/extra/.*' \
         --filter "$GCOVRFILTER" \
         --html \
-        --output "$outputlocation/index.html" \
+        --output "$renderlocation/index.html" \
         --json-summary-pretty \
-        --json-summary "$outputlocation/summary.json"
+        --json-summary "$renderlocation/summary.json"
 
     # Generate tree.json for sidebar navigation
-    python3 "../scripts/build_tree.py" "$outputlocation"
+    python3 "../scripts/build_tree.py" "$renderlocation"
+
+    # Generate the full-text source search index
+    python3 "../scripts/build_search_index.py" "$renderlocation"
+
+    # Generate compact "uncovered only" source pages (optional)
+    if [[ "${COMPACT_PAGES:-0}" == "1" ]]; then
+        python3 "../scripts/build_compact_pages.py" "$renderlocation"
+    fi
+
+    # Fold template instantiations on the functions page into one row each
+    python3 "../scripts/aggregate_functions.py" "$renderlocation"
 
     # Generate coverage badges
-    python3 "../scripts/generate_badges.py" "$outputlocation" --json "$outputlocation/summary.json"
+    python3 "../scripts/generate_badges.py" "$renderlocation" --json "$renderlocation/summary.json" $BADGE_ARGS
+fi
+
+# Function hotspots ranked by the call counts in the lcov tracefile
+for tracefile in "${HEATMAP_TRACEFILE:-}" "$BOOST_CI_SRC_FOLDER/coverage_filtered.info" "$BOOST_CI_SRC_FOLDER/coverage.info"; do
+    if [[ -f "$tracefile" ]]; then
+        REPORT_TRACEFILE="$tracefile"
+        python3 "$SCRIPT_DIR/scripts/build_hotspots.py" "$renderlocation" "$tracefile"
+        break
+    fi
+done
+
+# Optional indexed store for scripted queries (see scripts/coverage_query.py).
+# It is not part of the published report, so keep it outside the output directory.
+# Enable with COVERAGE_STORE=/path/to/coverage.store.json ./build.sh
+if [[ -n "${COVERAGE_STORE:-}" && -n "${REPORT_TRACEFILE:-}" ]]; then
+    python3 "$SCRIPT_DIR/scripts/coverage_query.py" build "$REPORT_TRACEFILE" "$COVERAGE_STORE"
+fi
+
+# Optional patch coverage of a PR (see scripts/patch_coverage.py): the
+# report's tracefile is the head, PATCH_BASE the tracefile of the base.
+# Enable with PATCH_BASE=/path/to/base.info PATCH_DIFF=/path/to/pr.diff ./build.sh
+if [[ -n "${PATCH_BASE:-}" && -n "${PATCH_DIFF:-}" && -n "${REPORT_TRACEFILE:-}" ]]; then
+    python3 "$SCRIPT_DIR/scripts/patch_coverage.py" "$renderlocation" "$PATCH_BASE" "$REPORT_TRACEFILE" \
+        --diff "$PATCH_DIFF"
+fi
+
+# Optional per-test line index (see scripts/line_index.py), built from one
+# lcov tracefile per test binary.
+# Enable with TEST_TRACEFILES=/path/to/tracefiles ./build.sh
+if [[ -n "${TEST_TRACEFILES:-}" ]]; then
+    python3 "$SCRIPT_DIR/scripts/line_index.py" build "$TEST_TRACEFILES" "$renderlocation/tests.index.json"
+fi
+
+# Optional coverage history and trend badges (see scripts/coverage_history.py).
+# Enable with HISTORY_DB=/path/to/history.sqlite ./build.sh
+if [[ -n "${HISTORY_DB:-}" ]]; then
+    HISTORY_BRANCH=${HISTORY_BRANCH:-$(git -C "$BOOST_CI_SRC_FOLDER" rev-parse --abbrev-ref HEAD)}
+    HISTORY_COMMIT=$(git -C "$BOOST_CI_SRC_FOLDER" rev-parse HEAD 2>/dev/null || true)
+    python3 "$SCRIPT_DIR/scripts/coverage_history.py" "$renderlocation" \
+        --db "$HISTORY_DB" \
+        --repo "$REPONAME" \
+        --branch "$HISTORY_BRANCH" \
+        ${HISTORY_COMMIT:+--commit "$HISTORY_COMMIT"}
+fi
+
+# Optional per-commit coverage snapshots (see scripts/coverage_snapshots.py).
+# Enable with SNAPSHOT_DB=/path/to/snapshots.sqlite ./build.sh
+if [[ -n "${SNAPSHOT_DB:-}" && -n "${REPORT_TRACEFILE:-}" ]]; then
+    SNAPSHOT_BRANCH=${HISTORY_BRANCH:-$(git -C "$BOOST_CI_SRC_FOLDER" rev-parse --abbrev-ref HEAD)}
+    SNAPSHOT_COMMIT=$(git -C "$BOOST_CI_SRC_FOLDER" rev-parse HEAD 2>/dev/null || true)
+    python3 "$SCRIPT_DIR/scripts/coverage_snapshots.py" record "$SNAPSHOT_DB" "$REPORT_TRACEFILE" \
+        --branch "$SNAPSHOT_BRANCH" \
+        ${SNAPSHOT_COMMIT:+--commit "$SNAPSHOT_COMMIT"}
+fi
+
+# Optional benchmark tracking (see scripts/bench_results.py). A throughput
+# regression fails the build once the report has been published.
+# Enable with BENCH_DB=/path/to/bench.sqlite BENCH_RESULTS=/path/to/results.txt ./build.sh
+BENCH_STATUS=0
+if [[ -n "${BENCH_DB:-}" && -n "${BENCH_RESULTS:-}" ]]; then
+    BENCH_ARGS=(--db "$BENCH_DB")
+    # Per-trial samples written next to results.txt give the noise band
+    BENCH_SAMPLES="$(dirname "$BENCH_RESULTS")/samples.txt"
+    if [[ -f "$BENCH_SAMPLES" ]]; then
+        BENCH_ARGS+=(--samples "$BENCH_SAMPLES")
+    fi
+    if [[ -n "${BENCH_THRESHOLD:-}" ]]; then
+        BENCH_ARGS+=(--threshold "$BENCH_THRESHOLD")
+    fi
+    BENCH_COMMIT=$(git -C "$BOOST_CI_SRC_FOLDER" rev-parse HEAD 2>/dev/null || true)
+    python3 "$SCRIPT_DIR/scripts/bench_results.py" "$renderlocation" "$BENCH_RESULTS" \
+        "${BENCH_ARGS[@]}" ${BENCH_COMMIT:+--commit "$BENCH_COMMIT"} || BENCH_STATUS=$?
+fi
+
+# Optional offline service worker for the published report. Runs after every
+# step that writes to the report, so its version hashes the final files.
+# Enable with SERVICE_WORKER=1 ./build.sh
+if [[ "${SERVICE_WORKER:-0}" == "1" ]]; then
+    python3 "$SCRIPT_DIR/scripts/service_worker.py" "$renderlocation"
+fi
+
+if [[ "$renderlocation" != "$outputlocation" ]]; then
+    python3 "$SCRIPT_DIR/scripts/publish_diff.py" "$renderlocation" "$outputlocation"
+    rm -rf "$renderlocation"
 fi
+
+exit $BENCH_STATUS
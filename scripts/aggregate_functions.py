@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Fold template instantiations on the functions page into one row each.
+
+With --merge-mode-functions separate, gcovr lists every instantiation of a
+function template as its own row, so index.functions.html grows with the
+number of instantiations rather than with the source. Instantiations share
+their definition, so this groups the rows by source location and qualified
+name (template arguments collapsed, return type and parameters dropped) and
+replaces every group of two or more by a single row. Its name is the demangled name
+with the template arguments collapsed (basic_parser<>::parse_value<>(...)),
+its calls the sum over the group, and its line and branch coverage those of
+the best-covered instantiation.
+
+The original rows of a group move to a small fragment that gcovr.js fetches
+the first time the group is expanded. Single functions are left as they are,
+and running the script again changes nothing.
+
+Output (in <gcovr_output_dir>/):
+  index.functions.html       rewritten with one row per source function
+  functions/<key>.html       the instantiation rows of each group
+"""
+
+import hashlib
+import html
+import os
+import re
+import sys
+from collections import Counter
+from pathlib import Path
+
+from build_hotspots import FUNCTIONS_PAGE, template_family
+
+
+INSTANCES_DIR = 'functions'
+
+BODY_RE = re.compile(r'(<div class="functions-body">\n?)(.*?)(\s*</div>\s*</div>\s*</section>)', re.DOTALL)
+ROW_RE = re.compile(r'[ \t]*<div class="function-row"([^>]*)>.*?<div class="col-branches">[^<]*</div>\s*</div>\n?',
+                    re.DOTALL)
+ATTR_RE = re.compile(r'data-(\w+)="([^"]*)"')
+HREF_RE = re.compile(r'<a href="([^"]*)"')
+LOCATION_RE = re.compile(r'<span class="function-location">([^<]*)</span>')
+FUNCTIONS_STAT_RE = re.compile(r'<span class="stat-label">Functions:</span>.*?</div>', re.DOTALL)
+
+
+def parse_rows(body):
+    """Return [(row html, attributes, href, location)] of the functions page body."""
+    rows = []
+    for match in ROW_RE.finditer(body):
+        row = match.group(0)
+        href = HREF_RE.search(row)
+        location = LOCATION_RE.search(row)
+        rows.append((row, dict(ATTR_RE.findall(match.group(1))),
+                     href.group(1) if href else '', location.group(1) if location else ''))
+    return rows
+
+
+def best_coverage(values):
+    """Highest coverage of a group as its original string, or '-' if none is numeric."""
+    best = None
+    for value in values:
+        try:
+            number = float(value)
+        except ValueError:
+            continue
+        if best is None or number > best[0]:
+            best = (number, value)
+    return best[1] if best else '-'
+
+
+def matching_paren(text, i):
+    """Index of the parenthesis closing the one at i (or the end of text)."""
+    parens = 0
+    for j in range(i, len(text)):
+        if text[j] == '(':
+            parens += 1
+        elif text[j] == ')':
+            parens -= 1
+            if parens == 0:
+                return j
+    return len(text)
+
+
+def qualified_name(name):
+    """Template family of a demangled name without return type and parameters.
+
+    void basic_parser<handler>::parse_value<true>(char const*) const
+    becomes basic_parser<>::parse_value<>.
+    """
+    family = template_family(name)
+    start = 0
+    name_span = None
+    depth = 0  # inside {lambda(...)#1}
+    in_operator = False  # spaces of operator new, operator bool, ...
+    i = 0
+    while i < len(family):
+        if depth == 0 and family.startswith('operator', i) and (i == 0 or family[i - 1] in ' :'):
+            in_operator = True
+            if family.startswith('operator()', i):
+                i += len('operator()')
+                continue
+        ch = family[i]
+        if ch == '{':
+            depth += 1
+        elif ch == '}':
+            depth = max(0, depth - 1)
+        elif depth == 0:
+            if ch == '(':
+                # The parameter list is the last parenthesis group; groups
+                # followed by :: belong to the name (f(int)::{lambda()#1}),
+                # earlier ones to the return type (decltype (...))
+                close = matching_paren(family, i)
+                if not family.startswith('::', close + 1):
+                    name_span = (start, i)
+                i = close + 1
+                continue
+            if ch == ' ' and not in_operator:
+                start = i + 1
+        i += 1
+    if name_span is None:
+        return family
+    return family[name_span[0]:name_span[1]] or family
+
+
+def row_group(row):
+    """Rows of one group share their function template; the location separates
+    templates whose names collide."""
+    _, attrs, _, location = row
+    return qualified_name(html.unescape(attrs.get('name', ''))), location
+
+
+def group_key(group):
+    return hashlib.md5('\0'.join(group).encode('utf-8')).hexdigest()[:16]
+
+
+def group_row(rows):
+    """One row standing for all instantiations of a source function."""
+    _, _, href, location = rows[0]
+    key = group_key(row_group(rows[0]))
+    names = Counter(template_family(html.unescape(attrs.get('name', ''))) for _, attrs, _, _ in rows)
+    name = html.escape(names.most_common(1)[0][0])
+
+    counts = [attrs.get('calls', '-') for _, attrs, _, _ in rows]
+    calls = [int(count) for count in counts if count.isdigit()]
+    called = sum(1 for count in calls if count > 0)
+    if not calls:
+        calls_html, calls_attr = '<span class="excluded">excluded</span>', '-'
+    elif sum(calls) == 0:
+        calls_html, calls_attr = '<span class="not-called">not called</span>', '0'
+    else:
+        calls_html, calls_attr = f'<span class="called">{sum(calls)}x</span>', str(sum(calls))
+    lines = best_coverage(attrs.get('lines', '-') for _, attrs, _, _ in rows)
+    branches = best_coverage(attrs.get('branches', '-') for _, attrs, _, _ in rows)
+
+    page = f'{INSTANCES_DIR}/{key}.html'
+    return (
+        f'    <div class="function-row function-group" data-name="{name}" data-calls="{calls_attr}" '
+        f'data-lines="{lines}" data-branches="{branches}" data-instances="{len(rows)}" '
+        f'data-instances-page="{page}">\n'
+        '      <div class="col-function">\n'
+        f'        <a href="{href}">\n'
+        f'          <span class="function-name">{name}</span>\n'
+        f'          <span class="function-location">{location}</span>\n'
+        '        </a>\n'
+        '        <button type="button" class="instances-toggle" aria-expanded="false">'
+        f'{len(rows)} instantiations, {called} called</button>\n'
+        '      </div>\n'
+        f'      <div class="col-calls">{calls_html}</div>\n'
+        f'      <div class="col-lines" title="Best of {len(rows)} instantiations">{lines}%</div>\n'
+        f'      <div class="col-branches" title="Best of {len(rows)} instantiations">{branches}%</div>\n'
+        '      <div class="function-instances" hidden></div>\n'
+        '    </div>\n'
+    ), page
+
+
+def sources_stat(functions, instantiations):
+    return ('\n  </div>\n'
+            '  <div class="summary-stat">\n'
+            '    <span class="stat-label">Source functions:</span>\n'
+            f'    <span class="stat-value">{functions}</span>\n'
+            f'    <span class="stat-detail">({instantiations} instantiations)</span>\n'
+            '  </div>')
+
+
+def aggregate_page(content):
+    """Return (page, {fragment path: html}, row count before, after), or None if nothing to fold."""
+    body = BODY_RE.search(content)
+    if not body:
+        return None
+    rows = parse_rows(body.group(2))
+
+    groups = {}
+    for row in rows:
+        groups.setdefault(row_group(row), []).append(row)
+    if all(len(group) < 2 for group in groups.values()):
+        return None
+
+    out = []
+    fragments = {}
+    for row in rows:
+        group = groups[row_group(row)]
+        if len(group) < 2:
+            out.append(row[0])
+        elif row is group[0]:
+            row_html, page = group_row(group)
+            out.append(row_html)
+            fragments[page] = ''.join(instance for instance, _, _, _ in group)
+
+    page = (content[:body.start()] + body.group(1) + ''.join(out).rstrip('\n') +
+            body.group(3) + content[body.end():])
+    stat = sources_stat(len(groups), len(rows))
+    page = FUNCTIONS_STAT_RE.sub(lambda m: m.group(0)[:-len('</div>')].rstrip() + stat, page, count=1)
+    return page, fragments, len(rows), len(groups)
+
+
+def aggregate_functions(output_dir):
+    """Rewrite the functions page of a report. Returns (rows before, rows after) or None."""
+    output_path = Path(output_dir)
+    page_path = output_path / FUNCTIONS_PAGE
+    try:
+        with open(page_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except OSError as e:
+        print(f"Error reading {page_path}: {e}", file=sys.stderr)
+        return None
+
+    result = aggregate_page(content)
+    if result is None:
+        return None
+    page, fragments, before, after = result
+
+    instances_dir = output_path / INSTANCES_DIR
+    instances_dir.mkdir(exist_ok=True)
+    for stale in instances_dir.glob('*.html'):
+        stale.unlink()
+    for name, fragment in fragments.items():
+        with open(output_path / name, 'w', encoding='utf-8') as f:
+            f.write(fragment)
+    with open(page_path, 'w', encoding='utf-8') as f:
+        f.write(page)
+    return before, after
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: aggregate_functions.py <gcovr_output_dir>", file=sys.stderr)
+        print("  Folds template instantiations on the functions page into one row each.", file=sys.stderr)
+        sys.exit(1)
+
+    output_dir = sys.argv[1]
+    if not os.path.isdir(output_dir):
+        print(f"Error: {output_dir} is not a directory", file=sys.stderr)
+        sys.exit(1)
+
+    size = os.path.getsize(os.path.join(output_dir, FUNCTIONS_PAGE)) \
+        if os.path.isfile(os.path.join(output_dir, FUNCTIONS_PAGE)) else 0
+    result = aggregate_functions(output_dir)
+    if result is None:
+        print("No template instantiations to fold")
+        return
+    before, after = result
+    new_size = os.path.getsize(os.path.join(output_dir, FUNCTIONS_PAGE))
+    print(f"Folded {before} function rows into {after} ({size // 1024} KB -> {new_size // 1024} KB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Build coverage reports and badges for many repositories and branches.
+
+Reads a JSON manifest of (repo, branch, tracefile) entries and runs the
+same pipeline as build.sh for each of them (gcovr, tree.json, search index,
+compact pages, folded functions page, badges, hotspots) in a bounded process
+pool. gcovr, Pygments and the
+pipeline scripts are imported once per worker instead of once per step, so
+each report only pays for the work itself.
+
+Manifest format (paths are relative to the manifest):
+  {
+    "organization": "boostorg",
+    "output": "site",
+    "entries": [
+      {"repo": "json", "branch": "develop", "tracefile": "json/coverage_filtered.info"},
+      {"repo": "capy", "branch": "master", "tracefile": "capy.info", "root": "/src"}
+    ]
+  }
+
+Top-level keys are defaults for every entry. Each report is written to
+<output>/<repo>/<branch>/gcovr with its log next to it. Tracefiles can be
+lcov (.info, converted like build.sh does), Cobertura (.xml) or gcovr JSON
+(.json); the hotspot pages need lcov call counts, so they are only built
+from .info tracefiles. "root" is the directory containing boost-root (default: this
+repository); "filter" is passed to gcovr --filter. "compact_pages",
+"per_node" and "service_worker" turn on the optional steps that build.sh
+enables with COMPACT_PAGES, NODE_BADGES and SERVICE_WORKER.
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+REPO_DIR = SCRIPT_DIR.parent
+TEMPLATE_DIR = REPO_DIR / 'templates' / 'html'
+DEFAULT_JOBS = min(os.cpu_count() or 1, 4)
+STAGES = ('convert', 'gcovr', 'tree', 'search', 'compact', 'fold', 'badges', 'hotspots', 'worker')
+
+
+def warm_imports():
+    """Import the pipeline once per process (pool initializer)."""
+    import gcovr_wrapper
+    gcovr_wrapper.register_ipp_lexer()
+    import gcovr.__main__  # noqa: F401 (heavy: pulls in Jinja and Pygments)
+    import aggregate_functions  # noqa: F401
+    import build_compact_pages  # noqa: F401
+    import build_hotspots  # noqa: F401
+    import build_search_index  # noqa: F401
+    import build_tree  # noqa: F401
+    import generate_badges  # noqa: F401
+    import service_worker  # noqa: F401
+
+
+def load_manifest(manifest_path):
+    """Return the manifest entries with defaults applied and paths resolved."""
+    manifest_path = Path(manifest_path).resolve()
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    base = manifest_path.parent
+    defaults = {k: v for k, v in data.items() if k != 'entries'}
+    entries = []
+    for raw in data.get('entries', []):
+        entry = dict(defaults, **raw)
+        for key in ('repo', 'branch', 'tracefile'):
+            if not entry.get(key):
+                raise ValueError(f"manifest entry {raw} is missing '{key}'")
+        entry['tracefile'] = str(base / entry['tracefile'])
+        entry['root'] = str((base / entry['root']) if entry.get('root') else REPO_DIR)
+        output = base / entry.get('output', 'site')
+        entry['output_dir'] = str(output / entry['repo'] / entry['branch'] / 'gcovr')
+        entries.append(entry)
+    return entries
+
+
+def lcov_to_cobertura(tracefile, root, xml_path):
+    """Convert an lcov tracefile to Cobertura XML, rebased onto root.
+
+    Same steps as the local branch of build.sh: rewrite the build machine's
+    path prefix (up to boost-root) to root, convert, and make the file names
+    absolute again.
+    """
+    from lcov_cobertura import LcovCobertura
+
+    with open(tracefile, 'r', encoding='utf-8') as f:
+        lcov_data = f.read()
+
+    for line in lcov_data.splitlines():
+        if line.startswith('SF:'):
+            original = line[3:].split('/boost-root/')[0]
+            # An empty prefix (SF:/boost-root/...) would be inserted everywhere
+            if original and original != line[3:]:
+                lcov_data = lcov_data.replace(original, root)
+            break
+
+    xml = LcovCobertura(lcov_data, base_dir=root).convert()
+    xml = xml.replace('filename="boost-root/', f'filename="{root}/boost-root/')
+    with open(xml_path, 'w', encoding='utf-8') as f:
+        f.write(xml)
+
+
+def run_entry(entry):
+    """Run the whole pipeline for one manifest entry. Returns a result dict."""
+    from gcovr.__main__ import main as gcovr_main
+    import aggregate_functions
+    import build_compact_pages
+    import build_hotspots
+    import build_search_index
+    import build_tree
+    import generate_badges
+    import service_worker
+
+    output_dir = Path(entry['output_dir'])
+    output_dir.mkdir(parents=True, exist_ok=True)
+    log_path = output_dir.parent / 'build.log'
+    timings = {}
+    result = {
+        'repo': entry['repo'],
+        'branch': entry['branch'],
+        'output': str(output_dir),
+        'log': str(log_path),
+        'timings': timings,
+        'ok': False,
+    }
+
+    @contextlib.contextmanager
+    def stage(name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings[name] = time.perf_counter() - start
+
+    cpu_start = time.process_time()
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+            tracefile = entry['tracefile']
+            summary_path = output_dir / 'summary.json'
+            gcovr_args = [
+                '--root', entry['root'],
+                '--merge-lines',
+                '--html-nested',
+                '--html-template-dir', str(TEMPLATE_DIR),
+                '--html-title', entry['repo'],
+                '--output', str(output_dir / 'index.html'),
+                '--json-summary', str(summary_path),
+            ]
+            if entry.get('filter'):
+                gcovr_args += ['--filter', entry['filter']]
+
+            with stage('convert'):
+                if tracefile.endswith('.json'):
+                    gcovr_args += ['--json-add-tracefile', tracefile]
+                elif tracefile.endswith('.xml'):
+                    gcovr_args += ['--cobertura-add-tracefile', tracefile]
+                else:
+                    xml_path = output_dir.parent / 'coverage.xml'
+                    lcov_to_cobertura(tracefile, entry['root'], xml_path)
+                    gcovr_args += ['--cobertura-add-tracefile', str(xml_path)]
+
+            with stage('gcovr'):
+                # gcovr reports bad arguments and fatal errors with sys.exit()
+                try:
+                    status = gcovr_main(gcovr_args)
+                except SystemExit as e:
+                    status = e.code
+            if status:
+                raise RuntimeError(f"gcovr exited with status {status}")
+
+            with stage('tree'):
+                build_tree.generate_tree(str(output_dir))
+
+            with stage('search'):
+                files, postings = build_search_index.build_postings(str(output_dir))
+                build_search_index.write_index(str(output_dir), files, postings)
+
+            if entry.get('compact_pages'):
+                with stage('compact'):
+                    build_compact_pages.build_compact_pages(str(output_dir))
+
+            with stage('fold'):
+                aggregate_functions.aggregate_functions(str(output_dir))
+
+            with stage('badges'):
+                count = generate_badges.build_badges(
+                    str(output_dir), str(summary_path), entry.get('per_node', False))
+            if count is None:
+                raise RuntimeError("badge generation failed")
+
+            if not tracefile.endswith(('.json', '.xml')):
+                with stage('hotspots'):
+                    build_hotspots.build_hotspots(str(output_dir), tracefile)
+
+            # Last, so the report version covers every file of the report
+            if entry.get('service_worker'):
+                with stage('worker'):
+                    service_worker.generate_service_worker(str(output_dir))
+
+        result['ok'] = True
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    finally:
+        result['cpu'] = time.process_time() - cpu_start
+        result['total'] = sum(timings.values())
+        with open(log_path, 'w', encoding='utf-8') as f:
+            f.write(log.getvalue())
+            if 'error' in result:
+                f.write(f"\nError: {result['error']}\n")
+
+    return result
+
+
+def format_report(results, wall):
+    """Render the combined timing table."""
+    header = f"{'repo/branch':<32}" + ''.join(f"{s:>9}" for s in STAGES) + f"{'total':>9}  status"
+    lines = [header, '-' * len(header)]
+    for r in sorted(results, key=lambda r: (r['repo'], r['branch'])):
+        cells = ''.join(f"{r['timings'][s]:>8.2f}s" if s in r['timings'] else f"{'-':>9}"
+                        for s in STAGES)
+        status = 'ok' if r['ok'] else f"FAILED ({r['log']})"
+        lines.append(f"{r['repo'] + '/' + r['branch']:<32}{cells}{r['total']:>8.2f}s  {status}")
+
+    serial = sum(r['total'] for r in results)
+    lines.append('-' * len(header))
+    lines.append(f"{len(results)} reports in {wall:.2f}s wall time "
+                 f"({serial:.2f}s of pipeline work, {serial / wall if wall else 0:.1f}x parallel)")
+    return '\n'.join(lines)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: batch_build.py <manifest.json> [--jobs <n>] [--report <timings.json>]", file=sys.stderr)
+        print(f"  Builds every report in the manifest, at most n at a time (default {DEFAULT_JOBS}).",
+              file=sys.stderr)
+        sys.exit(1)
+
+    manifest_path = sys.argv[1]
+    jobs = DEFAULT_JOBS
+    report_path = None
+
+    # Check for --jobs argument
+    if '--jobs' in sys.argv:
+        jobs_idx = sys.argv.index('--jobs')
+        if jobs_idx + 1 < len(sys.argv):
+            jobs = max(1, int(sys.argv[jobs_idx + 1]))
+
+    # Check for --report argument
+    if '--report' in sys.argv:
+        report_idx = sys.argv.index('--report')
+        if report_idx + 1 < len(sys.argv):
+            report_path = sys.argv[report_idx + 1]
+
+    try:
+        entries = load_manifest(manifest_path)
+    except (OSError, ValueError) as e:
+        print(f"Error reading manifest {manifest_path}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    for entry in entries:
+        if not os.path.isfile(entry['tracefile']):
+            print(f"Error: {entry['tracefile']} is not a file", file=sys.stderr)
+            sys.exit(1)
+
+    # Import in the parent too: forked workers then start warm, and a
+    # missing dependency fails once here instead of in every worker
+    try:
+        warm_imports()
+    except ImportError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=min(jobs, len(entries) or 1),
+                             initializer=warm_imports) as pool:
+        futures = {pool.submit(run_entry, entry): entry for entry in entries}
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            state = 'done' if result['ok'] else f"failed: {result['error']}"
+            print(f"{result['repo']}/{result['branch']}: {state} ({result['total']:.2f}s)")
+    wall = time.perf_counter() - start
+
+    print()
+    print(format_report(results, wall))
+
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump({'wall': wall, 'jobs': jobs, 'results': results}, f, indent=2)
+        print(f"Wrote timing report to {report_path}")
+
+    if not all(r['ok'] for r in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
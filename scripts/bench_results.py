@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Track json/bench throughput over time and flag regressions.
+
+Every run of the bench program is ingested into an SQLite store: results.txt
+holds one averaged MB/s value per benchmark, and the optional samples.txt
+holds the individual trials, whose spread tells how noisy each benchmark is.
+Benchmarks are stored once in a `series` table and results are keyed by
+(series, run), so the history of a benchmark is one contiguous index range.
+
+The newest run is compared with the one before it (or with --baseline).
+A benchmark counts as a regression when it lost more than --threshold
+percent of its throughput and the loss is also outside its noise band:
+twice the combined relative spread of the trials of both runs, and never
+less than --noise percent.
+
+Output (in <gcovr_output_dir>/):
+  bench.html  comparison page, using index.functions.html as its shell
+  bench.json  the same comparison as data
+
+Exits with status 2 when there is at least one regression.
+"""
+
+import html
+import json
+import math
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+from build_hotspots import ACTIONS_RE, FUNCTIONS_PAGE, TITLE_RE, build_page
+from cli import get_arg
+
+
+BENCH_PAGE = 'bench.html'
+BENCH_JSON = 'bench.json'
+DEFAULT_THRESHOLD = 5.0
+DEFAULT_NOISE = 1.0
+NOISE_SIGMAS = 2
+REGRESSION_EXIT = 2
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    timestamp INTEGER NOT NULL,
+    commit_id TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_by_time ON runs (timestamp);
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    operation TEXT NOT NULL,
+    file TEXT NOT NULL,
+    toolset TEXT NOT NULL,
+    impl TEXT NOT NULL,
+    UNIQUE (operation, file, toolset, impl)
+);
+CREATE TABLE IF NOT EXISTS results (
+    series_id INTEGER NOT NULL REFERENCES series (id),
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    mbs REAL NOT NULL,
+    trials INTEGER NOT NULL,
+    spread REAL,
+    PRIMARY KEY (series_id, run_id)
+) WITHOUT ROWID;
+'''
+
+STATUS_LABELS = {
+    'regression': 'Regression',
+    'slower': 'Slower',
+    'faster': 'Faster',
+    'noise': 'Within noise',
+    'new': 'New',
+}
+
+
+def parse_prefix(fields):
+    """Split the bench print_prefix columns into (operation, file, toolset, impl)."""
+    operation, _, filename = fields[0].partition(' ')
+    return operation, filename, fields[1], fields[2]
+
+
+def read_results(results_path, samples_path=None):
+    """Return {(operation, file, toolset, impl): (mbs, trials, spread)}.
+
+    results.txt rows are operation file,toolset,impl,MB/s; samples.txt rows
+    add the calls and milliseconds of each trial before the MB/s column.
+    Benchmarks the bench program skipped (N/A) are left out.
+    """
+    averages = {}
+    with open(results_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            fields = line.rstrip('\n').split(',')
+            if len(fields) != 4 or fields[3] == 'N/A':
+                continue
+            averages[parse_prefix(fields)] = float(fields[3])
+
+    trials = {}
+    if samples_path:
+        with open(samples_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                fields = line.rstrip('\n').split(',')
+                if len(fields) != 6 or fields[5] == 'N/A':
+                    continue
+                trials.setdefault(parse_prefix(fields), []).append(float(fields[5]))
+
+    results = {}
+    for key, mbs in averages.items():
+        values = trials.get(key, [])
+        results[key] = (mbs, len(values), relative_spread(values))
+    return results
+
+
+def relative_spread(values):
+    """Sample standard deviation of the trials relative to their mean, or None."""
+    if len(values) < 2:
+        return None
+    mean = sum(values) / len(values)
+    if mean <= 0:
+        return None
+    variance = sum((v - mean) ** 2 for v in values) / (len(values) - 1)
+    return math.sqrt(variance) / mean
+
+
+def open_store(db_path):
+    """Open (and create if needed) the benchmark store."""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def series_ids(conn, keys):
+    """Return {key: series id}, adding benchmarks seen for the first time."""
+    ids = {tuple(row[1:]): row[0] for row in conn.execute(
+        'SELECT id, operation, file, toolset, impl FROM series')}
+    for key in keys:
+        if key not in ids:
+            ids[key] = conn.execute(
+                'INSERT INTO series (operation, file, toolset, impl) VALUES (?, ?, ?, ?)',
+                key).lastrowid
+    return ids
+
+
+def run_results(conn, run_id):
+    """Return {key: (mbs, trials, spread)} for one run."""
+    rows = conn.execute(
+        'SELECT operation, file, toolset, impl, mbs, trials, spread FROM results '
+        'JOIN series ON series.id = results.series_id WHERE run_id = ?', (run_id,))
+    return {tuple(row[:4]): (row['mbs'], row['trials'], row['spread']) for row in rows}
+
+
+def latest_runs(conn, limit=2, before=None):
+    """Return the newest runs (newest first), optionally only those older than a run."""
+    if before is None:
+        return conn.execute('SELECT id, timestamp, commit_id FROM runs '
+                            'ORDER BY timestamp DESC, id DESC LIMIT ?', (limit,)).fetchall()
+    return conn.execute('SELECT id, timestamp, commit_id FROM runs '
+                        'WHERE timestamp < ? OR (timestamp = ? AND id < ?) '
+                        'ORDER BY timestamp DESC, id DESC LIMIT ?',
+                        (before['timestamp'], before['timestamp'], before['id'], limit)).fetchall()
+
+
+def record_run(conn, results, commit=None, timestamp=None):
+    """Store a run. Returns its id, or None if it repeats the latest run."""
+    timestamp = int(timestamp if timestamp is not None else time.time())
+    previous = latest_runs(conn, 1)
+    if previous and commit and previous[0]['commit_id'] == commit and \
+            run_results(conn, previous[0]['id']) == results:
+        return None  # same results file ingested again
+
+    with conn:
+        run_id = conn.execute('INSERT INTO runs (timestamp, commit_id) VALUES (?, ?)',
+                              (timestamp, commit)).lastrowid
+        ids = series_ids(conn, results)
+        conn.executemany(
+            'INSERT INTO results (series_id, run_id, mbs, trials, spread) VALUES (?, ?, ?, ?, ?)',
+            [(ids[key], run_id, *value) for key, value in results.items()])
+    return run_id
+
+
+def find_run(conn, ref):
+    """Look up a run by id or (newest run of a) commit."""
+    if ref.isdigit():
+        run = conn.execute('SELECT id, timestamp, commit_id FROM runs WHERE id = ?',
+                           (int(ref),)).fetchone()
+        if run is not None:
+            return run
+    return conn.execute('SELECT id, timestamp, commit_id FROM runs WHERE commit_id = ? '
+                        'ORDER BY timestamp DESC, id DESC LIMIT 1', (ref,)).fetchone()
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD, noise=DEFAULT_NOISE):
+    """Classify every benchmark of the current run against the baseline run."""
+    rows = []
+    for key, (mbs, trials, spread) in sorted(current.items()):
+        row = {
+            'operation': key[0], 'file': key[1], 'toolset': key[2], 'impl': key[3],
+            'mbs': mbs, 'trials': trials, 'baseline': None, 'delta': None, 'band': None,
+        }
+        if key not in baseline or baseline[key][0] <= 0:
+            row['status'] = 'new'
+            rows.append(row)
+            continue
+
+        base_mbs, _, base_spread = baseline[key]
+        delta = (mbs - base_mbs) / base_mbs * 100
+        band = max(noise, NOISE_SIGMAS * math.hypot(spread or 0, base_spread or 0) * 100)
+        if delta < -max(threshold, band):
+            status = 'regression'
+        elif delta < -band:
+            status = 'slower'
+        elif delta > band:
+            status = 'faster'
+        else:
+            status = 'noise'
+        row.update(baseline=base_mbs, delta=delta, band=band, status=status)
+        rows.append(row)
+    return rows
+
+
+def bench_row(row):
+    """One .function-row in the layout of functions_page.content.html."""
+    name = html.escape(f"{row['operation']} {row['file']}")
+    location = html.escape(f"{row['toolset']} · {row['impl']}")
+    status = row['status']
+    if row['delta'] is None:
+        change = '<span class="bench-new">&ndash;</span>'
+        base = ''
+    else:
+        change = (f'<span class="bench-{status}" title="noise band ±{row["band"]:.1f}%">'
+                  f'{row["delta"]:+.1f}%</span>')
+        base = f'<span class="bench-baseline">was {row["baseline"]:g}</span>'
+    return (f'    <div class="function-row" data-name="{name} {location}" data-mbs="{row["mbs"]:g}" '
+            f'data-delta="{row["delta"] if row["delta"] is not None else ""}" data-status="{status}">\n'
+            f'      <div class="col-function"><span class="function-name">{name}</span>'
+            f'<span class="function-location">{location}</span></div>\n'
+            f'      <div class="col-calls">{row["mbs"]:g} MB/s{base}</div>\n'
+            f'      <div class="col-lines">{change}</div>\n'
+            f'      <div class="col-branches"><span class="bench-{status}">{STATUS_LABELS[status]}</span></div>\n'
+            f'    </div>\n')
+
+
+def bench_table(rows):
+    """A functions-container with sortable headers around the benchmark rows."""
+    return ('\n<div class="functions-container">\n'
+            '  <div class="functions-header">\n'
+            '    <div class="col-function sortable" data-sort="name">Benchmark</div>\n'
+            '    <div class="col-calls sortable" data-sort="mbs">MB/s</div>\n'
+            '    <div class="col-lines sortable sorted-ascending" data-sort="delta">Change</div>\n'
+            '    <div class="col-branches sortable" data-sort="status">Status</div>\n'
+            '  </div>\n\n'
+            '  <div class="functions-body">\n'
+            + ''.join(bench_row(row) for row in rows) +
+            '  </div>\n'
+            '</div>')
+
+
+def summary_html(rows, current, baseline, threshold):
+    """Inline summary in the style of functions_page.summary.html."""
+    def run_label(run):
+        stamp = time.strftime('%Y-%m-%d %H:%M', time.gmtime(run['timestamp']))
+        return f"{html.escape(run['commit_id'][:10])} ({stamp})" if run['commit_id'] else stamp
+
+    counts = {status: sum(1 for row in rows if row['status'] == status) for status in STATUS_LABELS}
+    stats = [('Run:', run_label(current), ''),
+             ('Baseline:', run_label(baseline) if baseline is not None else 'none', ''),
+             ('Regressions:', str(counts['regression']), f'(&gt; {threshold:g}% slower)'),
+             ('Slower:', str(counts['slower']), ''),
+             ('Faster:', str(counts['faster']), '')]
+    parts = ['\n<div class="summary-inline">\n']
+    for label, value, detail in stats:
+        parts.append('  <div class="summary-stat">\n'
+                     f'    <span class="stat-label">{label}</span>\n'
+                     f'    <span class="stat-value">{value}</span>\n')
+        if detail:
+            parts.append(f'    <span class="stat-detail">{detail}</span>\n')
+        parts.append('  </div>\n')
+    parts.append('</div>')
+    return ''.join(parts)
+
+
+def write_page(output_dir, rows, current, baseline, threshold):
+    """Write bench.html. Returns False if there is no functions page to use as shell."""
+    output_path = Path(output_dir)
+    try:
+        with open(output_path / FUNCTIONS_PAGE, 'r', encoding='utf-8') as f:
+            shell = f.read()
+    except OSError as e:
+        print(f"Error reading {FUNCTIONS_PAGE}, skipping HTML output: {e}", file=sys.stderr)
+        return False
+
+    head = TITLE_RE.search(shell)
+    report = head.group(0)[len('<title>'):-len('</title>')].split(' - ', 1)[-1] if head else ''
+    # Worst changes first; new benchmarks at the end
+    rows = sorted(rows, key=lambda row: (row['delta'] is None, row['delta'] or 0))
+    actions = f'\n            <a class="btn btn-sm" href="{FUNCTIONS_PAGE}">All functions</a>'
+    page = build_page(shell, f'Benchmarks - {report}', actions,
+                      summary_html(rows, current, baseline, threshold), bench_table(rows),
+                      label='Benchmarks')
+    with open(output_path / BENCH_PAGE, 'w', encoding='utf-8') as f:
+        f.write(page)
+
+    # Link the comparison from the regular functions page
+    link = f'<a class="btn btn-sm" href="{BENCH_PAGE}">Benchmarks</a>'
+    if link not in shell:
+        shell = ACTIONS_RE.sub(lambda m: m.group(1) + '\n            ' + link + m.group(2) + m.group(3),
+                               shell, count=1)
+        with open(output_path / FUNCTIONS_PAGE, 'w', encoding='utf-8') as f:
+            f.write(shell)
+    return True
+
+
+def write_json(output_dir, rows, current, baseline, threshold):
+    """Write the comparison to bench.json."""
+    def run_dict(run):
+        return {'id': run['id'], 'timestamp': run['timestamp'], 'commit': run['commit_id']}
+
+    data = {
+        'run': run_dict(current),
+        'baseline': run_dict(baseline) if baseline is not None else None,
+        'threshold': threshold,
+        'benchmarks': rows,
+    }
+    with open(Path(output_dir) / BENCH_JSON, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1)
+
+
+def main():
+    if len(sys.argv) < 3 or '--db' not in sys.argv:
+        print("Usage: bench_results.py <gcovr_output_dir> <results.txt> --db <bench.sqlite>", file=sys.stderr)
+        print("         [--samples <samples.txt>] [--commit <sha>] [--timestamp <epoch>]", file=sys.stderr)
+        print("         [--baseline <run id|commit>] [--threshold <pct>] [--noise <pct>]", file=sys.stderr)
+        print("  Stores a bench run and compares it with the previous one.", file=sys.stderr)
+        sys.exit(1)
+
+    output_dir = sys.argv[1]
+    results_path = sys.argv[2]
+    db_path = get_arg('--db')
+    samples_path = get_arg('--samples')
+    commit = get_arg('--commit')
+    timestamp = get_arg('--timestamp', os.environ.get('SOURCE_DATE_EPOCH'))
+    baseline_ref = get_arg('--baseline')
+    threshold = float(get_arg('--threshold', DEFAULT_THRESHOLD))
+    noise = float(get_arg('--noise', DEFAULT_NOISE))
+
+    if not os.path.isdir(output_dir):
+        print(f"Error: {output_dir} is not a directory", file=sys.stderr)
+        sys.exit(1)
+    try:
+        results = read_results(results_path, samples_path)
+    except (OSError, ValueError) as e:
+        print(f"Error reading bench results: {e}", file=sys.stderr)
+        sys.exit(1)
+    if not results:
+        print(f"Error: no benchmark results in {results_path}", file=sys.stderr)
+        sys.exit(1)
+
+    conn = open_store(db_path)
+    try:
+        run_id = record_run(conn, results, commit, timestamp)
+        if run_id is None:
+            print(f"Results for {commit} already recorded, comparing the stored run")
+        current = latest_runs(conn, 1)[0] if run_id is None else find_run(conn, str(run_id))
+
+        if baseline_ref:
+            baseline = find_run(conn, baseline_ref)
+            if baseline is None:
+                print(f"Error: no run {baseline_ref} in {db_path}", file=sys.stderr)
+                sys.exit(1)
+        else:
+            older = latest_runs(conn, 1, before=current)
+            baseline = older[0] if older else None
+
+        rows = compare(run_results(conn, current['id']),
+                       run_results(conn, baseline['id']) if baseline is not None else {},
+                       threshold, noise)
+    finally:
+        conn.close()
+
+    write_json(output_dir, rows, current, baseline, threshold)
+    if write_page(output_dir, rows, current, baseline, threshold):
+        print(f"Generated {BENCH_PAGE}")
+
+    regressions = [row for row in rows if row['status'] == 'regression']
+    if baseline is None:
+        print(f"Recorded {len(rows)} benchmarks; no earlier run to compare with")
+        return
+    print(f"Compared {len(rows)} benchmarks with run {baseline['id']}: "
+          f"{len(regressions)} regressions beyond {threshold:g}%")
+    for row in regressions:
+        print(f"  {row['operation']} {row['file']} [{row['toolset']}, {row['impl']}]: "
+              f"{row['baseline']:g} -> {row['mbs']:g} MB/s ({row['delta']:+.1f}%)", file=sys.stderr)
+    if regressions:
+        sys.exit(REGRESSION_EXIT)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Build compact "uncovered only" variants of the gcovr source pages.
+
+For every source page index.<name>.html this writes index.<name>.compact.html
+containing only uncovered and partially covered lines plus a few lines of
+context. Runs of other lines are replaced by a single gap row; gcovr.js
+expands a gap by fetching the matching rows from the full page.
+
+The "Uncovered only" button of a source page is rendered hidden and only
+shown on the pages that got a compact variant.
+"""
+
+import os
+import re
+import sys
+from pathlib import Path
+
+
+COMPACT_SUFFIX = '.compact.html'
+DEFAULT_CONTEXT = 3
+
+ROW_RE = re.compile(r'[ \t]*<tr class="source-line([^"]*)">.*?</tr>\n?', re.DOTALL)
+LINENO_RE = re.compile(r'<a id="(?:[^"]*\|)?l(\d+)"')
+TBODY_RE = re.compile(r'(<tbody>\n?)(.*?)([ \t]*</tbody>)', re.DOTALL)
+TABLE_RE = re.compile(r'<table class="source-table([^"]*)">')
+HEADER_CELL_RE = re.compile(r'<th\b')
+COMPACT_LINK_RE = re.compile(
+    r'<a class="btn btn-sm compact-toggle" href="[^"]*"[^>]*>[^<]*</a>'
+)
+KEEP_CLASSES = ('uncoveredLine', 'partialCoveredLine')
+
+
+def gap_row(first, last, colspan):
+    """Placeholder row for the hidden lines first..last (inclusive)."""
+    count = last - first + 1
+    noun = 'line' if count == 1 else 'lines'
+    return (f'        <tr class="gap-row" data-from="{first}" data-to="{last}">'
+            f'<td colspan="{colspan}"><button type="button" class="gap-expand">'
+            f'&#8943; {count} {noun} without uncovered code</button></td></tr>\n')
+
+
+def compact_rows(rows, context, colspan):
+    """Keep rows near uncovered/partial lines and collapse the rest into gaps."""
+    keep = [False] * len(rows)
+    for i, (classes, _lineno, _html) in enumerate(rows):
+        if any(cls in classes.split() for cls in KEEP_CLASSES):
+            for j in range(max(0, i - context), min(len(rows), i + context + 1)):
+                keep[j] = True
+
+    out = []
+    gap_start = None
+    for i, (_classes, lineno, row_html) in enumerate(rows):
+        if keep[i]:
+            if gap_start is not None:
+                out.append(gap_row(rows[gap_start][1], rows[i - 1][1], colspan))
+                gap_start = None
+            out.append(row_html)
+        elif gap_start is None:
+            gap_start = i
+    if gap_start is not None:
+        out.append(gap_row(rows[gap_start][1], rows[-1][1], colspan))
+    return ''.join(out)
+
+
+def build_compact_page(content, full_name, context):
+    """Return the compact variant of a source page, or None if not a source page."""
+    tbody = TBODY_RE.search(content)
+    if not tbody or not TABLE_RE.search(content):
+        return None
+
+    rows = []
+    for match in ROW_RE.finditer(tbody.group(2)):
+        lineno = LINENO_RE.search(match.group(0))
+        if lineno:
+            rows.append((match.group(1), int(lineno.group(1)), match.group(0)))
+    if not rows:
+        return None
+
+    thead = content[:tbody.start()]
+    colspan = len(HEADER_CELL_RE.findall(thead[thead.rfind('<thead>'):])) or 1
+
+    body = compact_rows(rows, context, colspan)
+    compact = (content[:tbody.start()] + tbody.group(1) + body +
+               tbody.group(3) + content[tbody.end():])
+
+    # Point the table at the full page (used to expand gaps) and turn the
+    # "Uncovered only" button into a link back to the full file
+    compact = TABLE_RE.sub(
+        lambda m: f'<table class="source-table{m.group(1)} compact" data-full-page="{full_name}">',
+        compact, count=1)
+    compact = COMPACT_LINK_RE.sub(
+        f'<a class="btn btn-sm compact-toggle" href="{full_name}" '
+        f'title="Show all lines">Full file</a>', compact, count=1)
+    return compact
+
+
+def show_compact_link(content):
+    """Unhide the "Uncovered only" button of a full page."""
+    return COMPACT_LINK_RE.sub(lambda m: m.group(0).replace(' hidden>', '>', 1), content, count=1)
+
+
+def build_compact_pages(output_dir, context=DEFAULT_CONTEXT):
+    """Write a compact page next to every source page. Returns (count, saved bytes)."""
+    count = 0
+    saved = 0
+    for html_file in sorted(Path(output_dir).glob('index.*.html')):
+        if html_file.name.endswith(COMPACT_SUFFIX):
+            continue
+        try:
+            with open(html_file, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except Exception as e:
+            print(f"Error reading {html_file}: {e}", file=sys.stderr)
+            continue
+
+        compact = build_compact_page(content, html_file.name, context)
+        if compact is None:
+            continue
+
+        compact_path = html_file.with_name(html_file.name[:-len('.html')] + COMPACT_SUFFIX)
+        with open(compact_path, 'w', encoding='utf-8') as f:
+            f.write(compact)
+        shown = show_compact_link(content)
+        if shown != content:
+            with open(html_file, 'w', encoding='utf-8') as f:
+                f.write(shown)
+        count += 1
+        saved += len(content) - len(compact)
+    return count, saved
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: build_compact_pages.py <gcovr_output_dir> [--context <lines>]", file=sys.stderr)
+        sys.exit(1)
+
+    output_dir = sys.argv[1]
+    context = DEFAULT_CONTEXT
+
+    # Check for --context argument
+    if '--context' in sys.argv:
+        context_idx = sys.argv.index('--context')
+        if context_idx + 1 < len(sys.argv):
+            context = int(sys.argv[context_idx + 1])
+
+    if not os.path.isdir(output_dir):
+        print(f"Error: {output_dir} is not a directory", file=sys.stderr)
+        sys.exit(1)
+
+    count, saved = build_compact_pages(output_dir, context)
+    print(f"Generated {count} compact source pages ({saved / 1e6:.1f} MB smaller than full pages)")
+
+
+if __name__ == '__main__':
+    main()
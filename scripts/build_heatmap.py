@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Turn the source pages of a gcovr report into a line hit-count heatmap.
+
+Meant for reports rendered from an instrumented benchmark run (json/bench),
+where the hit counts are a line-level execution profile. The Hits cell of
+every executed line gets a heat class on a logarithmic scale shared by all
+files, replacing the covered/uncovered colouring of that cell, and each
+source page gets a "Hottest lines" summary above the source table.
+
+Counts are taken from the tracefile (DA records). Run this before
+build_compact_pages.py so the compact pages inherit the heat colours.
+"""
+
+import math
+import os
+import re
+import sys
+
+from build_compact_pages import LINENO_RE, ROW_RE
+from tracefile import find_source_page, iter_records, source_page_map
+
+
+HEAT_LEVELS = 10
+DEFAULT_TOP = 10
+
+TABLE_RE = re.compile(r'<table class="source-table([^"]*)">')
+COUNT_CELL_RE = re.compile(r'<td class="col-count([^"]*)"')
+SOURCE_CELL_RE = re.compile(r'<td class="col-source">(.*?)</td>', re.DOTALL)
+TABLE_CONTAINER = '<div class="source-table-container">'
+TAG_RE = re.compile(r'<[^>]+>')
+
+
+def collect_line_counts(tracefile, pages):
+    """Return {source page: {line: hits}} for every page the tracefile covers."""
+    counts = {}
+    for record in iter_records(tracefile):
+        page = find_source_page(pages, record['path'])
+        if page is None:
+            continue
+        page_counts = counts.setdefault(page, {})
+        for lineno, hits in record['lines'].items():
+            page_counts[lineno] = page_counts.get(lineno, 0) + hits
+    return counts
+
+
+def heat_level(hits, log_max):
+    """Bucket 0..HEAT_LEVELS-1 of log(1 + hits) relative to the hottest line."""
+    if log_max <= 0:
+        return HEAT_LEVELS - 1
+    return min(HEAT_LEVELS - 1, int(math.log1p(hits) / log_max * HEAT_LEVELS))
+
+
+def hot_lines_html(hottest, sources):
+    """The per-file "Hottest lines" summary."""
+    items = []
+    for lineno, hits in hottest:
+        snippet = TAG_RE.sub('', sources.get(lineno, '')).strip()
+        items.append(f'      <li><a href="#l{lineno}">Line {lineno}</a>'
+                     f'<span class="hot-count">{hits:,}x</span>'
+                     f'<code>{snippet}</code></li>\n')
+    return ('<div class="hot-lines">\n'
+            '    <div class="hot-lines-title">Hottest lines</div>\n'
+            '    <ol>\n' + ''.join(items) + '    </ol>\n'
+            '  </div>\n\n  ')
+
+
+def build_heatmap_page(content, line_counts, log_max, top):
+    """Return the heatmap variant of a source page, or None if not a source page."""
+    table = TABLE_RE.search(content)
+    if not table or 'heatmap' in table.group(1).split():
+        return None
+
+    sources = {}
+
+    def heat_row(match):
+        row_html = match.group(0)
+        lineno = LINENO_RE.search(row_html)
+        if not lineno:
+            return row_html
+        lineno = int(lineno.group(1))
+        source = SOURCE_CELL_RE.search(row_html)
+        if source:
+            sources[lineno] = source.group(1)
+        hits = line_counts.get(lineno, 0)
+        if hits <= 0:
+            return row_html
+        level = heat_level(hits, log_max)
+        return COUNT_CELL_RE.sub(
+            lambda m: f'<td class="col-count{m.group(1)} heat-{level}"', row_html, count=1)
+
+    page = ROW_RE.sub(heat_row, content)
+    page = TABLE_RE.sub(lambda m: f'<table class="source-table{m.group(1)} heatmap">', page, count=1)
+
+    hottest = sorted(((line, hits) for line, hits in line_counts.items() if hits > 0 and line in sources),
+                     key=lambda item: (-item[1], item[0]))[:top]
+    if hottest and TABLE_CONTAINER in page:
+        page = page.replace(TABLE_CONTAINER, hot_lines_html(hottest, sources) + TABLE_CONTAINER, 1)
+    return page
+
+
+def build_heatmap(output_dir, tracefile, top=DEFAULT_TOP):
+    """Apply the heatmap to every source page. Returns (pages, hottest line hits)."""
+    counts = collect_line_counts(tracefile, source_page_map(output_dir))
+    max_hits = max((hits for page_counts in counts.values() for hits in page_counts.values()),
+                   default=0)
+    log_max = math.log1p(max_hits)
+
+    count = 0
+    for page_name, line_counts in sorted(counts.items()):
+        html_file = os.path.join(output_dir, page_name)
+        try:
+            with open(html_file, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except Exception as e:
+            print(f"Error reading {html_file}: {e}", file=sys.stderr)
+            continue
+
+        page = build_heatmap_page(content, line_counts, log_max, top)
+        if page is None:
+            continue
+        with open(html_file, 'w', encoding='utf-8') as f:
+            f.write(page)
+        count += 1
+    return count, max_hits
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: build_heatmap.py <gcovr_output_dir> <tracefile.info> [--top <lines>]", file=sys.stderr)
+        print("  Colours the Hits column by execution count (log scale).", file=sys.stderr)
+        sys.exit(1)
+
+    output_dir = sys.argv[1]
+    tracefile = sys.argv[2]
+    top = DEFAULT_TOP
+
+    # Check for --top argument
+    if '--top' in sys.argv:
+        top_idx = sys.argv.index('--top')
+        if top_idx + 1 < len(sys.argv):
+            top = int(sys.argv[top_idx + 1])
+
+    if not os.path.isdir(output_dir):
+        print(f"Error: {output_dir} is not a directory", file=sys.stderr)
+        sys.exit(1)
+    if not os.path.isfile(tracefile):
+        print(f"Error: {tracefile} is not a file", file=sys.stderr)
+        sys.exit(1)
+
+    count, max_hits = build_heatmap(output_dir, tracefile, top)
+    print(f"Applied heatmap to {count} source pages (hottest line: {max_hits:,} hits)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Build a function hotspot report from the call counts in an lcov tracefile.
+
+The FNA records of a coverage run count how often every function was
+called by the test suite, which makes the tracefile a cheap call-frequency
+profile. This ranks functions by those counts, aggregated by demangled name
+(constructor/destructor variants and other aliases collapse into one row)
+and by template family (all instantiations of a template in one row).
+
+Output (in <gcovr_output_dir>/):
+  hotspots.html           functions ranked by calls
+  hotspots.families.html  template families ranked by calls
+  hotspots.json           both rankings, including functions never called
+
+The pages reuse index.functions.html as their shell, so they share its
+styling, sidebar and sortable columns.
+"""
+
+import html
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+from demangle import demangle_names
+from tracefile import display_path, find_source_page, iter_records, source_page_map
+
+
+FUNCTIONS_PAGE = 'index.functions.html'
+HOTSPOTS_PAGE = 'hotspots.html'
+FAMILIES_PAGE = 'hotspots.families.html'
+HOTSPOTS_JSON = 'hotspots.json'
+DEFAULT_TOP = 500
+
+TITLE_RE = re.compile(r'<title>[^<]*</title>')
+CURRENT_RE = re.compile(r'<span class="current">Functions</span>')
+TREE_LABEL_RE = re.compile(r'<span class="tree-label">Functions</span>')
+ACTIONS_RE = re.compile(r'(<div class="header-actions">)(.*?)(\s*</div>)', re.DOTALL)
+SUMMARY_RE = re.compile(r'(<section class="summary-section">)(.*?)(\s*</section>)', re.DOTALL)
+MAIN_RE = re.compile(r'(<section class="main-section">)(.*?)(\s*</section>)', re.DOTALL)
+
+# Operators whose spelling contains angle brackets that are not template
+# argument lists, longest first
+ANGLE_OPERATORS = ('operator<=>', 'operator<<=', 'operator>>=', 'operator<<',
+                   'operator>>', 'operator<=', 'operator>=', 'operator->*',
+                   'operator->', 'operator<', 'operator>')
+
+
+def template_family(name):
+    """Collapse every template argument list in a demangled name to <>.
+
+    boost::json::basic_parser<handler>::parse_value<true>(char const*)
+    becomes boost::json::basic_parser<>::parse_value<>(char const*).
+    """
+    out = []
+    depth = 0
+    parens = 0  # inside template arguments, e.g. the (3>2) in f<(3>2)>
+    i = 0
+    while i < len(name):
+        if name.startswith('operator', i) and depth == 0:
+            op = next((op for op in ANGLE_OPERATORS if name.startswith(op, i)), None)
+            if op:
+                out.append(op)
+                i += len(op)
+                continue
+        ch = name[i]
+        if depth == 0:
+            if ch == '<':
+                out.append('<>')
+                depth = 1
+            else:
+                out.append(ch)
+        elif ch == '(':
+            parens += 1
+        elif ch == ')':
+            parens = max(0, parens - 1)
+        elif parens == 0:
+            if ch == '<':
+                depth += 1
+            elif ch == '>':
+                depth -= 1
+        i += 1
+    return ''.join(out)
+
+
+def collect_symbols(tracefile, pages):
+    """Sum call counts per mangled symbol, remembering where it is defined."""
+    symbols = {}
+    for record in iter_records(tracefile):
+        path = display_path(record['path'])
+        page = find_source_page(pages, record['path'])
+        for fn in record['functions']:
+            entry = symbols.get(fn['name'])
+            if entry is None:
+                symbols[fn['name']] = {
+                    'calls': fn['count'],
+                    'file': path,
+                    'line': fn['line'],
+                    'link': f"{page}#l{fn['line']}" if page else None,
+                }
+            else:
+                entry['calls'] += fn['count']
+    return symbols
+
+
+def aggregate(symbols, demangled):
+    """Group symbols by demangled name and by template family.
+
+    Returns (functions, families, total_calls), both lists sorted by calls.
+    """
+    functions = {}
+    for mangled, entry in symbols.items():
+        name = demangled.get(mangled, mangled)
+        fn = functions.get(name)
+        if fn is None:
+            fn = functions[name] = dict(entry, name=name, symbols=[], calls=0)
+        fn['symbols'].append(mangled)
+        fn['calls'] += entry['calls']
+        # Point at the hottest variant
+        if entry['calls'] > symbols[fn['symbols'][0]]['calls']:
+            fn.update(file=entry['file'], line=entry['line'], link=entry['link'])
+            fn['symbols'].insert(0, fn['symbols'].pop())
+
+    families = {}
+    for fn in functions.values():
+        key = template_family(fn['name'])
+        family = families.get(key)
+        if family is None:
+            family = families[key] = {'name': key, 'calls': 0, 'members': 0, 'hottest': fn}
+        family['calls'] += fn['calls']
+        family['members'] += 1
+        if fn['calls'] > family['hottest']['calls']:
+            family['hottest'] = fn
+
+    total = sum(fn['calls'] for fn in functions.values())
+
+    def rank(items):
+        return sorted(items, key=lambda item: (-item['calls'], item['name']))
+
+    return rank(functions.values()), rank(families.values()), total
+
+
+def share(calls, total):
+    """Percentage of all calls."""
+    return calls * 100.0 / total if total else 0.0
+
+
+def hotspot_row(name, calls, total, count, location, link):
+    """One .function-row in the layout of functions_page.content.html."""
+    name_html = html.escape(name)
+    called = (f'<span class="called">{calls}x</span>' if calls
+              else '<span class="not-called">not called</span>')
+    pct = share(calls, total)
+    inner = (f'<span class="function-name">{name_html}</span>'
+             f'<span class="function-location">{html.escape(location)}</span>')
+    if link:
+        inner = f'<a href="{html.escape(link)}">{inner}</a>'
+    return (f'    <div class="function-row" data-name="{name_html}" data-calls="{calls}" '
+            f'data-share="{pct:.4f}" data-count="{count}">\n'
+            f'      <div class="col-function">{inner}</div>\n'
+            f'      <div class="col-calls">{called}</div>\n'
+            f'      <div class="col-lines">{pct:.2f}%</div>\n'
+            f'      <div class="col-branches">{count}</div>\n'
+            f'    </div>\n')
+
+
+def hotspot_table(rows, count_label):
+    """A functions-container with sortable headers around the given rows."""
+    return ('\n<div class="functions-container">\n'
+            '  <div class="functions-header">\n'
+            '    <div class="col-function sortable" data-sort="name">Function</div>\n'
+            '    <div class="col-calls sortable sorted-descending" data-sort="calls">Calls</div>\n'
+            '    <div class="col-lines sortable" data-sort="share">Share</div>\n'
+            f'    <div class="col-branches sortable" data-sort="count">{count_label}</div>\n'
+            '  </div>\n\n'
+            '  <div class="functions-body">\n'
+            + ''.join(rows) +
+            '  </div>\n'
+            '</div>')
+
+
+def summary_html(functions, total, top_share):
+    """Inline summary in the style of functions_page.summary.html."""
+    called = sum(1 for fn in functions if fn['calls'])
+    return ('\n<div class="summary-inline">\n'
+            '  <div class="summary-stat">\n'
+            '    <span class="stat-label">Calls:</span>\n'
+            f'    <span class="stat-value">{total:,}</span>\n'
+            '  </div>\n'
+            '  <div class="summary-stat">\n'
+            '    <span class="stat-label">Functions called:</span>\n'
+            f'    <span class="stat-value">{called:,}</span>\n'
+            f'    <span class="stat-detail">({called} / {len(functions)})</span>\n'
+            '  </div>\n'
+            '  <div class="summary-stat">\n'
+            '    <span class="stat-label">Top 10 share:</span>\n'
+            f'    <span class="stat-value">{top_share:.1f}%</span>\n'
+            '  </div>\n'
+            '</div>')
+
+
+def build_page(shell, title, actions, summary, table, label='Hotspots'):
+    """Fill the index.functions.html shell with hotspot (or other) content."""
+    page = TITLE_RE.sub(lambda m: f'<title>{title}</title>', shell, count=1)
+    page = CURRENT_RE.sub(f'<span class="current">{label}</span>', page, count=1)
+    page = TREE_LABEL_RE.sub(f'<span class="tree-label">{label}</span>', page, count=1)
+    page = ACTIONS_RE.sub(lambda m: m.group(1) + actions + m.group(3), page, count=1)
+    page = SUMMARY_RE.sub(lambda m: m.group(1) + summary + m.group(3), page, count=1)
+    page = MAIN_RE.sub(lambda m: m.group(1) + table + m.group(3), page, count=1)
+    return page
+
+
+def write_pages(output_dir, functions, families, total, top):
+    """Write the two hotspot pages. Returns False if there is no functions page."""
+    output_path = Path(output_dir)
+    try:
+        with open(output_path / FUNCTIONS_PAGE, 'r', encoding='utf-8') as f:
+            shell = f.read()
+    except OSError as e:
+        print(f"Error reading {FUNCTIONS_PAGE}, skipping HTML output: {e}", file=sys.stderr)
+        return False
+
+    head = TITLE_RE.search(shell)
+    report = head.group(0)[len('<title>'):-len('</title>')].split(' - ', 1)[-1] if head else ''
+    top_share = share(sum(fn['calls'] for fn in functions[:10]), total)
+    summary = summary_html(functions, total, top_share)
+
+    function_rows = [
+        hotspot_row(fn['name'], fn['calls'], total, len(fn['symbols']),
+                    f"{fn['file']}:{fn['line']}", fn['link'])
+        for fn in functions[:top] if fn['calls']]
+    family_rows = [
+        hotspot_row(family['name'], family['calls'], total, family['members'],
+                    f"{family['hottest']['file']}:{family['hottest']['line']}",
+                    family['hottest']['link'])
+        for family in families[:top] if family['calls']]
+
+    pages = (
+        (HOTSPOTS_PAGE, 'By template family', FAMILIES_PAGE, function_rows, 'Symbols'),
+        (FAMILIES_PAGE, 'By function', HOTSPOTS_PAGE, family_rows, 'Instances'),
+    )
+    for filename, other_label, other_page, rows, count_label in pages:
+        actions = (f'\n            <a class="btn btn-sm" href="{FUNCTIONS_PAGE}">All functions</a>'
+                   f'\n            <a class="btn btn-sm" href="{other_page}">{other_label}</a>')
+        page = build_page(shell, f'Hotspots - {report}', actions, summary,
+                          hotspot_table(rows, count_label))
+        with open(output_path / filename, 'w', encoding='utf-8') as f:
+            f.write(page)
+
+    # Link the hotspots from the regular functions page
+    link = f'<a class="btn btn-sm" href="{HOTSPOTS_PAGE}">Hotspots</a>'
+    if link not in shell:
+        shell = ACTIONS_RE.sub(lambda m: m.group(1) + '\n            ' + link + m.group(2) + m.group(3),
+                               shell, count=1)
+        with open(output_path / FUNCTIONS_PAGE, 'w', encoding='utf-8') as f:
+            f.write(shell)
+    return True
+
+
+def write_json(output_dir, functions, families, total):
+    """Write both rankings to hotspots.json."""
+    data = {
+        'totalCalls': total,
+        'functions': [{
+            'name': fn['name'],
+            'calls': fn['calls'],
+            'share': round(share(fn['calls'], total), 4),
+            'file': fn['file'],
+            'line': fn['line'],
+            'link': fn['link'],
+            'symbols': fn['symbols'],
+        } for fn in functions],
+        'families': [{
+            'name': family['name'],
+            'calls': family['calls'],
+            'share': round(share(family['calls'], total), 4),
+            'instances': family['members'],
+            'hottest': family['hottest']['name'],
+        } for family in families],
+    }
+    with open(Path(output_dir) / HOTSPOTS_JSON, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1)
+
+
+def build_hotspots(output_dir, tracefile, top=DEFAULT_TOP):
+    """Write the hotspot pages and JSON. Returns (symbols, functions, families, total)."""
+    symbols = collect_symbols(tracefile, source_page_map(output_dir))
+    functions, families, total = aggregate(symbols, demangle_names(symbols))
+
+    write_json(output_dir, functions, families, total)
+    if write_pages(output_dir, functions, families, total, top):
+        print(f"Generated {HOTSPOTS_PAGE} and {FAMILIES_PAGE}")
+    return symbols, functions, families, total
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: build_hotspots.py <gcovr_output_dir> <tracefile.info> [--top <n>]", file=sys.stderr)
+        print("  Ranks functions by call count from the tracefile's FNA records.", file=sys.stderr)
+        sys.exit(1)
+
+    output_dir = sys.argv[1]
+    tracefile = sys.argv[2]
+    top = DEFAULT_TOP
+
+    # Check for --top argument
+    if '--top' in sys.argv:
+        top_idx = sys.argv.index('--top')
+        if top_idx + 1 < len(sys.argv):
+            top = int(sys.argv[top_idx + 1])
+
+    if not os.path.isdir(output_dir):
+        print(f"Error: {output_dir} is not a directory", file=sys.stderr)
+        sys.exit(1)
+    if not os.path.isfile(tracefile):
+        print(f"Error: {tracefile} is not a file", file=sys.stderr)
+        sys.exit(1)
+
+    symbols, functions, families, total = build_hotspots(output_dir, tracefile, top)
+    print(f"Ranked {len(functions)} functions in {len(families)} template families "
+          f"({total:,} calls from {len(symbols)} symbols) into {HOTSPOTS_JSON}")
+
+
+if __name__ == '__main__':
+    main()
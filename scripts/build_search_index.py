@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Build a sharded full-text index over the source pages of a gcovr report.
+
+Identifier tokens found in the source code are mapped to the files and
+line numbers they occur on. The index is split into small JSON shards by
+token prefix, so the sidebar search in gcovr.js only fetches the shards
+that can contain the query.
+
+Output (in <gcovr_output_dir>/search/):
+  manifest.json    list of source pages and shard keys
+  s-<prefix>.json  {token: {file_id: [line deltas]}} for tokens with that prefix
+"""
+
+import html
+import json
+import os
+import re
+import shutil
+import sys
+from pathlib import Path
+
+
+INDEX_DIR = 'search'
+INDEX_VERSION = 1
+MIN_TOKEN_LENGTH = 3
+SHARD_PREFIX_LENGTH = 2
+MAX_SHARD_BYTES = 16 * 1024
+
+TOKEN_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+TAG_RE = re.compile(r'<[^>]+>')
+TITLE_RE = re.compile(r'<div class="source-title">([^<]*)</div>')
+SOURCE_LINE_RE = re.compile(
+    r'<a id="l(\d+)"[^>]*>.*?<td class="col-source">(.*?)</td>',
+    re.DOTALL
+)
+
+# Keywords and ubiquitous names would produce huge posting lists that
+# nobody searches for
+STOP_TOKENS = frozenset('''
+    alignas alignof and asm auto bool break case catch char class const
+    constexpr const_cast continue decltype default define delete do double
+    dynamic_cast else endif enum explicit export extern false float for
+    friend goto if ifdef ifndef include inline int long mutable namespace
+    new noexcept not nullptr operator or private protected public register
+    reinterpret_cast return short signed sizeof static static_assert
+    static_cast struct switch template this throw true try typedef typeid
+    typename union unsigned using virtual void volatile while boost json
+'''.split())
+
+
+def parse_source_page(filepath):
+    """Return (title, [(lineno, source_text), ...]) for a source page, or None."""
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except Exception as e:
+        print(f"Error reading {filepath}: {e}", file=sys.stderr)
+        return None
+
+    title_match = TITLE_RE.search(content)
+    if not title_match:
+        return None  # directory or functions page
+
+    lines = []
+    for match in SOURCE_LINE_RE.finditer(content):
+        text = html.unescape(TAG_RE.sub('', match.group(2)))
+        lines.append((int(match.group(1)), text))
+    return html.unescape(title_match.group(1)), lines
+
+
+def build_postings(output_dir):
+    """Tokenize every source page. Returns (files, {token: {file_id: [lines]}})."""
+    files = []
+    postings = {}
+
+    for html_file in sorted(Path(output_dir).glob('index.*.html')):
+        if html_file.name.endswith('.compact.html'):
+            continue  # compact variants from build_compact_pages.py
+        parsed = parse_source_page(html_file)
+        if parsed is None:
+            continue
+        title, lines = parsed
+        file_id = len(files)
+        files.append({'name': title, 'link': html_file.name})
+
+        for lineno, text in lines:
+            for token in set(TOKEN_RE.findall(text)):
+                token = token.lower()
+                if len(token) < MIN_TOKEN_LENGTH or token in STOP_TOKENS:
+                    continue
+                by_file = postings.setdefault(token, {})
+                line_list = by_file.setdefault(file_id, [])
+                # Lines arrive in order; a token seen twice on one line
+                # with different case is only recorded once
+                if not line_list or line_list[-1] != lineno:
+                    line_list.append(lineno)
+
+    return files, postings
+
+
+def encode_shard(tokens, postings):
+    """Serialize a shard, delta-encoding each line list."""
+    shard = {}
+    for token in tokens:
+        shard[token] = {}
+        for file_id, lines in postings[token].items():
+            deltas = [lines[0]] + [b - a for a, b in zip(lines, lines[1:])]
+            shard[token][str(file_id)] = deltas
+    return json.dumps(shard, separators=(',', ':'), sort_keys=True)
+
+
+def split_shards(tokens, postings, prefix_length):
+    """Group tokens by prefix, splitting groups that exceed MAX_SHARD_BYTES."""
+    groups = {}
+    for token in tokens:
+        groups.setdefault(token[:prefix_length], []).append(token)
+
+    shards = {}
+    for key, group in groups.items():
+        data = encode_shard(group, postings)
+        longer = [t for t in group if len(t) > prefix_length]
+        # Split further while the tokens still differ past the prefix;
+        # a token exactly equal to the prefix stays in its own shard
+        if len(data) > MAX_SHARD_BYTES and len(longer) > 1:
+            exact = [t for t in group if len(t) == prefix_length]
+            if exact:
+                shards[key] = encode_shard(exact, postings)
+            shards.update(split_shards(longer, postings, prefix_length + 1))
+        else:
+            shards[key] = data
+    return shards
+
+
+def write_index(output_dir, files, postings):
+    """Write manifest.json and the shard files. Returns the shard count."""
+    index_dir = Path(output_dir) / INDEX_DIR
+    if index_dir.exists():
+        shutil.rmtree(index_dir)
+    index_dir.mkdir()
+
+    shards = split_shards(sorted(postings), postings, SHARD_PREFIX_LENGTH)
+    for key, data in shards.items():
+        # The s- prefix keeps keys like "con" or "aux" valid file names on Windows
+        with open(index_dir / f's-{key}.json', 'w', encoding='utf-8') as f:
+            f.write(data)
+
+    manifest = {
+        'version': INDEX_VERSION,
+        'minToken': MIN_TOKEN_LENGTH,
+        'files': files,
+        'shards': sorted(shards),
+    }
+    with open(index_dir / 'manifest.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+
+    return len(shards)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: build_search_index.py <gcovr_output_dir>", file=sys.stderr)
+        sys.exit(1)
+
+    output_dir = sys.argv[1]
+
+    if not os.path.isdir(output_dir):
+        print(f"Error: {output_dir} is not a directory", file=sys.stderr)
+        sys.exit(1)
+
+    files, postings = build_postings(output_dir)
+    shard_count = write_index(output_dir, files, postings)
+
+    print(f"Indexed {len(postings)} tokens from {len(files)} source files "
+          f"into {shard_count} shards in {os.path.join(output_dir, INDEX_DIR)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,7 @@ Build a JSON tree structure from gcovr HTML output.
 This enables true inline expand/collapse in the sidebar.
 """
 
+import hashlib
 import json
 import os
 import re
@@ -152,10 +153,27 @@ def build_tree(output_dir):
     return tree
 
 
+def tree_hash(tree):
+    """Content hash of the tree, used by gcovr.js to key its client caches."""
+    canonical = json.dumps(tree, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+def directory_links(nodes):
+    """Collect the links of all directory pages in the tree."""
+    links = []
+    for node in nodes:
+        if node['isDirectory'] and node['link']:
+            links.append(node['link'])
+        links.extend(directory_links(node['children']))
+    return links
+
+
 def inject_tree_data(output_dir, tree):
     """Inject tree data as JavaScript variable into all HTML files."""
     output_path = Path(output_dir)
-    tree_script = f'<script>window.GCOVR_TREE_DATA={json.dumps(tree)};</script>'
+    tree_script = (f'<script>window.GCOVR_TREE_DATA={json.dumps(tree)};'
+                   f'window.GCOVR_TREE_HASH="{tree_hash(tree)}";</script>')
 
     count = 0
     for html_file in output_path.glob('*.html'):
@@ -179,17 +197,8 @@ def inject_tree_data(output_dir, tree):
     return count
 
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: build_tree.py <gcovr_output_dir>", file=sys.stderr)
-        sys.exit(1)
-
-    output_dir = sys.argv[1]
-
-    if not os.path.isdir(output_dir):
-        print(f"Error: {output_dir} is not a directory", file=sys.stderr)
-        sys.exit(1)
-
+def generate_tree(output_dir):
+    """Write tree.json and inject the tree into every page."""
     tree = build_tree(output_dir)
 
     # Write tree.json
@@ -202,6 +211,21 @@ def main():
     # Inject tree data into HTML files for local file:// access
     injected = inject_tree_data(output_dir, tree)
     print(f"Injected tree data into {injected} HTML files")
+    return tree
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: build_tree.py <gcovr_output_dir>", file=sys.stderr)
+        sys.exit(1)
+
+    output_dir = sys.argv[1]
+
+    if not os.path.isdir(output_dir):
+        print(f"Error: {output_dir} is not a directory", file=sys.stderr)
+        sys.exit(1)
+
+    generate_tree(output_dir)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,14 @@
+"""
+Command-line helpers shared by the scripts.
+"""
+
+import sys
+
+
+def get_arg(name, default=None):
+    """Value following a --name option, or default."""
+    if name in sys.argv:
+        idx = sys.argv.index(name)
+        if idx + 1 < len(sys.argv):
+            return sys.argv[idx + 1]
+    return default
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Record coverage over time and generate trend badges.
+
+Every run appends one record (timestamp, commit, lines, functions, branches)
+per branch to an SQLite history file. The current numbers are read from the
+badges/coverage.json written by generate_badges.py, so old reports are
+never re-read. A small `latest` table points at the newest run of every
+branch, and runs are indexed by (repo, branch, timestamp) for range queries.
+
+Output (in <gcovr_output_dir>/badges/):
+  trend-lines.svg, trend-functions.svg, trend-branches.svg
+      sparkline badges over the last runs of the branch
+  history.json
+      {repo, branch, latest: {...}, runs: [{timestamp, commit, lines, ...}]}
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+from cli import get_arg
+from generate_badges import COLORS, estimate_text_width, get_color_for_coverage
+
+
+DEFAULT_POINTS = 30
+METRICS = ('lines', 'functions', 'branches')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    repo TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    commit_id TEXT,
+    lines REAL,
+    functions REAL,
+    branches REAL
+);
+CREATE INDEX IF NOT EXISTS runs_by_branch ON runs (repo, branch, timestamp);
+CREATE TABLE IF NOT EXISTS latest (
+    repo TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    PRIMARY KEY (repo, branch)
+);
+'''
+
+RUN_COLUMNS = 'id, timestamp, commit_id, lines, functions, branches'
+
+SPARK_WIDTH = 60
+SPARK_PAD = 4
+
+TREND_TEMPLATE = '''<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="20" role="img" aria-label="{label}: {value}">
+  <title>{label}: {value}</title>
+  <linearGradient id="s" x2="0" y2="100%">
+    <stop offset="0" stop-color="#bbb" stop-opacity=".1"/>
+    <stop offset="1" stop-opacity=".1"/>
+  </linearGradient>
+  <clipPath id="r">
+    <rect width="{width}" height="20" rx="3" fill="#fff"/>
+  </clipPath>
+  <g clip-path="url(#r)">
+    <rect width="{label_width}" height="20" fill="#555"/>
+    <rect x="{label_width}" width="{value_width}" height="20" fill="{color}"/>
+    <rect width="{width}" height="20" fill="url(#s)"/>
+  </g>
+  <g fill="#fff" text-anchor="middle" font-family="Verdana,Geneva,DejaVu Sans,sans-serif" text-rendering="geometricPrecision" font-size="110">
+    <text aria-hidden="true" x="{label_x}" y="150" fill="#010101" fill-opacity=".3" transform="scale(.1)">{label}</text>
+    <text x="{label_x}" y="140" transform="scale(.1)" fill="#fff">{label}</text>
+  </g>
+  <path d="{path}" fill="none" stroke="#fff" stroke-width="1.5" stroke-linejoin="round" stroke-linecap="round"/>
+</svg>'''
+
+
+def open_history(db_path):
+    """Open (and create if needed) the history database."""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def latest_run(conn, branch, repo=''):
+    """Return the newest run of a branch (one primary-key lookup), or None."""
+    return conn.execute(
+        f'SELECT {RUN_COLUMNS} FROM latest JOIN runs ON runs.id = latest.run_id '
+        'WHERE latest.repo = ? AND latest.branch = ?', (repo, branch)).fetchone()
+
+
+def record_run(conn, branch, coverage_data, commit=None, timestamp=None, repo=''):
+    """Append a run. Returns its id, or None if it repeats the latest run."""
+    timestamp = int(timestamp if timestamp is not None else time.time())
+    values = [coverage_data.get(metric) for metric in METRICS]
+
+    previous = latest_run(conn, branch, repo)
+    if previous is not None and commit and previous['commit_id'] == commit and \
+            [previous[metric] for metric in METRICS] == values:
+        return None  # same commit rebuilt, nothing new to record
+
+    with conn:
+        cursor = conn.execute(
+            'INSERT INTO runs (repo, branch, timestamp, commit_id, lines, functions, branches) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)', (repo, branch, timestamp, commit, *values))
+        run_id = cursor.lastrowid
+        # Runs can be recorded out of order (e.g. backfills); latest follows time
+        if previous is None or timestamp >= previous['timestamp']:
+            conn.execute('INSERT OR REPLACE INTO latest (repo, branch, run_id) VALUES (?, ?, ?)',
+                         (repo, branch, run_id))
+    return run_id
+
+
+def branch_runs(conn, branch, repo='', since=None, until=None, limit=None):
+    """Return the runs of a branch in [since, until], oldest first.
+
+    With a limit, only the newest `limit` runs of that range are returned.
+    """
+    query = f'SELECT {RUN_COLUMNS} FROM runs WHERE repo = ? AND branch = ?'
+    params = [repo, branch]
+    if since is not None:
+        query += ' AND timestamp >= ?'
+        params.append(int(since))
+    if until is not None:
+        query += ' AND timestamp <= ?'
+        params.append(int(until))
+    query += ' ORDER BY timestamp DESC, id DESC'
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(int(limit))
+    return list(reversed(conn.execute(query, params).fetchall()))
+
+
+def run_to_dict(run):
+    """JSON form of a run row."""
+    return {
+        'timestamp': run['timestamp'],
+        'commit': run['commit_id'],
+        **{metric: run[metric] for metric in METRICS},
+    }
+
+
+def sparkline_path(values, left, width, height=20, pad=SPARK_PAD):
+    """Scale values into SVG path data inside the given box.
+
+    Every value keeps its position in the series; runs without a value
+    (None) break the line instead of joining their neighbours.
+    """
+    present = [value for value in values if value is not None]
+    if not present:
+        return ''
+    lo, hi = min(present), max(present)
+    span = hi - lo
+    step = width / (len(values) - 1) if len(values) > 1 else 0
+    commands = []
+    run = 0
+    for i, value in enumerate(values + [None]):
+        if value is None:
+            # A value between two gaps is drawn as a dot
+            if run == 1:
+                commands.append('h0')
+            run = 0
+            continue
+        # A flat history is drawn through the middle
+        rel = (value - lo) / span if span else 0.5
+        y = height - pad - rel * (height - 2 * pad)
+        commands.append(f"{'L' if run else 'M'}{left + i * step:.1f},{y:.1f}")
+        run += 1
+    if len(values) == 1:
+        commands[-1] = f'h{width:.1f}'
+    return ' '.join(commands)
+
+
+def generate_trend_svg(label, values):
+    """Generate a sparkline badge for a series of percentages (oldest first)."""
+    label_width = estimate_text_width(label)
+    value_width = SPARK_WIDTH + 2 * SPARK_PAD
+    latest = values[-1]
+    color = get_color_for_coverage(latest) if latest is not None else COLORS['red']
+    series = [v for v in values if v is not None]
+
+    return TREND_TEMPLATE.format(
+        width=label_width + value_width,
+        label_width=label_width,
+        value_width=value_width,
+        label=label,
+        value=f"{latest:.1f}% (last {len(series)} runs)" if latest is not None else 'no data',
+        color=color,
+        label_x=int(label_width / 2 * 10),
+        path=sparkline_path(values, label_width + SPARK_PAD, SPARK_WIDTH),
+    )
+
+
+def write_trend_outputs(output_dir, conn, branch, repo='', points=DEFAULT_POINTS):
+    """Write the trend badges and history.json. Returns the generated file names."""
+    badges_dir = Path(output_dir) / 'badges'
+    badges_dir.mkdir(exist_ok=True)
+    runs = branch_runs(conn, branch, repo, limit=points)
+
+    generated = []
+    for metric in METRICS:
+        values = [run[metric] for run in runs]
+        if not runs or values[-1] is None:
+            continue
+        filename = f'trend-{metric}.svg'
+        with open(badges_dir / filename, 'w', encoding='utf-8') as f:
+            f.write(generate_trend_svg(f'{metric} trend', values))
+        generated.append(filename)
+
+    latest = latest_run(conn, branch, repo)
+    with open(badges_dir / 'history.json', 'w', encoding='utf-8') as f:
+        json.dump({
+            'repo': repo,
+            'branch': branch,
+            'latest': run_to_dict(latest) if latest is not None else None,
+            'runs': [run_to_dict(run) for run in runs],
+        }, f, indent=2)
+    generated.append('history.json')
+    return generated
+
+
+def main():
+    if len(sys.argv) < 2 or '--db' not in sys.argv or '--branch' not in sys.argv:
+        print("Usage: coverage_history.py <gcovr_output_dir> --db <history.sqlite> --branch <name>", file=sys.stderr)
+        print("         [--commit <sha>] [--timestamp <epoch>] [--repo <name>] [--points <n>]", file=sys.stderr)
+        print("  Appends badges/coverage.json to the history and writes trend badges.", file=sys.stderr)
+        sys.exit(1)
+
+    output_dir = sys.argv[1]
+    db_path = get_arg('--db')
+    branch = get_arg('--branch')
+    commit = get_arg('--commit')
+    repo = get_arg('--repo', '')
+    points = int(get_arg('--points', DEFAULT_POINTS))
+    timestamp = get_arg('--timestamp', os.environ.get('SOURCE_DATE_EPOCH'))
+
+    coverage_path = os.path.join(output_dir, 'badges', 'coverage.json')
+    try:
+        with open(coverage_path, 'r', encoding='utf-8') as f:
+            coverage_data = json.load(f)
+    except Exception as e:
+        print(f"Error reading {coverage_path} (run generate_badges.py first): {e}", file=sys.stderr)
+        sys.exit(1)
+
+    conn = open_history(db_path)
+    try:
+        run_id = record_run(conn, branch, coverage_data, commit, timestamp, repo)
+        if run_id is None:
+            print(f"Run for {commit} already recorded on {branch}, not appending")
+        else:
+            print(f"Recorded run {run_id} on {branch} in {db_path}")
+
+        generated = write_trend_outputs(output_dir, conn, branch, repo, points)
+    finally:
+        conn.close()
+    print(f"Generated {', '.join(generated)} in {output_dir}/badges/")
+
+
+if __name__ == '__main__':
+    main()
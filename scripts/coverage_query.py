@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Answer coverage questions from an indexed store instead of the HTML report.
+
+`build` reads an lcov tracefile once and writes a store that is cheap to load
+and query: a trie of path segments whose leaves are file ids, and for each
+file its instrumented lines as a sorted array with a parallel array of hit
+counts, its branches and its (demangled) functions by line. Per-file totals
+are precomputed, so directory summaries only add them up.
+
+  {
+    "version": 1,
+    "trie": {"boost": {"json": {"value.hpp": 0, "detail": {...}}}},
+    "files": [{"path": "boost/json/value.hpp", "lines": [...], "hits": [...],
+               "branches": [[line, taken, total], ...],
+               "functions": [[name, line, calls], ...],
+               "totals": [lines hit, lines, functions called, functions,
+                          branches taken, branches]}]
+  }
+
+A path names a file or a directory (everything below it). Paths match on any
+suffix of whole segments, so `value.hpp` and `detail/` work as well as the
+full path; an empty path means every file. All queries print JSON.
+
+Usage:
+  coverage_query.py build <tracefile> <store.json>
+  coverage_query.py uncovered <store.json> <path>...
+  coverage_query.py functions <store.json> <path>... [--zero]
+  coverage_query.py lines <store.json> <file>:<line>[-<last>]...
+  coverage_query.py files <store.json> <path>... [--below <pct>]
+  coverage_query.py summary <store.json> <path>...
+"""
+
+import bisect
+import json
+import os
+import sys
+import time
+
+from cli import get_arg
+from demangle import demangle_names
+from line_index import parse_location
+from tracefile import display_path, iter_records
+
+
+STORE_VERSION = 1
+QUERIES = ('uncovered', 'functions', 'lines', 'files', 'summary')
+OPTIONS_WITH_VALUE = ('--below',)
+
+
+def merge_records(tracefile):
+    """Records of a tracefile by display path, merging repeated files."""
+    records = {}
+    for record in iter_records(tracefile):
+        key = display_path(record['path'])
+        existing = records.get(key)
+        if existing is None:
+            records[key] = record
+            continue
+        for lineno, hits in record['lines'].items():
+            existing['lines'][lineno] = existing['lines'].get(lineno, 0) + hits
+        for lineno, branches in record['branches'].items():
+            existing['branches'].setdefault(lineno, []).extend(branches)
+        existing['functions'].extend(record['functions'])
+    return records
+
+
+def encode_file(path, record, demangled):
+    """Store entry of one file: sorted line arrays, branches, functions and totals."""
+    lines = sorted(record['lines'])
+    hits = [record['lines'][lineno] for lineno in lines]
+    branches = []
+    for lineno in sorted(record['branches']):
+        taken = [count for _, _, count in record['branches'][lineno]]
+        branches.append([lineno, sum(1 for count in taken if count), len(taken)])
+
+    calls = {}
+    for function in record['functions']:
+        name = demangled.get(function['name'], function['name'])
+        line, count = calls.get(name, (function['line'], 0))
+        calls[name] = (line, count + function['count'])
+    functions = sorted([name, line, count] for name, (line, count) in calls.items())
+    functions.sort(key=lambda function: function[1])
+
+    totals = [sum(1 for count in hits if count > 0), len(hits),
+              sum(1 for function in functions if function[2] > 0), len(functions),
+              sum(branch[1] for branch in branches), sum(branch[2] for branch in branches)]
+    return {'path': path, 'lines': lines, 'hits': hits, 'branches': branches,
+            'functions': functions, 'totals': totals}
+
+
+def build_store(tracefile):
+    """Build the store of a tracefile."""
+    records = merge_records(tracefile)
+    demangled = demangle_names(function['name'] for record in records.values()
+                               for function in record['functions'])
+    trie = {}
+    files = []
+    for path in sorted(records):
+        node = trie
+        *dirs, name = path.split('/')
+        for part in dirs:
+            node = node.setdefault(part, {})
+        node[name] = len(files)
+        files.append(encode_file(path, records[path], demangled))
+    return {'version': STORE_VERSION, 'trie': trie, 'files': files}
+
+
+def subtree_ids(node):
+    """File ids at or below a trie node."""
+    if isinstance(node, int):
+        return [node]
+    ids = []
+    for child in node.values():
+        ids.extend(subtree_ids(child))
+    return ids
+
+
+def uncovered_runs(lines, hits):
+    """Uncovered lines as [first, last] runs with no covered line in between."""
+    runs = []
+    previous = -2
+    for i, (lineno, count) in enumerate(zip(lines, hits)):
+        if count > 0:
+            continue
+        if previous == i - 1:
+            runs[-1][1] = lineno
+        else:
+            runs.append([lineno, lineno])
+        previous = i
+    return runs
+
+
+def percent(covered, total):
+    return round(covered / total * 100, 1) if total else None
+
+
+def totals_dict(totals):
+    """Per-metric counts and percentages of a totals array."""
+    return {metric: {'covered': totals[2 * i], 'total': totals[2 * i + 1],
+                     'percent': percent(totals[2 * i], totals[2 * i + 1])}
+            for i, metric in enumerate(('lines', 'functions', 'branches'))}
+
+
+class CoverageStore:
+    """Query side of the store."""
+
+    def __init__(self, data):
+        self.trie = data['trie']
+        self.files = data['files']
+        self._by_name = None
+
+    @classmethod
+    def load(cls, store_path):
+        with open(store_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != STORE_VERSION:
+            raise ValueError(f"unsupported store version {data.get('version')}")
+        return cls(data)
+
+    def nodes_by_name(self):
+        """{segment: [(full path, node)]} over the whole trie, built on first use."""
+        if self._by_name is None:
+            self._by_name = {}
+            stack = [('', self.trie)]
+            while stack:
+                prefix, node = stack.pop()
+                for name, child in node.items():
+                    path = f'{prefix}/{name}' if prefix else name
+                    self._by_name.setdefault(name, []).append((path, child))
+                    if isinstance(child, dict):
+                        stack.append((path, child))
+        return self._by_name
+
+    def resolve(self, path):
+        """Ids of the files a path names: exact from the root, else by suffix."""
+        path = path.replace('\\', '/').strip('/')
+        if path.startswith('./'):
+            path = path[2:]
+        if path in ('', '.'):
+            return list(range(len(self.files)))
+
+        node = self.trie
+        for part in path.split('/'):
+            node = node.get(part) if isinstance(node, dict) else None
+            if node is None:
+                break
+        else:
+            return subtree_ids(node)
+
+        suffix = '/' + path
+        ids = []
+        for full_path, node in self.nodes_by_name().get(path.rsplit('/', 1)[-1], ()):
+            if full_path.endswith(suffix):
+                ids.extend(subtree_ids(node))
+        return sorted(set(ids))
+
+    def uncovered(self, file_id):
+        entry = self.files[file_id]
+        runs = uncovered_runs(entry['lines'], entry['hits'])
+        return {'file': entry['path'], 'count': entry['hits'].count(0), 'runs': runs}
+
+    def functions(self, file_id, zero=False):
+        entry = self.files[file_id]
+        return [{'file': entry['path'], 'name': name, 'line': line, 'calls': calls}
+                for name, line, calls in entry['functions'] if not zero or calls == 0]
+
+    def lines(self, file_id, first, last):
+        """Hit counts of the instrumented lines in [first, last]."""
+        entry = self.files[file_id]
+        lo = bisect.bisect_left(entry['lines'], first)
+        hi = bisect.bisect_right(entry['lines'], last)
+        return {'file': entry['path'], 'first': first, 'last': last,
+                'hits': {str(lineno): hits for lineno, hits
+                         in zip(entry['lines'][lo:hi], entry['hits'][lo:hi])}}
+
+    def file_totals(self, file_id):
+        entry = self.files[file_id]
+        return {'file': entry['path'], **totals_dict(entry['totals'])}
+
+    def summary(self, file_ids):
+        totals = [sum(self.files[file_id]['totals'][i] for file_id in file_ids) for i in range(6)]
+        return {'files': len(file_ids), **totals_dict(totals)}
+
+
+def run_query(store, query, args, zero=False, below=None):
+    """Results of a query over its path arguments, as a JSON-ready list."""
+    results = []
+    for arg in args:
+        first = last = None
+        path = arg
+        if query == 'lines':
+            path, first, last = parse_location(arg)
+        file_ids = store.resolve(path)
+        if not file_ids:
+            print(f"Warning: {path} is not in the store", file=sys.stderr)
+            continue
+
+        if query == 'summary':
+            results.append({'path': path, **store.summary(file_ids)})
+            continue
+        for file_id in file_ids:
+            if query == 'uncovered':
+                result = store.uncovered(file_id)
+                if result['count']:
+                    results.append(result)
+            elif query == 'functions':
+                results.extend(store.functions(file_id, zero))
+            elif query == 'lines':
+                results.append(store.lines(file_id, first, last))
+            else:
+                result = store.file_totals(file_id)
+                coverage = result['lines']['percent']
+                if below is None or (coverage is not None and coverage < below):
+                    results.append(result)
+    return results
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ('build',) + QUERIES or (
+            sys.argv[1] == 'build' and len(sys.argv) < 4):
+        print("Usage: coverage_query.py build <tracefile> <store.json>", file=sys.stderr)
+        print("       coverage_query.py uncovered|functions|files|summary <store.json> [<path>...]", file=sys.stderr)
+        print("       coverage_query.py lines <store.json> <file>:<line>[-<last>]...", file=sys.stderr)
+        print("  Options: --zero (functions never called), --below <pct> (files under a line coverage)", file=sys.stderr)
+        print("  Answers coverage questions as JSON from a store built from a tracefile.", file=sys.stderr)
+        sys.exit(1)
+
+    if sys.argv[1] == 'build':
+        tracefile, store_path = sys.argv[2], sys.argv[3]
+        if not os.path.isfile(tracefile):
+            print(f"Error: {tracefile} is not a file", file=sys.stderr)
+            sys.exit(1)
+        store = build_store(tracefile)
+        with open(store_path, 'w', encoding='utf-8') as f:
+            json.dump(store, f, separators=(',', ':'))
+        lines = sum(len(entry['lines']) for entry in store['files'])
+        print(f"Indexed {len(store['files'])} files ({lines} lines) into {store_path}")
+        return
+
+    query, store_path = sys.argv[1], sys.argv[2]
+    args = []
+    skip = False
+    for arg in sys.argv[3:]:
+        if skip:
+            skip = False
+        elif arg in OPTIONS_WITH_VALUE:
+            skip = True
+        elif not arg.startswith('--'):
+            args.append(arg)
+    if not args and query != 'lines':
+        args = ['']  # every file
+
+    start = time.perf_counter()
+    try:
+        store = CoverageStore.load(store_path)
+        below = get_arg('--below')
+        results = run_query(store, query, args, '--zero' in sys.argv,
+                            float(below) if below is not None else None)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    json.dump(results, sys.stdout, indent=1)
+    print()
+    print(f"{len(results)} results in {(time.perf_counter() - start) * 1000:.0f} ms", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
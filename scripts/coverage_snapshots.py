@@ -0,0 +1,513 @@
+#!/usr/bin/env python3
+"""
+Keep compact coverage snapshots, one per commit, for trend analysis.
+
+Each snapshot stores the line hit vector of every file of a tracefile in an
+SQLite file. A vector is kept in one of three ways:
+
+  full       line numbers as (gap, length) runs of consecutive lines, then
+             the hit counts as (value, repeat) runs
+  delta      when the instrumented lines are the same as in the previous
+             snapshot of the branch: (difference, repeat) runs of the hit
+             counts against it, usually a few bytes
+  reference  an identical vector is only a pointer to the snapshot holding it
+
+All numbers are varints. A delta chain is cut by a full vector every
+KEYFRAME_INTERVAL snapshots, so decoding a vector never replays more than
+that many deltas. Per-file totals of lines, functions and branches are kept
+in plain columns: summaries, badges and the sidebar tree are produced
+without decoding anything, and a diff only decodes the files whose vectors
+differ between the two snapshots. Function and branch coverage are kept as
+totals only, so a reconstructed tracefile has line data (DA records) only.
+
+Usage:
+  coverage_snapshots.py record <db> <tracefile> [--branch <name>] [--commit <sha>] [--timestamp <unix>]
+  coverage_snapshots.py list <db> [--branch <name>]
+  coverage_snapshots.py export <db> <snapshot> <out.info>
+  coverage_snapshots.py summary <db> <snapshot> <summary.json>
+  coverage_snapshots.py tree <db> <snapshot> <tree.json>
+  coverage_snapshots.py diff <db> <old snapshot> <new snapshot> [--json]
+
+A snapshot is its id, a commit hash prefix, or `latest` (of --branch).
+summary.json has the layout of a gcovr --json-summary file, the input of
+`generate_badges.py --json`; tree.json has the layout written by
+build_tree.py, the input of `generate_badges.py --per-node`.
+"""
+
+import json
+import os
+import posixpath
+import sqlite3
+import sys
+import time
+
+from build_tree import get_coverage_class
+from cli import get_arg
+from coverage_query import merge_records
+
+
+KEYFRAME_INTERVAL = 16
+FULL, DELTA = 0, 1
+TOTALS = ('lines_covered', 'lines_total', 'functions_covered', 'functions_total',
+          'branches_covered', 'branches_total')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    branch TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    commit_id TEXT
+);
+CREATE INDEX IF NOT EXISTS snapshots_by_branch ON snapshots (branch, id);
+CREATE TABLE IF NOT EXISTS paths (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS vectors (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id),
+    path_id INTEGER NOT NULL REFERENCES paths (id),
+    source_id INTEGER NOT NULL,  -- snapshot holding the data (itself unless a reference)
+    base_id INTEGER,             -- snapshot the delta applies to (NULL for full vectors)
+    depth INTEGER NOT NULL,      -- deltas since the last full vector
+    lines_covered INTEGER NOT NULL,
+    lines_total INTEGER NOT NULL,
+    functions_covered INTEGER NOT NULL,
+    functions_total INTEGER NOT NULL,
+    branches_covered INTEGER NOT NULL,
+    branches_total INTEGER NOT NULL,
+    data BLOB,
+    PRIMARY KEY (snapshot_id, path_id)
+) WITHOUT ROWID;
+'''
+
+SNAPSHOT_COLUMNS = 'id, branch, timestamp, commit_id'
+VECTOR_COLUMNS = 'path, path_id, source_id, base_id, depth, data, ' + ', '.join(TOTALS)
+
+
+def write_varint(out, value):
+    """Append an unsigned LEB128 varint to a bytearray."""
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varints(data):
+    """Yield the varints of a byte string."""
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            yield value
+            value = shift = 0
+
+
+def zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def unzigzag(value):
+    return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+
+def value_runs(values):
+    """[value, repeat] runs of a sequence."""
+    runs = []
+    for value in values:
+        if runs and runs[-1][0] == value:
+            runs[-1][1] += 1
+        else:
+            runs.append([value, 1])
+    return runs
+
+
+def encode_full(lines, hits):
+    out = bytearray()
+    write_varint(out, FULL)
+    line_runs = []
+    for lineno in lines:
+        if line_runs and line_runs[-1][0] + line_runs[-1][1] == lineno:
+            line_runs[-1][1] += 1
+        else:
+            line_runs.append([lineno, 1])
+    write_varint(out, len(line_runs))
+    end = 0
+    for start, length in line_runs:
+        write_varint(out, start - end)
+        write_varint(out, length)
+        end = start + length
+    for value, repeat in value_runs(hits):
+        write_varint(out, value)
+        write_varint(out, repeat)
+    return bytes(out)
+
+
+def encode_delta(hits, base_hits):
+    out = bytearray()
+    write_varint(out, DELTA)
+    for value, repeat in value_runs([new - old for new, old in zip(hits, base_hits)]):
+        write_varint(out, zigzag(value))
+        write_varint(out, repeat)
+    return bytes(out)
+
+
+def decode(data, base=None):
+    """(lines, hits) of an encoded vector; base is the decoded vector a delta applies to."""
+    values = read_varints(data)
+    if next(values) == DELTA:
+        lines, base_hits = base
+        hits = []
+        for value, repeat in zip(values, values):
+            hits.extend([unzigzag(value)] * repeat)
+        return lines, [old + change for old, change in zip(base_hits, hits)]
+
+    lines = []
+    end = 0
+    for _ in range(next(values)):
+        start = end + next(values)
+        end = start + next(values)
+        lines.extend(range(start, end))
+    hits = []
+    for value, repeat in zip(values, values):
+        hits.extend([value] * repeat)
+    return lines, hits
+
+
+def record_vector(record):
+    """(lines, hits, totals) of a tracefile record."""
+    lines = sorted(record['lines'])
+    hits = [record['lines'][lineno] for lineno in lines]
+    functions = {}
+    for function in record['functions']:
+        functions[function['name']] = functions.get(function['name'], 0) + function['count']
+    taken = [count for branches in record['branches'].values() for _, _, count in branches]
+    totals = (sum(1 for count in hits if count > 0), len(hits),
+              sum(1 for count in functions.values() if count > 0), len(functions),
+              sum(1 for count in taken if count), len(taken))
+    return lines, hits, totals
+
+
+def open_store(db_path):
+    """Open (and create if needed) the snapshot database."""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def latest_snapshot(conn, branch):
+    return conn.execute(
+        f'SELECT {SNAPSHOT_COLUMNS} FROM snapshots WHERE branch = ? ORDER BY id DESC LIMIT 1',
+        (branch,)).fetchone()
+
+
+def find_snapshot(conn, ref, branch=''):
+    """Snapshot by id, commit hash prefix, or 'latest'. None if unknown."""
+    if ref == 'latest':
+        return latest_snapshot(conn, branch)
+    if ref.isdigit():
+        row = conn.execute(f'SELECT {SNAPSHOT_COLUMNS} FROM snapshots WHERE id = ?',
+                           (int(ref),)).fetchone()
+        if row is not None:
+            return row
+    return conn.execute(
+        f'SELECT {SNAPSHOT_COLUMNS} FROM snapshots WHERE commit_id LIKE ? ORDER BY id DESC LIMIT 1',
+        (ref + '%',)).fetchone()
+
+
+def snapshot_rows(conn, snapshot_id):
+    """{path: vector row} of a snapshot, without decoding anything."""
+    return {row['path']: row for row in conn.execute(
+        f'SELECT {VECTOR_COLUMNS} FROM vectors JOIN paths ON paths.id = vectors.path_id '
+        'WHERE snapshot_id = ?', (snapshot_id,))}
+
+
+class VectorDecoder:
+    """Decodes vectors through their delta chains, remembering the ones it decoded."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.decoded = {}
+
+    def vector(self, source_id, path_id):
+        key = (source_id, path_id)
+        if key not in self.decoded:
+            row = self.conn.execute(
+                'SELECT base_id, data FROM vectors WHERE snapshot_id = ? AND path_id = ?',
+                key).fetchone()
+            base = self.vector(row['base_id'], path_id) if row['base_id'] is not None else None
+            self.decoded[key] = decode(row['data'], base)
+        return self.decoded[key]
+
+
+def record_snapshot(conn, tracefile, branch='', commit=None, timestamp=None):
+    """Store a tracefile as a new snapshot of the branch.
+
+    Returns (snapshot id, {kind: count}, bytes stored), or None if the commit
+    is already the branch's latest snapshot.
+    """
+    previous = latest_snapshot(conn, branch)
+    if previous is not None and commit and previous['commit_id'] == commit:
+        return None
+    previous_rows = snapshot_rows(conn, previous['id']) if previous is not None else {}
+    decoder = VectorDecoder(conn)
+    timestamp = int(timestamp if timestamp is not None else time.time())
+
+    kinds = {'full': 0, 'delta': 0, 'reference': 0}
+    stored = 0
+    with conn:
+        snapshot_id = conn.execute(
+            'INSERT INTO snapshots (branch, timestamp, commit_id) VALUES (?, ?, ?)',
+            (branch, timestamp, commit)).lastrowid
+        for path, record in sorted(merge_records(tracefile).items()):
+            lines, hits, totals = record_vector(record)
+            conn.execute('INSERT OR IGNORE INTO paths (path) VALUES (?)', (path,))
+            path_id = conn.execute('SELECT id FROM paths WHERE path = ?', (path,)).fetchone()[0]
+
+            source_id, base_id, depth, data = snapshot_id, None, 0, encode_full(lines, hits)
+            kind = 'full'
+            before = previous_rows.get(path)
+            if before is not None:
+                base_lines, base_hits = decoder.vector(before['source_id'], path_id)
+                if base_lines == lines and base_hits == hits:
+                    source_id, depth, data = before['source_id'], before['depth'], None
+                    kind = 'reference'
+                elif base_lines == lines and before['depth'] < KEYFRAME_INTERVAL - 1:
+                    delta = encode_delta(hits, base_hits)
+                    if len(delta) < len(data):
+                        base_id, depth, data = before['source_id'], before['depth'] + 1, delta
+                        kind = 'delta'
+            kinds[kind] += 1
+            stored += len(data or b'')
+            conn.execute(
+                'INSERT INTO vectors (snapshot_id, path_id, source_id, base_id, depth, data, '
+                f'{", ".join(TOTALS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (snapshot_id, path_id, source_id, base_id, depth, data, *totals))
+    return snapshot_id, kinds, stored
+
+
+def export_tracefile(conn, snapshot_id, out_path):
+    """Write the line coverage of a snapshot as an lcov tracefile. Returns the file count."""
+    decoder = VectorDecoder(conn)
+    rows = snapshot_rows(conn, snapshot_id)
+    with open(out_path, 'w', encoding='utf-8') as f:
+        for path in sorted(rows):
+            lines, hits = decoder.vector(rows[path]['source_id'], rows[path]['path_id'])
+            f.write(f'SF:{path}\n')
+            for lineno, count in zip(lines, hits):
+                f.write(f'DA:{lineno},{count}\n')
+            f.write(f'LH:{sum(1 for count in hits if count > 0)}\nLF:{len(hits)}\n')
+            f.write('end_of_record\n')
+    return len(rows)
+
+
+def percent(covered, total):
+    return round(covered * 100.0 / total, 1) if total else None
+
+
+def summary_data(rows):
+    """gcovr --json-summary layout of a snapshot, from the stored totals."""
+    files = []
+    sums = [0] * len(TOTALS)
+    for path in sorted(rows):
+        row = rows[path]
+        entry = {'filename': path}
+        for i, (metric, key) in enumerate((('lines', 'line'), ('functions', 'function'),
+                                           ('branches', 'branch'))):
+            covered, total = row[f'{metric}_covered'], row[f'{metric}_total']
+            entry.update({f'{key}_covered': covered, f'{key}_total': total,
+                          f'{key}_percent': percent(covered, total)})
+            sums[2 * i] += covered
+            sums[2 * i + 1] += total
+        files.append(entry)
+
+    data = {'root': '', 'gcovr/summary_format_version': '0.6', 'files': files}
+    for i, key in enumerate(('line', 'function', 'branch')):
+        data.update({f'{key}_covered': sums[2 * i], f'{key}_total': sums[2 * i + 1],
+                     f'{key}_percent': percent(sums[2 * i], sums[2 * i + 1])})
+    return data
+
+
+def tree_data(rows):
+    """Sidebar tree (build_tree.py layout) of a snapshot, from the stored totals.
+
+    Snapshots have no report pages, so nodes carry no links.
+    """
+    paths = sorted(rows)
+    prefix = posixpath.commonpath(paths) if len(paths) > 1 else posixpath.dirname(paths[0]) if paths else ''
+    root = {'children': {}, 'covered': 0, 'total': 0}
+    for path in paths:
+        covered, total = rows[path]['lines_covered'], rows[path]['lines_total']
+        node = root
+        parts = (posixpath.relpath(path, prefix) if prefix else path).split('/')
+        for depth, part in enumerate(parts):
+            node['covered'] += covered
+            node['total'] += total
+            node = node['children'].setdefault(
+                part, {'children': {}, 'covered': 0, 'total': 0, 'is_dir': depth < len(parts) - 1})
+        node['covered'] += covered
+        node['total'] += total
+
+    def nodes(children):
+        result = []
+        for name, child in children.items():
+            coverage = f'{percent(child["covered"], child["total"]):.1f}' if child['total'] else '-'
+            result.append({'name': name, 'coverage': coverage,
+                           'coverageClass': get_coverage_class(coverage),
+                           'isDirectory': child['is_dir'], 'link': None,
+                           'children': nodes(child['children'])})
+        result.sort(key=lambda node: (not node['isDirectory'], node['name'].lower()))
+        return result
+
+    return nodes(root['children'])
+
+
+def line_runs(lines):
+    """Sorted line numbers as [first, last] runs of consecutive lines."""
+    runs = []
+    for lineno in lines:
+        if runs and runs[-1][1] == lineno - 1:
+            runs[-1][1] = lineno
+        else:
+            runs.append([lineno, lineno])
+    return runs
+
+
+def diff_snapshots(conn, old_id, new_id):
+    """Per-file changes between two snapshots.
+
+    Files whose vector and totals are the same in both are skipped without
+    decoding; only the others are decoded. Files where only hit counts moved
+    are left out.
+    """
+    old_rows, new_rows = snapshot_rows(conn, old_id), snapshot_rows(conn, new_id)
+    decoder = VectorDecoder(conn)
+    changes = []
+    for path in sorted(set(old_rows) | set(new_rows)):
+        old, new = old_rows.get(path), new_rows.get(path)
+        if old is not None and new is not None and old['source_id'] == new['source_id'] and \
+                all(old[key] == new[key] for key in TOTALS):
+            continue
+        change = {'file': path,
+                  'status': 'added' if old is None else 'removed' if new is None else 'changed'}
+        for side, row in (('old', old), ('new', new)):
+            change[side] = {metric: [row[f'{metric}_covered'], row[f'{metric}_total']]
+                            for metric in ('lines', 'functions', 'branches')} if row else None
+
+        old_hits = dict(zip(*decoder.vector(old['source_id'], old['path_id']))) if old else {}
+        new_hits = dict(zip(*decoder.vector(new['source_id'], new['path_id']))) if new else {}
+        change['newly_uncovered'] = line_runs(sorted(
+            lineno for lineno, count in new_hits.items() if count == 0 and old_hits.get(lineno) != 0))
+        change['newly_covered'] = line_runs(sorted(
+            lineno for lineno, count in new_hits.items() if count > 0 and old_hits.get(lineno) == 0))
+        if change['status'] == 'changed' and change['old'] == change['new'] and \
+                not change['newly_uncovered'] and not change['newly_covered']:
+            continue  # only hit counts moved
+        changes.append(change)
+    return changes
+
+
+def format_change(change):
+    """One line of text for a changed file."""
+    def lines(side):
+        if change[side] is None:
+            return '-'
+        covered, total = change[side]['lines']
+        return f'{covered}/{total}'
+
+    def spans(runs):
+        return ','.join(f'{first}' if first == last else f'{first}-{last}' for first, last in runs)
+
+    text = f"{change['status']:8} {change['file']}: lines {lines('old')} -> {lines('new')}"
+    if change['newly_uncovered']:
+        text += f"; newly uncovered {spans(change['newly_uncovered'])}"
+    if change['newly_covered']:
+        text += f"; newly covered {spans(change['newly_covered'])}"
+    return text
+
+
+def main():
+    commands = {'record': 4, 'list': 3, 'export': 5, 'summary': 5, 'tree': 5, 'diff': 5}
+    if len(sys.argv) < 2 or sys.argv[1] not in commands or len(sys.argv) < commands[sys.argv[1]]:
+        print("Usage: coverage_snapshots.py record <db> <tracefile> [--branch <name>] [--commit <sha>] [--timestamp <unix>]", file=sys.stderr)
+        print("       coverage_snapshots.py list <db> [--branch <name>]", file=sys.stderr)
+        print("       coverage_snapshots.py export|summary|tree <db> <snapshot> <output>", file=sys.stderr)
+        print("       coverage_snapshots.py diff <db> <old snapshot> <new snapshot> [--json]", file=sys.stderr)
+        print("  Stores per-commit coverage compactly and rebuilds tracefiles, summaries and trees from it.", file=sys.stderr)
+        sys.exit(1)
+
+    command, db_path = sys.argv[1], sys.argv[2]
+    branch = get_arg('--branch', '')
+    if command != 'record' and not os.path.isfile(db_path):
+        print(f"Error: {db_path} is not a file", file=sys.stderr)
+        sys.exit(1)
+    conn = open_store(db_path)
+
+    if command == 'record':
+        tracefile = sys.argv[3]
+        if not os.path.isfile(tracefile):
+            print(f"Error: {tracefile} is not a file", file=sys.stderr)
+            sys.exit(1)
+        timestamp = get_arg('--timestamp')
+        result = record_snapshot(conn, tracefile, branch, get_arg('--commit'),
+                                 int(timestamp) if timestamp else None)
+        if result is None:
+            print(f"Commit {get_arg('--commit')} is already the latest snapshot, nothing recorded")
+            return
+        snapshot_id, kinds, stored = result
+        print(f"Recorded snapshot {snapshot_id}: {kinds['full']} full, {kinds['delta']} delta and "
+              f"{kinds['reference']} unchanged vectors ({stored} bytes)")
+        return
+
+    if command == 'list':
+        query = f'SELECT {SNAPSHOT_COLUMNS} FROM snapshots'
+        params = ()
+        if '--branch' in sys.argv:
+            query += ' WHERE branch = ?'
+            params = (branch,)
+        for row in conn.execute(query + ' ORDER BY id', params):
+            stored = conn.execute('SELECT COUNT(*), SUM(lines_covered), SUM(lines_total), '
+                                  'SUM(LENGTH(data)) FROM vectors WHERE snapshot_id = ?',
+                                  (row['id'],)).fetchone()
+            when = time.strftime('%Y-%m-%d %H:%M', time.gmtime(row['timestamp']))
+            print(f"{row['id']:5}  {when}  {row['branch'] or '-':12}  {(row['commit_id'] or '-')[:12]:12}  "
+                  f"{stored[0]} files, lines {stored[1] or 0}/{stored[2] or 0}, {stored[3] or 0} bytes")
+        return
+
+    snapshots = []
+    for ref in sys.argv[3:5] if command == 'diff' else sys.argv[3:4]:
+        snapshot = find_snapshot(conn, ref, branch)
+        if snapshot is None:
+            print(f"Error: no snapshot {ref} in {db_path}", file=sys.stderr)
+            sys.exit(1)
+        snapshots.append(snapshot)
+
+    if command == 'diff':
+        changes = diff_snapshots(conn, snapshots[0]['id'], snapshots[1]['id'])
+        if '--json' in sys.argv:
+            json.dump(changes, sys.stdout, indent=1)
+            print()
+        else:
+            for change in changes:
+                print(format_change(change))
+        print(f"{len(changes)} files changed between snapshots {snapshots[0]['id']} "
+              f"and {snapshots[1]['id']}", file=sys.stderr)
+        return
+
+    out_path = sys.argv[4]
+    snapshot_id = snapshots[0]['id']
+    if command == 'export':
+        count = export_tracefile(conn, snapshot_id, out_path)
+    else:
+        rows = snapshot_rows(conn, snapshot_id)
+        data = summary_data(rows) if command == 'summary' else tree_data(rows)
+        with open(out_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        count = len(rows)
+    print(f"Wrote {out_path} from snapshot {snapshot_id} ({count} files)")
+
+
+if __name__ == '__main__':
+    main()
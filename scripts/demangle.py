@@ -0,0 +1,224 @@
+"""
+Batched C++ symbol demangling with a persistent cache.
+
+All symbols of a run are streamed through one long-lived c++filt process
+(kept open for the lifetime of the interpreter, so a batch_build.py worker
+or a long-running server reuses it). When c++filt is not installed,
+__cxa_demangle from the C++ runtime is called through ctypes instead.
+
+Results are stored in an SQLite cache keyed by symbol, so repeated builds
+only demangle symbols they have not seen before. The cache lives in
+$GCOVR_DEMANGLE_CACHE, or demangle.sqlite under $XDG_CACHE_HOME/gcovr
+(~/.cache/gcovr by default).
+"""
+
+import atexit
+import ctypes
+import ctypes.util
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+
+CACHE_ENV = 'GCOVR_DEMANGLE_CACHE'
+CACHE_NAME = 'demangle.sqlite'
+CXXFILT = os.environ.get('CXXFILT', 'c++filt')
+
+# Itanium ABI symbols; macOS adds one more leading underscore
+MANGLED_PREFIXES = ('_Z', '__Z')
+
+
+def default_cache_path():
+    """Location of the demangle cache."""
+    if os.environ.get(CACHE_ENV):
+        return Path(os.environ[CACHE_ENV])
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return Path(cache_home) / 'gcovr' / CACHE_NAME
+
+
+class CxxFilt:
+    """A c++filt process that demangles one symbol per line."""
+
+    def __init__(self, command=CXXFILT):
+        self.process = subprocess.Popen(
+            [command], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            text=True, encoding='utf-8', bufsize=1)
+        # One batch at a time: output lines are matched to input by position
+        self.lock = threading.Lock()
+
+    def demangle(self, symbols):
+        """Demangle a batch; the output has one line per input line."""
+        if not symbols:
+            return []
+        with self.lock:
+            return self._demangle(symbols)
+
+    def _demangle(self, symbols):
+        # Feed from a thread so a large batch cannot deadlock on full pipes
+        def feed():
+            try:
+                self.process.stdin.write('\n'.join(symbols) + '\n')
+                self.process.stdin.flush()
+            except (OSError, ValueError):
+                pass
+
+        writer = threading.Thread(target=feed, daemon=True)
+        writer.start()
+        results = []
+        for _ in symbols:
+            line = self.process.stdout.readline()
+            if not line:
+                raise OSError(f"{CXXFILT} exited unexpectedly")
+            results.append(line.rstrip('\n'))
+        writer.join()
+        return results
+
+    def close(self):
+        """Let c++filt exit after the last batch."""
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            self.process.kill()
+
+
+def load_cxa_demangle():
+    """Return a demangle(symbol) function backed by __cxa_demangle, or None."""
+    for name in ('stdc++', 'c++'):
+        path = ctypes.util.find_library(name)
+        if not path:
+            continue
+        try:
+            runtime = ctypes.CDLL(path)
+            cxa_demangle = runtime.__cxa_demangle
+            libc = ctypes.CDLL(ctypes.util.find_library('c'))
+        except (OSError, AttributeError):
+            continue
+        cxa_demangle.restype = ctypes.c_void_p
+        cxa_demangle.argtypes = [ctypes.c_char_p, ctypes.c_void_p, ctypes.c_void_p,
+                                 ctypes.POINTER(ctypes.c_int)]
+        libc.free.argtypes = [ctypes.c_void_p]
+
+        def demangle(symbol):
+            status = ctypes.c_int()
+            # __cxa_demangle does not know the extra macOS underscore
+            raw = symbol[1:] if symbol.startswith('__Z') else symbol
+            ptr = cxa_demangle(raw.encode('utf-8'), None, None, ctypes.byref(status))
+            if not ptr:
+                return symbol
+            try:
+                return ctypes.string_at(ptr).decode('utf-8', 'replace')
+            finally:
+                libc.free(ptr)
+
+        return demangle
+    return None
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return a function demangling a list of symbols, created once per process."""
+    with _backend_lock:
+        return _create_backend()
+
+
+def _create_backend():
+    global _backend
+    if _backend is not None:
+        return _backend
+
+    try:
+        cxxfilt = CxxFilt()
+        atexit.register(cxxfilt.close)
+        _backend = cxxfilt.demangle
+        return _backend
+    except OSError as e:
+        print(f"Warning: {CXXFILT} unavailable ({e}), trying __cxa_demangle", file=sys.stderr)
+
+    cxa_demangle = load_cxa_demangle()
+    if cxa_demangle is not None:
+        _backend = lambda symbols: [cxa_demangle(s) for s in symbols]
+    else:
+        print("Warning: no C++ demangler available, using mangled names", file=sys.stderr)
+        _backend = False
+    return _backend
+
+
+def open_cache(cache_path):
+    """Open the symbol cache, or return None if it cannot be used."""
+    try:
+        Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(cache_path, timeout=30)
+        conn.execute('CREATE TABLE IF NOT EXISTS demangled '
+                     '(symbol TEXT PRIMARY KEY, name TEXT NOT NULL)')
+        return conn
+    except (OSError, sqlite3.Error) as e:
+        print(f"Warning: demangle cache {cache_path} unavailable: {e}", file=sys.stderr)
+        return None
+
+
+def cached_names(conn, symbols, chunk=500):
+    """Look up symbols in the cache (in chunks, to stay under SQLite's parameter limit)."""
+    found = {}
+    for i in range(0, len(symbols), chunk):
+        part = symbols[i:i + chunk]
+        rows = conn.execute(
+            f"SELECT symbol, name FROM demangled WHERE symbol IN ({','.join('?' * len(part))})",
+            part)
+        found.update(rows)
+    return found
+
+
+def demangle_names(names, cache_path=None):
+    """Map every name to its demangled form. Non-mangled names map to themselves."""
+    result = {}
+    symbols = []
+    for name in set(names):
+        if name.startswith(MANGLED_PREFIXES):
+            symbols.append(name)
+        else:
+            result[name] = name
+    if not symbols:
+        return result
+
+    conn = open_cache(cache_path or default_cache_path())
+    try:
+        if conn is not None:
+            try:
+                result.update(cached_names(conn, symbols))
+            except sqlite3.Error as e:
+                print(f"Warning: demangle cache lookup failed: {e}", file=sys.stderr)
+        missing = sorted(s for s in symbols if s not in result)
+
+        backend = get_backend() if missing else None
+        demangled = None
+        if missing and backend:
+            try:
+                demangled = dict(zip(missing, backend(missing)))
+            except OSError as e:
+                print(f"Warning: demangling failed ({e}), using mangled names", file=sys.stderr)
+        if demangled:
+            result.update(demangled)
+            if conn is not None:
+                # Symbols the demangler returned unchanged are left out, so
+                # a later run (or a newer demangler) can retry them
+                rows = [(symbol, name) for symbol, name in demangled.items() if name != symbol]
+                try:
+                    with conn:
+                        conn.executemany('INSERT OR REPLACE INTO demangled (symbol, name) VALUES (?, ?)',
+                                         rows)
+                except sqlite3.Error as e:
+                    print(f"Warning: demangle cache update failed: {e}", file=sys.stderr)
+        else:
+            # Not cached: a later run with a demangler can still fill them in
+            result.update((s, s) for s in missing)
+    finally:
+        if conn is not None:
+            conn.close()
+    return result
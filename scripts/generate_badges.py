@@ -4,12 +4,20 @@ Generate coverage badges from gcovr output.
 
 This script parses gcovr HTML or JSON output and generates SVG badges
 in shields.io flat style for lines, functions, and branches coverage.
+
+With --per-node it additionally writes badges for every directory and file
+of the report under badges/<path>/, taken from the gcovr JSON summary
+(--json) or from tree.json.
 """
 
 import json
 import os
+import posixpath
 import re
+import string
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 
 
@@ -190,6 +198,22 @@ BADGE_TEMPLATE = '''<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://
 </svg>'''
 
 
+def split_template(template):
+    """Split a str.format template into [(literal, field_name), ...] once."""
+    return [(literal, field) for literal, field, _spec, _conv
+            in string.Formatter().parse(template)]
+
+
+BADGE_CHUNKS = split_template(BADGE_TEMPLATE)
+
+BADGE_FILES = (
+    ('coverage-lines.svg', 'coverage', 'lines'),
+    ('coverage-functions.svg', 'functions', 'functions'),
+    ('coverage-branches.svg', 'branches', 'branches'),
+)
+BADGE_WORKERS = 8
+
+
 # Standard shields.io colors
 COLORS = {
     'brightgreen': '#4c1',
@@ -215,6 +239,7 @@ def get_color_for_coverage(percentage):
         return COLORS['red']
 
 
+@lru_cache(maxsize=None)
 def estimate_text_width(text):
     """Estimate text width in pixels (approximate)."""
     # Average character width for Verdana 11px is about 6.5-7px
@@ -224,15 +249,18 @@ def estimate_text_width(text):
 def generate_badge_svg(label, value):
     """Generate an SVG badge with the given label and value."""
     value_str = f"{value:.0f}" if isinstance(value, float) else str(value)
+    return render_badge_svg(label, value_str, get_color_for_coverage(value))
 
+
+@lru_cache(maxsize=None)
+def render_badge_svg(label, value_str, color):
+    """Render the badge SVG. Memoized: per label there are only ~100 distinct values."""
     logo_space = LOGO_PAD_LEFT + LOGO_WIDTH + LOGO_PAD_RIGHT
     text_width = estimate_text_width(label)
     label_width = logo_space + text_width
     value_width = estimate_text_width(f"{value_str}%")
     total_width = label_width + value_width
 
-    color = get_color_for_coverage(value)
-
     # Logo sits at left edge with padding
     logo_x = LOGO_PAD_LEFT
     # Label text is centered in the remaining space after the logo
@@ -240,56 +268,85 @@ def generate_badge_svg(label, value):
     # Value text is centered in the value section
     value_x = (label_width + value_width / 2) * 10
 
-    return BADGE_TEMPLATE.format(
-        width=total_width,
-        label_width=label_width,
-        value_width=value_width,
-        label=label,
-        value=value_str,
-        color=color,
-        logo_x=logo_x,
-        logo_base64=LOGO_BASE64,
-        label_x=int(label_x),
-        value_x=int(value_x)
-    )
+    fields = {
+        'width': total_width,
+        'label_width': label_width,
+        'value_width': value_width,
+        'label': label,
+        'value': value_str,
+        'color': color,
+        'logo_x': logo_x,
+        'logo_base64': LOGO_BASE64,
+        'label_x': int(label_x),
+        'value_x': int(value_x),
+    }
+    return ''.join(literal + (str(fields[field]) if field is not None else '')
+                   for literal, field in BADGE_CHUNKS)
+
+
+# Summary cards in gcovr HTML output (see directory_page.summary.html)
+CARD_START = '<div class="summary-card">'
+CARD_PATTERN = re.compile(
+    r'<div class="summary-card">\s*'
+    r'<div class="summary-card-header">\s*<h3>(\w+)</h3>\s*</div>\s*'
+    r'<div class="summary-card-body">.*?'
+    r'<(?:span|div) class="ring-text">([^<]+)</(?:span|div)>',
+    re.DOTALL
+)
+CARD_TYPES = ('lines', 'functions', 'branches')
+
+# The cards sit right after the inlined CSS/JS at the top of the page, so
+# reading stops long before the end of large (e.g. --html-single-page)
+# reports. The cap only matters for pages without summary cards.
+HTML_CHUNK_SIZE = 16 * 1024
+HTML_MAX_HEADER_BYTES = 4 * 1024 * 1024
 
 
 def parse_coverage_from_html(html_path):
-    """Parse coverage data from gcovr HTML output using regex."""
-    try:
-        with open(html_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+    """Parse coverage data from the summary cards of gcovr HTML output.
 
+    The file is read incrementally in bounded chunks and reading stops as
+    soon as the lines, functions and branches cards have been seen.
+    """
+    try:
         coverage_data = {
             'lines': None,
             'functions': None,
             'branches': None
         }
+        seen = set()
+        buffer = ''
+        bytes_read = 0
 
-        # Find each summary-card and extract type + percentage directly
-        # from the full HTML content (avoids fragile summary-section extraction).
-        card_pattern = re.compile(
-            r'<div class="summary-card">\s*'
-            r'<div class="summary-card-header">\s*<h3>(\w+)</h3>\s*</div>\s*'
-            r'<div class="summary-card-body">.*?'
-            r'<(?:span|div) class="ring-text">([^<]+)</(?:span|div)>',
-            re.DOTALL
-        )
-
-        for match in card_pattern.finditer(content):
-            stat_type = match.group(1).lower()
-            percentage_text = match.group(2).strip()
-
-            # Extract numeric percentage (skip "-%" which means no data)
-            pct_match = re.search(r'([\d.]+)\s*%', percentage_text)
-            if pct_match:
-                percentage = float(pct_match.group(1))
-                if stat_type == 'lines':
-                    coverage_data['lines'] = percentage
-                elif stat_type == 'functions':
-                    coverage_data['functions'] = percentage
-                elif stat_type == 'branches':
-                    coverage_data['branches'] = percentage
+        with open(html_path, 'r', encoding='utf-8') as f:
+            while len(seen) < len(CARD_TYPES) and bytes_read < HTML_MAX_HEADER_BYTES:
+                chunk = f.read(HTML_CHUNK_SIZE)
+                if not chunk:
+                    break
+                bytes_read += len(chunk)
+                buffer += chunk
+
+                consumed = 0
+                for match in CARD_PATTERN.finditer(buffer):
+                    stat_type = match.group(1).lower()
+                    percentage_text = match.group(2).strip()
+                    consumed = match.end()
+                    seen.add(stat_type)
+
+                    # Extract numeric percentage (skip "-%" which means no data)
+                    pct_match = re.search(r'([\d.]+)\s*%', percentage_text)
+                    if pct_match and stat_type in coverage_data:
+                        coverage_data[stat_type] = float(pct_match.group(1))
+
+                # Keep only what may still hold an incomplete card: from the
+                # last unmatched card start, or a tail long enough to contain
+                # a card start split across chunks
+                buffer = buffer[consumed:]
+                card_idx = buffer.rfind(CARD_START)
+                if card_idx >= 0:
+                    buffer = buffer[card_idx:]
+                else:
+                    buffer = buffer[-len(CARD_START):]
 
         return coverage_data
     except Exception as e:
@@ -336,14 +393,9 @@ def generate_badges(output_dir, coverage_data):
     badges_dir = Path(output_dir) / 'badges'
     badges_dir.mkdir(exist_ok=True)
 
-    badge_configs = [
-        ('coverage-lines.svg', 'coverage', coverage_data.get('lines')),
-        ('coverage-functions.svg', 'functions', coverage_data.get('functions')),
-        ('coverage-branches.svg', 'branches', coverage_data.get('branches')),
-    ]
-
     generated = []
-    for filename, label, value in badge_configs:
+    for filename, label, key in BADGE_FILES:
+        value = coverage_data.get(key)
         if value is not None:
             svg = generate_badge_svg(label, value)
             badge_path = badges_dir / filename
@@ -367,25 +419,105 @@ def generate_badges(output_dir, coverage_data):
     return generated
 
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: generate_badges.py <gcovr_output_dir> [--json <summary.json>]", file=sys.stderr)
-        print("  Parses index.html or JSON summary to generate coverage badges.", file=sys.stderr)
-        sys.exit(1)
+def percent(covered, total):
+    """Coverage percentage, or None when there is nothing to cover."""
+    return covered * 100.0 / total if total else None
+
+
+def collect_tree_nodes(tree):
+    """Return [(path, coverage_data)] for every node of tree.json.
+
+    tree.json only carries line coverage, so functions and branches are None.
+    """
+    nodes = []
+    stack = [('', item) for item in reversed(tree)]
+    while stack:
+        parent, item = stack.pop()
+        path = posixpath.join(parent, item['name']) if parent else item['name']
+        try:
+            lines = float(item.get('coverage'))
+        except (TypeError, ValueError):
+            lines = None
+        nodes.append((path, {'lines': lines, 'functions': None, 'branches': None}))
+        for child in reversed(item.get('children') or []):
+            stack.append((path, child))
+    return nodes
+
+
+def collect_summary_nodes(data):
+    """Return [(path, coverage_data)] for every file and directory of a gcovr JSON summary.
+
+    Directory percentages are recomputed from the per-file totals. Paths are
+    made relative to the common directory of all files, like tree.json.
+    """
+    files = data.get('files') or []
+    if not files:
+        return []
+
+    names = [f['filename'].replace('\\', '/') for f in files]
+    prefix = posixpath.commonpath(names) if len(names) > 1 else posixpath.dirname(names[0])
+
+    kinds = (('lines', 'line'), ('functions', 'function'), ('branches', 'branch'))
+    totals = {}
+    for name, entry in zip(names, files):
+        path = posixpath.relpath(name, prefix) if prefix else name
+        counts = [(entry.get(f'{key}_covered', 0), entry.get(f'{key}_total', 0))
+                  for _kind, key in kinds]
+        # Credit the file itself and every directory above it
+        while path:
+            node = totals.setdefault(path, [[0, 0] for _ in kinds])
+            for slot, (covered, total) in zip(node, counts):
+                slot[0] += covered
+                slot[1] += total
+            path = posixpath.dirname(path)
+
+    return [(path, {kind: percent(*node[i]) for i, (kind, _key) in enumerate(kinds)})
+            for path, node in sorted(totals.items())]
+
+
+def write_badge(path, svg):
+    """Write one badge, creating its directory."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(svg)
+
+
+def clean_path(path):
+    """Badge path of a node, cleaned like cleanPathName() in gcovr.js.
+
+    Empty, '.' and '..' segments are dropped (not only leading ones), so a
+    badge can never be written outside badges/.
+    """
+    parts = [part for part in path.replace('\\', '/').split('/') if part not in ('', '.', '..')]
+    return '/'.join(parts) or 'unknown'
+
+
+def generate_node_badges(output_dir, nodes, workers=BADGE_WORKERS):
+    """Write badges/<path>/coverage-*.svg for every node. Returns the badge count."""
+    badges_dir = Path(output_dir) / 'badges'
 
-    output_dir = sys.argv[1]
-    json_path = None
+    # Paths that clean to the same badge directory are written once
+    unique = {}
+    for path, coverage_data in nodes:
+        unique.setdefault(clean_path(path), coverage_data)
 
-    # Check for --json argument
-    if '--json' in sys.argv:
-        json_idx = sys.argv.index('--json')
-        if json_idx + 1 < len(sys.argv):
-            json_path = sys.argv[json_idx + 1]
+    jobs = []
+    for path, coverage_data in unique.items():
+        node_dir = badges_dir.joinpath(*path.split('/'))
+        for filename, label, key in BADGE_FILES:
+            value = coverage_data.get(key)
+            if value is not None:
+                jobs.append((node_dir / filename, generate_badge_svg(label, value)))
+
+    # Rendering is memoized and cheap; the pool overlaps the many small writes
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for _ in pool.map(lambda job: write_badge(*job), jobs):
+            pass
+    return len(jobs)
 
-    if not os.path.isdir(output_dir):
-        print(f"Error: {output_dir} is not a directory", file=sys.stderr)
-        sys.exit(1)
 
+def build_badges(output_dir, json_path=None, per_node=False):
+    """Generate all badges for a report. Returns the badge count, or None on error."""
     coverage_data = None
 
     # Try JSON first if specified
@@ -402,7 +534,7 @@ def main():
 
     if not coverage_data or all(v is None for v in coverage_data.values()):
         print("Error: Could not extract coverage data", file=sys.stderr)
-        sys.exit(1)
+        return None
 
     print(f"Coverage data: lines={coverage_data.get('lines')}, "
           f"functions={coverage_data.get('functions')}, "
@@ -410,6 +542,54 @@ def main():
 
     generated = generate_badges(output_dir, coverage_data)
     print(f"Successfully generated {len(generated)} badges in {output_dir}/badges/")
+    count = len(generated)
+
+    if per_node:
+        nodes = []
+        if json_path and os.path.isfile(json_path):
+            try:
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    nodes = collect_summary_nodes(json.load(f))
+            except Exception as e:
+                print(f"Error parsing JSON: {e}", file=sys.stderr)
+        tree_path = os.path.join(output_dir, 'tree.json')
+        if not nodes and os.path.isfile(tree_path):
+            with open(tree_path, 'r', encoding='utf-8') as f:
+                nodes = collect_tree_nodes(json.load(f))
+        if not nodes:
+            print("Error: --per-node needs a JSON summary with files or tree.json", file=sys.stderr)
+            return None
+
+        node_count = generate_node_badges(output_dir, nodes)
+        print(f"Generated {node_count} badges for {len(nodes)} directories and files")
+        count += node_count
+
+    return count
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: generate_badges.py <gcovr_output_dir> [--json <summary.json>] [--per-node]", file=sys.stderr)
+        print("  Parses index.html or JSON summary to generate coverage badges.", file=sys.stderr)
+        print("  --per-node also writes badges/<path>/ for every directory and file.", file=sys.stderr)
+        sys.exit(1)
+
+    output_dir = sys.argv[1]
+    json_path = None
+    per_node = '--per-node' in sys.argv
+
+    # Check for --json argument
+    if '--json' in sys.argv:
+        json_idx = sys.argv.index('--json')
+        if json_idx + 1 < len(sys.argv):
+            json_path = sys.argv[json_idx + 1]
+
+    if not os.path.isdir(output_dir):
+        print(f"Error: {output_dir} is not a directory", file=sys.stderr)
+        sys.exit(1)
+
+    if build_badges(output_dir, json_path, per_node) is None:
+        sys.exit(1)
 
 
 if __name__ == '__main__':
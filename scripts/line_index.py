@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Index which tests execute which source lines.
+
+Takes one lcov tracefile per test binary (json/test, e.g. tracefiles/parser.info)
+and builds an inverted index (file, line) -> set of tests, so questions like
+"which tests run basic_parser_impl.hpp:1200?" are answered without rerunning
+anything. The test of a tracefile is its file name without .info.
+
+Test sets are bitmaps (bit i = test i). Neighbouring lines are usually run
+by exactly the same tests, so the index stores each distinct bitmap once and
+every file as runs of consecutive lines sharing one:
+
+  {
+    "tests": ["array", "basic_parser", ...],
+    "sets": ["<hex bitmap>", ...],
+    "files": {"boost/json/detail/array.hpp": [[first, last, set], ...]}
+  }
+
+Usage:
+  line_index.py build <tracefile_dir> <index.json>
+  line_index.py query <index.json> <file>:<line>[-<last>]... [--json]
+"""
+
+import bisect
+import json
+import os
+import sys
+from pathlib import Path
+
+from tracefile import display_path, iter_records
+
+
+INDEX_VERSION = 1
+
+
+def find_tracefiles(tracefile_dir):
+    """Return {test name: tracefile} for every .info file in the directory."""
+    return {path.stem: path for path in sorted(Path(tracefile_dir).glob('*.info'))}
+
+
+def collect_bitmaps(tracefiles):
+    """Return (tests, {file: {line: bitmap}}) over all per-test tracefiles."""
+    tests = sorted(tracefiles)
+    lines = {}
+    for bit, test in enumerate(tests):
+        mask = 1 << bit
+        for record in iter_records(tracefiles[test]):
+            file_lines = lines.setdefault(display_path(record['path']), {})
+            for lineno, hits in record['lines'].items():
+                if hits > 0:
+                    file_lines[lineno] = file_lines.get(lineno, 0) | mask
+    return tests, lines
+
+
+def encode_index(tests, lines):
+    """Pack the line bitmaps into deduplicated sets and line runs."""
+    set_ids = {}
+    sets = []
+    files = {}
+    for path in sorted(lines):
+        runs = []
+        for lineno in sorted(lines[path]):
+            bitmap = lines[path][lineno]
+            set_id = set_ids.get(bitmap)
+            if set_id is None:
+                set_id = set_ids[bitmap] = len(sets)
+                sets.append(format(bitmap, 'x'))
+            if runs and runs[-1][1] == lineno - 1 and runs[-1][2] == set_id:
+                runs[-1][1] = lineno
+            else:
+                runs.append([lineno, lineno, set_id])
+        if runs:
+            files[path] = runs
+    return {'version': INDEX_VERSION, 'tests': tests, 'sets': sets, 'files': files}
+
+
+def build_index(tracefile_dir, index_path):
+    """Build and write the index. Returns it."""
+    tracefiles = find_tracefiles(tracefile_dir)
+    index = encode_index(*collect_bitmaps(tracefiles))
+    with open(index_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, separators=(',', ':'))
+    return index
+
+
+class LineIndex:
+    """Query side of the index: tests for lines, with the bitmaps decoded lazily."""
+
+    def __init__(self, data):
+        self.tests = data['tests']
+        self.sets = data['sets']
+        self.files = data['files']
+        self._starts = {}
+
+    @classmethod
+    def load(cls, index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != INDEX_VERSION:
+            raise ValueError(f"unsupported test index version {data.get('version')}")
+        return cls(data)
+
+    def match_files(self, path):
+        """Indexed files equal to path or ending in /path."""
+        path = path.replace('\\', '/')
+        if path.startswith('./'):
+            path = path[2:]
+        if path in self.files:
+            return [path]
+        suffix = '/' + path
+        return [name for name in self.files if name.endswith(suffix)]
+
+    def bitmap(self, path, first, last=None):
+        """Bitmap of the tests executing any line of path in [first, last]."""
+        runs = self.files.get(path)
+        if not runs:
+            return 0
+        last = first if last is None else last
+        starts = self._starts.get(path)
+        if starts is None:
+            starts = self._starts[path] = [run[0] for run in runs]
+
+        bitmap = 0
+        i = max(bisect.bisect_right(starts, first) - 1, 0)
+        while i < len(runs) and runs[i][0] <= last:
+            if runs[i][1] >= first:
+                bitmap |= int(self.sets[runs[i][2]], 16)
+            i += 1
+        return bitmap
+
+    def test_names(self, bitmap):
+        """Names of the tests set in a bitmap."""
+        return [test for bit, test in enumerate(self.tests) if bitmap >> bit & 1]
+
+
+def parse_location(location):
+    """Split file:line or file:first-last into (file, first, last)."""
+    path, sep, span = location.rpartition(':')
+    if not sep:
+        raise ValueError(f"expected <file>:<line>, got {location}")
+    first, _, last = span.partition('-')
+    return path, int(first), int(last or first)
+
+
+def main():
+    if len(sys.argv) < 4 or sys.argv[1] not in ('build', 'query'):
+        print("Usage: line_index.py build <tracefile_dir> <index.json>", file=sys.stderr)
+        print("       line_index.py query <index.json> <file>:<line>[-<last>]... [--json]", file=sys.stderr)
+        print("  Maps source lines to the tests (one tracefile each) that execute them.", file=sys.stderr)
+        sys.exit(1)
+
+    if sys.argv[1] == 'build':
+        tracefile_dir, index_path = sys.argv[2], sys.argv[3]
+        if not os.path.isdir(tracefile_dir):
+            print(f"Error: {tracefile_dir} is not a directory", file=sys.stderr)
+            sys.exit(1)
+        index = build_index(tracefile_dir, index_path)
+        if not index['tests']:
+            print(f"Error: no .info tracefiles in {tracefile_dir}", file=sys.stderr)
+            sys.exit(1)
+        runs = sum(len(file_runs) for file_runs in index['files'].values())
+        print(f"Indexed {len(index['tests'])} tests over {len(index['files'])} files "
+              f"({runs} line runs, {len(index['sets'])} distinct test sets) into {index_path}")
+        return
+
+    as_json = '--json' in sys.argv
+    locations = [arg for arg in sys.argv[3:] if arg != '--json']
+    try:
+        index = LineIndex.load(sys.argv[2])
+    except (OSError, ValueError) as e:
+        print(f"Error reading {sys.argv[2]}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    results = []
+    for location in locations:
+        try:
+            path, first, last = parse_location(location)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        files = index.match_files(path)
+        if not files:
+            print(f"Warning: {path} is not in the index", file=sys.stderr)
+        for name in files:
+            results.append({'file': name, 'first': first, 'last': last,
+                            'tests': index.test_names(index.bitmap(name, first, last))})
+
+    if as_json:
+        json.dump(results, sys.stdout, indent=1)
+        print()
+        return
+    for result in results:
+        span = (f"{result['first']}" if result['first'] == result['last']
+                else f"{result['first']}-{result['last']}")
+        tests = ', '.join(result['tests']) or '(no test executes these lines)'
+        print(f"{result['file']}:{span}: {tests}")
+
+
+if __name__ == '__main__':
+    main()
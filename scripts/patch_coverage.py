@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Coverage of the lines a change touches (patch coverage).
+
+Takes the tracefiles of the base and head revisions and the unified diff
+between them, and reports per changed file:
+  - changed lines: head lines added or modified by the diff, and how many
+    of the instrumented ones the tests execute
+  - lost lines: unchanged lines that were executed on base but are no
+    longer executed on head
+
+Each file of the diff becomes an interval index: the added lines as sorted
+runs, and the hunks sorted by position so any head line maps back to its
+base line with one bisect. Both tracefiles are read in one streaming pass
+each, keeping only the records of files in the diff.
+
+Output (in <gcovr_output_dir>/, the report of the head revision):
+  patch.html  summary page with deep links to the changed source lines
+  patch.json  the same data
+"""
+
+import bisect
+import html
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from build_hotspots import ACTIONS_RE, FUNCTIONS_PAGE, TITLE_RE, build_page
+from cli import get_arg
+from select_tests import DEFAULT_REPO, iter_hunks, read_diff
+from tracefile import display_path, find_source_page, iter_records, source_page_map
+
+
+PATCH_PAGE = 'patch.html'
+PATCH_JSON = 'patch.json'
+FAIL_EXIT = 2
+
+
+class FileDiff:
+    """Interval index over the hunks of one file of the diff."""
+
+    def __init__(self, old_path, new_path):
+        self.old_path = old_path
+        self.new_path = new_path
+        self.hunks = []   # (new start, new end, old start, old end, {new: old} for context)
+        self.added = []   # head line numbers added or modified by the diff
+        self.starts = self.ends = self.hunk_ends = None
+
+    def add_hunk(self, old_start, old_count, new_start, new_count, lines):
+        # An empty side of a -U0 hunk sits after its start line
+        old_end = old_start + old_count if old_count else old_start + 1
+        new_end = new_start + new_count if new_count else new_start + 1
+        context = {new: old for old, new in lines if old is not None and new is not None}
+        self.hunks.append((new_start if new_count else new_end, new_end,
+                           old_start if old_count else old_end, old_end, context))
+        self.added.extend(new for old, new in lines if old is None)
+
+    def finish(self):
+        """Sort the hunks and merge the added lines into runs."""
+        self.hunks.sort(key=lambda hunk: hunk[0])
+        self.hunk_ends = [hunk[1] for hunk in self.hunks]
+        runs = []
+        for line in sorted(set(self.added)):
+            if runs and runs[-1][1] == line - 1:
+                runs[-1][1] = line
+            else:
+                runs.append([line, line])
+        self.starts = [run[0] for run in runs]
+        self.ends = [run[1] for run in runs]
+
+    def is_changed(self, line):
+        """Whether a head line was added or modified by the diff."""
+        i = bisect.bisect_right(self.starts, line) - 1
+        return i >= 0 and self.ends[i] >= line
+
+    def old_line(self, line):
+        """Base line number of an unchanged head line."""
+        i = bisect.bisect_right(self.hunk_ends, line)
+        if i < len(self.hunks) and self.hunks[i][0] <= line:
+            return self.hunks[i][4].get(line)  # inside a hunk: only context lines map
+        if i == 0:
+            return line
+        _, new_end, _, old_end, _ = self.hunks[i - 1]
+        return line - new_end + old_end
+
+
+def parse_file_diffs(text):
+    """Return {new path: FileDiff} for every file the diff modifies or adds."""
+    diffs = {}
+    for old_path, new_path, old_start, old_count, new_start, new_count, lines in iter_hunks(text):
+        if new_path is None:
+            continue  # deleted file: nothing left to cover
+        file_diff = diffs.get(new_path)
+        if file_diff is None:
+            file_diff = diffs[new_path] = FileDiff(old_path, new_path)
+        file_diff.add_hunk(old_start, old_count, new_start, new_count, lines)
+    for file_diff in diffs.values():
+        file_diff.finish()
+    return diffs
+
+
+def suffix_map(paths):
+    """Map path suffixes (two components or more) to the diff path they come from."""
+    suffixes = {}
+    for path in sorted(paths, key=lambda p: -p.count('/')):
+        parts = path.split('/')
+        for i in range(max(len(parts) - 1, 1)):
+            suffixes.setdefault('/'.join(parts[i:]), path)
+    return suffixes
+
+
+def match_path(suffixes, path):
+    """Diff path matching the longest suffix of a tracefile path, or None."""
+    parts = path.replace('\\', '/').split('/')
+    for i in range(len(parts)):
+        match = suffixes.get('/'.join(parts[i:]))
+        if match:
+            return match
+    return None
+
+
+def collect_base(tracefile, diffs):
+    """Return {new path: base line hits} for the files of the diff."""
+    old_paths = {file_diff.old_path: new_path for new_path, file_diff in diffs.items()
+                 if file_diff.old_path}
+    suffixes = suffix_map(old_paths)
+    base = {}
+    for record in iter_records(tracefile):
+        old_path = match_path(suffixes, record['path'])
+        if old_path:
+            base[old_paths[old_path]] = record['lines']
+    return base
+
+
+def line_runs(lines):
+    """Collapse sorted line numbers into (first, last) runs."""
+    runs = []
+    for line in lines:
+        if runs and runs[-1][1] == line - 1:
+            runs[-1][1] = line
+        else:
+            runs.append([line, line])
+    return [tuple(run) for run in runs]
+
+
+def file_coverage(lines):
+    """(covered, instrumented) over a {line: hits} map."""
+    return sum(1 for hits in lines.values() if hits > 0), len(lines)
+
+
+def compare_files(tracefile, diffs, base, pages):
+    """Stream the head tracefile and compute the coverage of every changed file."""
+    suffixes = suffix_map(diffs)
+    files = []
+    for record in iter_records(tracefile):
+        new_path = match_path(suffixes, record['path'])
+        if not new_path:
+            continue
+        file_diff = diffs[new_path]
+        base_lines = base.get(new_path, {})
+
+        covered, uncovered, lost = [], [], []
+        for line, hits in sorted(record['lines'].items()):
+            if file_diff.is_changed(line):
+                (covered if hits > 0 else uncovered).append(line)
+            elif hits == 0:
+                old = file_diff.old_line(line)
+                if old is not None and base_lines.get(old, 0) > 0:
+                    lost.append(line)
+        if not covered and not uncovered and not lost:
+            continue
+
+        files.append({
+            'file': new_path,
+            'path': display_path(record['path']),
+            'page': find_source_page(pages, record['path']),
+            'covered': len(covered),
+            'instrumented': len(covered) + len(uncovered),
+            'uncovered': line_runs(uncovered),
+            'lost': line_runs(lost),
+            'head': file_coverage(record['lines']),
+            'base': file_coverage(base_lines) if base_lines else None,
+        })
+    return files
+
+
+def percent(covered, total):
+    return covered / total * 100 if total else 100.0
+
+
+def run_links(runs, page):
+    """Line runs as links into the source page."""
+    links = []
+    for first, last in runs:
+        label = f'{first}' if first == last else f'{first}-{last}'
+        links.append(f'<a href="{html.escape(page)}#l{first}">{label}</a>' if page else label)
+    return ', '.join(links)
+
+
+def patch_row(entry):
+    """One .function-row in the layout of functions_page.content.html."""
+    name = html.escape(entry['file'])
+    pct = percent(entry['covered'], entry['instrumented'])
+    details = []
+    if entry['uncovered']:
+        details.append(f"Not executed: {run_links(entry['uncovered'], entry['page'])}")
+    if entry['lost']:
+        details.append(f"No longer executed: {run_links(entry['lost'], entry['page'])}")
+    title = f'<a href="{html.escape(entry["page"])}">{name}</a>' if entry['page'] else name
+    lost = sum(last - first + 1 for first, last in entry['lost'])
+    return (f'    <div class="function-row" data-name="{name}" data-coverage="{pct:.2f}" '
+            f'data-changed="{entry["instrumented"]}" data-lost="{lost}">\n'
+            f'      <div class="col-function"><span class="function-name">{title}</span>'
+            f'<span class="function-location">{"<br>".join(details)}</span></div>\n'
+            f'      <div class="col-calls">{entry["covered"]} / {entry["instrumented"]}</div>\n'
+            f'      <div class="col-lines">{pct:.1f}%</div>\n'
+            f'      <div class="col-branches">{lost}</div>\n'
+            f'    </div>\n')
+
+
+def patch_table(files):
+    """A functions-container with sortable headers around the file rows."""
+    return ('\n<div class="functions-container">\n'
+            '  <div class="functions-header">\n'
+            '    <div class="col-function sortable" data-sort="name">File</div>\n'
+            '    <div class="col-calls sortable" data-sort="changed">Changed lines</div>\n'
+            '    <div class="col-lines sortable sorted-ascending" data-sort="coverage">Coverage</div>\n'
+            '    <div class="col-branches sortable" data-sort="lost">Lost</div>\n'
+            '  </div>\n\n'
+            '  <div class="functions-body">\n'
+            + ''.join(patch_row(entry) for entry in files) +
+            '  </div>\n'
+            '</div>')
+
+
+def summary_html(totals):
+    """Inline summary in the style of functions_page.summary.html."""
+    return ('\n<div class="summary-inline">\n'
+            '  <div class="summary-stat">\n'
+            '    <span class="stat-label">Patch coverage:</span>\n'
+            f'    <span class="stat-value">{totals["percent"]:.1f}%</span>\n'
+            f'    <span class="stat-detail">({totals["covered"]} / {totals["instrumented"]})</span>\n'
+            '  </div>\n'
+            '  <div class="summary-stat">\n'
+            '    <span class="stat-label">Files:</span>\n'
+            f'    <span class="stat-value">{totals["files"]}</span>\n'
+            '  </div>\n'
+            '  <div class="summary-stat">\n'
+            '    <span class="stat-label">No longer executed:</span>\n'
+            f'    <span class="stat-value">{totals["lost"]}</span>\n'
+            '  </div>\n'
+            '</div>')
+
+
+def summarize(files):
+    """Totals over all changed files."""
+    covered = sum(entry['covered'] for entry in files)
+    instrumented = sum(entry['instrumented'] for entry in files)
+    return {
+        'covered': covered,
+        'instrumented': instrumented,
+        'percent': percent(covered, instrumented),
+        'files': len(files),
+        'lost': sum(last - first + 1 for entry in files for first, last in entry['lost']),
+    }
+
+
+def write_page(output_dir, files, totals):
+    """Write patch.html. Returns False if there is no functions page to use as shell."""
+    output_path = Path(output_dir)
+    try:
+        with open(output_path / FUNCTIONS_PAGE, 'r', encoding='utf-8') as f:
+            shell = f.read()
+    except OSError as e:
+        print(f"Error reading {FUNCTIONS_PAGE}, skipping HTML output: {e}", file=sys.stderr)
+        return False
+
+    head = TITLE_RE.search(shell)
+    report = head.group(0)[len('<title>'):-len('</title>')].split(' - ', 1)[-1] if head else ''
+    # Least covered first
+    files = sorted(files, key=lambda entry: (percent(entry['covered'], entry['instrumented']),
+                                             entry['file']))
+    actions = f'\n            <a class="btn btn-sm" href="{FUNCTIONS_PAGE}">All functions</a>'
+    page = build_page(shell, f'Patch coverage - {report}', actions, summary_html(totals),
+                      patch_table(files), label='Patch coverage')
+    with open(output_path / PATCH_PAGE, 'w', encoding='utf-8') as f:
+        f.write(page)
+
+    # Link the patch coverage from the regular functions page
+    link = f'<a class="btn btn-sm" href="{PATCH_PAGE}">Patch coverage</a>'
+    if link not in shell:
+        shell = ACTIONS_RE.sub(lambda m: m.group(1) + '\n            ' + link + m.group(2) + m.group(3),
+                               shell, count=1)
+        with open(output_path / FUNCTIONS_PAGE, 'w', encoding='utf-8') as f:
+            f.write(shell)
+    return True
+
+
+def write_json(output_dir, files, totals):
+    """Write the patch coverage to patch.json."""
+    with open(Path(output_dir) / PATCH_JSON, 'w', encoding='utf-8') as f:
+        json.dump({'summary': totals, 'files': files}, f, indent=1)
+
+
+def main():
+    if len(sys.argv) < 4 or ('--diff' not in sys.argv and '--base' not in sys.argv):
+        print("Usage: patch_coverage.py <gcovr_output_dir> <base.info> <head.info>", file=sys.stderr)
+        print("         (--diff <patch|-> | --base <rev>) [--repo <dir>] [--fail-under <pct>]", file=sys.stderr)
+        print("  Reports the coverage of the lines changed between two revisions.", file=sys.stderr)
+        sys.exit(1)
+
+    output_dir, base_tracefile, head_tracefile = sys.argv[1:4]
+    fail_under = get_arg('--fail-under')
+
+    if not os.path.isdir(output_dir):
+        print(f"Error: {output_dir} is not a directory", file=sys.stderr)
+        sys.exit(1)
+    for tracefile in (base_tracefile, head_tracefile):
+        if not os.path.isfile(tracefile):
+            print(f"Error: {tracefile} is not a file", file=sys.stderr)
+            sys.exit(1)
+    try:
+        text = read_diff(get_arg('--diff'), get_arg('--base'), get_arg('--repo', DEFAULT_REPO))
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"Error reading the diff: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    diffs = parse_file_diffs(text)
+    base = collect_base(base_tracefile, diffs)
+    files = compare_files(head_tracefile, diffs, base, source_page_map(output_dir))
+    totals = summarize(files)
+
+    write_json(output_dir, files, totals)
+    if write_page(output_dir, files, totals):
+        print(f"Generated {PATCH_PAGE}")
+    print(f"Patch coverage {totals['percent']:.1f}% ({totals['covered']} / {totals['instrumented']} "
+          f"changed lines in {totals['files']} files), {totals['lost']} lines no longer executed")
+
+    if fail_under is not None and totals['instrumented'] and totals['percent'] < float(fail_under):
+        print(f"Error: patch coverage below {fail_under}%", file=sys.stderr)
+        sys.exit(FAIL_EXIT)
+
+
+if __name__ == '__main__':
+    main()
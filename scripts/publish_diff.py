@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Publish a freshly rendered gcovr report into the output directory,
+touching only the files whose content changed.
+
+The report is rendered into a staging directory first. Every staged file
+is hashed and compared against the manifest written by the previous run
+(.manifest.json in the output directory). Changed or new files are
+replaced atomically, files that are no longer produced are deleted, and
+unchanged files are left alone so their mtimes and git state stay clean.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+
+MANIFEST_NAME = '.manifest.json'
+MANIFEST_VERSION = 1
+CHUNK_SIZE = 1 << 20
+FILE_MODE = 0o644
+
+
+def hash_file(path):
+    """Return the sha256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def list_files(root):
+    """Every file below root as a posix relative path, without hashing."""
+    root = Path(root)
+    return {path.relative_to(root).as_posix() for path in root.rglob('*')
+            if path.is_file() and path.name != MANIFEST_NAME}
+
+
+def scan_directory(root):
+    """Map every file below root (as a posix relative path) to its hash."""
+    root = Path(root)
+    hashes = {}
+    for path in sorted(root.rglob('*')):
+        if not path.is_file():
+            continue
+        rel = path.relative_to(root).as_posix()
+        if rel == MANIFEST_NAME:
+            continue
+        hashes[rel] = hash_file(path)
+    return hashes
+
+
+def load_manifest(output_dir):
+    """Load the previous manifest, or rebuild it from the files on disk."""
+    manifest_path = Path(output_dir) / MANIFEST_NAME
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') == MANIFEST_VERSION:
+            return data.get('files', {})
+    except (OSError, ValueError):
+        pass
+
+    # No usable manifest (first run in this mode): hash whatever is
+    # already published so unchanged files are still left untouched.
+    if Path(output_dir).is_dir():
+        return scan_directory(output_dir)
+    return {}
+
+
+def write_atomic(target, data):
+    """Write bytes to target via a temporary file and an atomic rename.
+
+    mkstemp creates the file as 0600; the result gets the mode of the file
+    it replaces, or FILE_MODE, so a web server running as another user can
+    still read it.
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        mode = target.stat().st_mode & 0o777
+    except FileNotFoundError:
+        mode = FILE_MODE
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent, prefix='.tmp-', suffix=target.suffix)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, target)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def remove_empty_dirs(root, rel_paths):
+    """Remove directories left empty after deleting rel_paths."""
+    root = Path(root)
+    parents = set()
+    for rel in rel_paths:
+        parent = (root / rel).parent
+        while parent != root and root in parent.parents:
+            parents.add(parent)
+            parent = parent.parent
+    # Deepest first so nested empty directories collapse upward
+    for directory in sorted(parents, key=lambda p: len(p.parts), reverse=True):
+        try:
+            directory.rmdir()
+        except OSError:
+            pass
+
+
+def publish(staging_dir, output_dir):
+    """Sync staging_dir into output_dir. Returns (written, deleted, unchanged)."""
+    staging = Path(staging_dir)
+    output = Path(output_dir)
+
+    previous = load_manifest(output)
+    current = scan_directory(staging)
+
+    written = []
+    for rel, digest in current.items():
+        target = output / rel
+        if previous.get(rel) == digest and target.is_file():
+            continue
+        with open(staging / rel, 'rb') as f:
+            write_atomic(target, f.read())
+        written.append(rel)
+
+    # Orphans are files the previous run produced, plus anything on disk
+    # the manifest does not know about (e.g. left from before it existed)
+    deleted = []
+    for rel in sorted(set(previous) | list_files(output)):
+        if rel in current:
+            continue
+        try:
+            (output / rel).unlink()
+            deleted.append(rel)
+        except FileNotFoundError:
+            pass
+    remove_empty_dirs(output, deleted)
+
+    # Only rewrite the manifest when something changed, so an unchanged
+    # run produces zero writes.
+    manifest_path = output / MANIFEST_NAME
+    if written or deleted or previous != current or not manifest_path.is_file():
+        manifest = {'version': MANIFEST_VERSION, 'files': current}
+        write_atomic(manifest_path,
+                     json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+
+    return written, deleted, len(current) - len(written)
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: publish_diff.py <staging_dir> <output_dir>", file=sys.stderr)
+        print("  Copies only changed files from staging_dir into output_dir.", file=sys.stderr)
+        sys.exit(1)
+
+    staging_dir = sys.argv[1]
+    output_dir = sys.argv[2]
+
+    if not os.path.isdir(staging_dir):
+        print(f"Error: {staging_dir} is not a directory", file=sys.stderr)
+        sys.exit(1)
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    written, deleted, unchanged = publish(staging_dir, output_dir)
+    for rel in written:
+        print(f"Updated {rel}")
+    for rel in deleted:
+        print(f"Removed {rel}")
+    print(f"Published {len(written)} changed files, removed {len(deleted)} orphans, "
+          f"{unchanged} unchanged in {output_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Select the tests affected by a change, from per-test coverage.
+
+Given a diff of the json/ sources and one lcov tracefile per test binary
+(named after its b2 `run` target in json/test, e.g. tracefiles/parser.info),
+prints the tests whose coverage touches a changed line. Coverage comes from
+the base revision, so the diff is read on its old side: removed or modified
+lines count as changed, and a pure insertion counts as a change to the lines
+around it.
+
+When a change cannot be mapped to coverage the selection errs on the safe
+side: a C++ file nobody executes, a build file (Jamfile, CMakeLists.txt)
+or a shared test header selects every test. Documentation and other files
+select nothing. A changed test source selects its own test.
+
+The test-to-line map (see line_index.py) is cached next to the tracefiles
+and rebuilt only when a tracefile changes.
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+
+from cli import get_arg
+from line_index import INDEX_VERSION, LineIndex, collect_bitmaps, encode_index, find_tracefiles
+
+
+CACHE_NAME = '.tests.index.json'
+DEFAULT_REPO = 'json'
+
+HUNK_RE = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+CXX_SUFFIXES = ('.hpp', '.ipp', '.cpp', '.h', '.hxx', '.cxx', '.cc')
+BUILD_FILES = ('Jamfile', 'Jamfile.v2', 'CMakeLists.txt', 'build.jam')
+BUILD_SUFFIXES = ('.jam', '.cmake')
+
+
+def diff_path(header):
+    """Path of a ---/+++ header line, or None for /dev/null."""
+    path = header[4:].split('\t', 1)[0].strip()
+    if path == '/dev/null':
+        return None
+    return path[2:] if path[:2] in ('a/', 'b/') else path
+
+
+def iter_hunks(text):
+    """Yield (old path, new path, old start, old count, new start, new count, lines) per hunk.
+
+    lines lists the hunk body as (old line or None, new line or None), so
+    removed lines have no new line and added lines no old line. Paths are
+    None for /dev/null.
+    """
+    old_path = new_path = None
+    hunk = None
+    old_left = new_left = 0  # hunk lines still to come, so '---' in a hunk is not a header
+    for line in text.splitlines():
+        if old_left > 0 or new_left > 0:
+            old_line, new_line = hunk[2] + hunk[3] - old_left, hunk[4] + hunk[5] - new_left
+            if line.startswith('-'):
+                hunk[6].append((old_line, None))
+                old_left -= 1
+            elif line.startswith('+'):
+                hunk[6].append((None, new_line))
+                new_left -= 1
+            elif not line.startswith('\\'):
+                hunk[6].append((old_line, new_line))
+                old_left -= 1
+                new_left -= 1
+            if old_left <= 0 and new_left <= 0:
+                yield tuple(hunk)
+        elif line.startswith('--- '):
+            old_path = diff_path(line)
+        elif line.startswith('+++ '):
+            new_path = diff_path(line)
+        elif line.startswith('@@'):
+            match = HUNK_RE.match(line)
+            if not match:
+                continue
+            old_left = int(match.group(2)) if match.group(2) is not None else 1
+            new_left = int(match.group(4)) if match.group(4) is not None else 1
+            hunk = [old_path, new_path, int(match.group(1)), old_left,
+                    int(match.group(3)), new_left, []]
+            if not old_left and not new_left:
+                yield tuple(hunk)
+
+
+def parse_diff(text):
+    """Return {old path: set of changed old-side lines} and the list of new files."""
+    changed = {}
+    added = []
+    for old_path, new_path, old_start, old_count, _, _, lines in iter_hunks(text):
+        if old_path is None:
+            if new_path and new_path not in added:
+                added.append(new_path)
+            continue
+        changed_lines = changed.setdefault(old_path, set())
+        # With an empty old side the hunk inserts after old line `old_start`
+        prev_old = old_start - 1 if old_count else old_start
+        after_removal = False
+        for old, new in lines:
+            if new is None:
+                changed_lines.add(old)
+                prev_old, after_removal = old, True
+            elif old is None:
+                if not after_removal:
+                    # Pure insertion: the lines around it are affected
+                    changed_lines.update((prev_old, prev_old + 1))
+            else:
+                prev_old, after_removal = old, False
+    return changed, added
+
+
+def read_diff(diff_arg, base, repo):
+    """Diff text from a patch file, stdin ('-'), or `git diff <base>` in the repo."""
+    if diff_arg == '-':
+        return sys.stdin.read()
+    if diff_arg:
+        with open(diff_arg, 'r', encoding='utf-8', errors='replace') as f:
+            return f.read()
+    result = subprocess.run(['git', '-C', repo, 'diff', '--unified=0', base],
+                            capture_output=True, text=True, check=True)
+    return result.stdout
+
+
+def fingerprint(tracefiles):
+    """Identity of the tracefile set, to tell when the cached index is stale."""
+    return {test: [path.stat().st_size, path.stat().st_mtime_ns]
+            for test, path in tracefiles.items()}
+
+
+def load_index(tracefile_dir, cache_path):
+    """Return the LineIndex of the tracefiles, from the cache when up to date."""
+    tracefiles = find_tracefiles(tracefile_dir)
+    sources = fingerprint(tracefiles)
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') == INDEX_VERSION and data.get('sources') == sources:
+            return LineIndex(data), True
+    except (OSError, ValueError):
+        pass
+
+    data = encode_index(*collect_bitmaps(tracefiles))
+    data['sources'] = sources
+    try:
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+    except OSError as e:
+        print(f"Warning: could not write {cache_path}: {e}", file=sys.stderr)
+    return LineIndex(data), False
+
+
+def indexed_files(index, path):
+    """Indexed files for a repository path, matching the longest path suffix.
+
+    Suffixes keep at least two components (like patch_coverage.suffix_map),
+    so a file is never mapped by its basename alone.
+    """
+    parts = path.split('/')
+    for i in range(max(len(parts) - 1, 1)):
+        files = index.match_files('/'.join(parts[i:]))
+        if files:
+            return files
+    return []
+
+
+def select_tests(index, changed, added):
+    """Return (set of tests, everything?, reasons) for the changed lines."""
+    selected = set()
+    reasons = []
+    tests = set(index.tests)
+
+    for path in sorted(set(changed) | set(added)):
+        name = os.path.basename(path)
+        stem, suffix = os.path.splitext(name)
+        if path.startswith('test/') or '/test/' in path:
+            if suffix == '.cpp' and stem in tests:
+                selected.add(stem)
+                reasons.append(f"{path}: test source of {stem}")
+                continue
+            if suffix in CXX_SUFFIXES or name in BUILD_FILES:
+                reasons.append(f"{path}: shared test file, selecting all tests")
+                return tests, True, reasons
+            continue
+        if name in BUILD_FILES or suffix in BUILD_SUFFIXES:
+            reasons.append(f"{path}: build file, selecting all tests")
+            return tests, True, reasons
+        if suffix not in CXX_SUFFIXES:
+            continue
+
+        files = indexed_files(index, path)
+        if not files:
+            if path in changed:
+                reasons.append(f"{path}: not executed by any test, selecting all tests")
+                return tests, True, reasons
+            continue  # a new file only matters through the files including it
+
+        hit = set()
+        for indexed in files:
+            for lineno in changed.get(path, ()):
+                hit.update(index.test_names(index.bitmap(indexed, lineno)))
+        if hit:
+            reasons.append(f"{path}: {len(changed[path])} changed lines run by {len(hit)} tests")
+        selected |= hit
+    return selected, False, reasons
+
+
+def main():
+    if len(sys.argv) < 2 or ('--diff' not in sys.argv and '--base' not in sys.argv):
+        print("Usage: select_tests.py <tracefile_dir> (--diff <patch|-> | --base <rev>)", file=sys.stderr)
+        print("         [--repo <dir>] [--cache <index.json>] [--json]", file=sys.stderr)
+        print("  Prints the tests whose coverage intersects the changed lines.", file=sys.stderr)
+        sys.exit(1)
+
+    tracefile_dir = sys.argv[1]
+    repo = get_arg('--repo', DEFAULT_REPO)
+    cache_path = get_arg('--cache', os.path.join(tracefile_dir, CACHE_NAME))
+
+    if not os.path.isdir(tracefile_dir):
+        print(f"Error: {tracefile_dir} is not a directory", file=sys.stderr)
+        sys.exit(1)
+    try:
+        text = read_diff(get_arg('--diff'), get_arg('--base'), repo)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"Error reading the diff: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    index, cached = load_index(tracefile_dir, cache_path)
+    if not index.tests:
+        print(f"Error: no .info tracefiles in {tracefile_dir}", file=sys.stderr)
+        sys.exit(1)
+
+    changed, added = parse_diff(text)
+    selected, everything, reasons = select_tests(index, changed, added)
+    tests = sorted(selected)
+
+    if '--json' in sys.argv:
+        json.dump({'tests': tests, 'all': everything, 'reasons': reasons}, sys.stdout, indent=1)
+        print()
+    else:
+        for test in tests:
+            print(test)
+    for reason in reasons:
+        print(f"  {reason}", file=sys.stderr)
+    print(f"Selected {len(tests)} of {len(index.tests)} tests for "
+          f"{sum(len(lines) for lines in changed.values())} changed lines in {len(changed)} files"
+          f" ({'cached' if cached else 'rebuilt'} index {cache_path})", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,649 @@
+#!/usr/bin/env python3
+"""
+Serve a coverage report rendered on request instead of as static HTML.
+
+The coverage model (an lcov tracefile or a gcovr --json file) is loaded once;
+directory, source and function pages are rendered from it with the Jinja
+templates in templates/html when first requested. Rendered pages are kept in
+an LRU cache bounded by size and served with ETags, so reloads are answered
+with 304 Not Modified. Compact "uncovered only" pages and tree.json are
+derived from the same model, and template instantiations on the functions
+page are folded as aggregate_functions.py does for static reports.
+
+Page visits are counted, and with --visits the counts survive restarts: the
+most-visited pages (or, on a first start, the directory pages and the largest
+source files) are rendered in the background right after startup.
+
+The server only uses the standard library (http.server) and listens on
+localhost unless --host says otherwise.
+"""
+
+import hashlib
+import json
+import math
+import mimetypes
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path, PurePosixPath
+from urllib.parse import unquote, urlsplit
+
+from jinja2 import Environment, FileSystemLoader
+from markupsafe import Markup
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import TextLexer, get_lexer_for_filename
+from pygments.util import ClassNotFound
+
+from aggregate_functions import INSTANCES_DIR, aggregate_page
+from build_compact_pages import COMPACT_SUFFIX, DEFAULT_CONTEXT, build_compact_page
+from build_tree import get_coverage_class
+from cli import get_arg
+from demangle import demangle_names
+from gcovr_wrapper import register_ipp_lexer
+from tracefile import display_path, iter_records, new_record
+
+
+TEMPLATE_DIR = Path(__file__).resolve().parent.parent / 'templates' / 'html'
+ROOT_PAGE = 'index.html'
+FUNCTIONS_PAGE = 'index.functions.html'
+TREE_JSON = 'tree.json'
+
+DEFAULT_PORT = 8080
+DEFAULT_CACHE_MB = 64
+DEFAULT_PREWARM = 20
+COVERAGE_HIGH = 90.0
+COVERAGE_MED = 75.0
+# The templates are written against this gcovr release (footer link)
+GCOVR_VERSION = '8.6'
+
+
+def coverage_summary(covered, total, partial=0):
+    """Counts in the form the templates expect (coverage rounded down, '-' if empty)."""
+    coverage = f'{math.floor(covered / total * 1000) / 10:.1f}' if total else '-'
+    return {
+        'exec': covered,
+        'total': total,
+        'partial': partial,
+        'coverage': coverage,
+        'class': get_coverage_class(coverage),
+        'sort': coverage if total else -1,
+    }
+
+
+def load_gcovr_json(path):
+    """Yield tracefile-style records from a gcovr --json file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    for entry in data.get('files', []):
+        record = new_record(entry['file'])
+        for line in entry.get('lines', []):
+            if line.get('gcovr/noncode'):
+                continue
+            lineno = line['line_number']
+            record['lines'][lineno] = record['lines'].get(lineno, 0) + line.get('count', 0)
+            for i, branch in enumerate(line.get('branches', [])):
+                record['branches'].setdefault(lineno, []).append(
+                    (str(branch.get('source_block_id', 0)), str(i), branch.get('count', 0)))
+        for function in entry.get('functions', []):
+            record['functions'].append({
+                'name': function.get('demangled_name') or function['name'],
+                'line': function.get('lineno', 0),
+                'end_line': None,
+                'count': function.get('execution_count', 0),
+            })
+        yield record
+
+
+def load_records(path):
+    """Records of a tracefile (.info) or a gcovr JSON file (.json)."""
+    if str(path).endswith('.json'):
+        return load_gcovr_json(path)
+    return iter_records(path)
+
+
+def page_name(key):
+    """gcovr-style page name: index.<basename>.<md5 of the path>.html."""
+    if not key:
+        return ROOT_PAGE
+    digest = hashlib.md5(key.encode('utf-8')).hexdigest()
+    return f'index.{PurePosixPath(key).name}.{digest}.html'
+
+
+class CoverageModel:
+    """Coverage per file and directory, and the page layout of the report."""
+
+    def __init__(self, records, source_root=None, title=''):
+        self.title = title
+        self.source_root = Path(source_root) if source_root else None
+        self.files = {}
+        for record in records:
+            key = display_path(record['path'])
+            existing = self.files.get(key)
+            if existing is None:
+                self.files[key] = record
+                continue
+            for lineno, hits in record['lines'].items():
+                existing['lines'][lineno] = existing['lines'].get(lineno, 0) + hits
+            for lineno, branches in record['branches'].items():
+                existing['branches'].setdefault(lineno, []).extend(branches)
+            existing['functions'].extend(record['functions'])
+
+        # Paths in the report are relative to the deepest common directory
+        keys = sorted(self.files)
+        common = os.path.commonpath(keys) if keys else ''
+        self.prefix = common if common not in keys else str(PurePosixPath(common).parent)
+        if self.prefix == '.':
+            self.prefix = ''
+
+        self.pages = {ROOT_PAGE: ('directory', '')}
+        self.children = {'': (set(), set())}
+        for key in keys:
+            rel = self.relative(key)
+            self.pages[page_name(rel)] = ('source', key)
+            parent = str(PurePosixPath(rel).parent)
+            parent = '' if parent == '.' else parent
+            self.children.setdefault(parent, (set(), set()))[1].add(key)
+            while parent:
+                grand = str(PurePosixPath(parent).parent)
+                grand = '' if grand == '.' else grand
+                self.children.setdefault(grand, (set(), set()))[0].add(parent)
+                self.pages[page_name(parent)] = ('directory', parent)
+                parent = grand
+        self.pages[FUNCTIONS_PAGE] = ('functions', None)
+
+        # Source pages link to their neighbours in path order
+        source_pages = [page_name(self.relative(key)) for key in keys]
+        self.navigation = {
+            name: (source_pages[i - 1] if i else None,
+                   source_pages[i + 1] if i + 1 < len(source_pages) else None)
+            for i, name in enumerate(source_pages)
+        }
+
+        self.file_stats = {key: self.compute_stats(self.files[key]) for key in keys}
+        self.dir_stats = {}
+        self.directory_stats('')
+
+    def relative(self, key):
+        """Path of a file below the common directory, as shown in the report."""
+        return key[len(self.prefix) + 1:] if self.prefix else key
+
+    @staticmethod
+    def compute_stats(record):
+        """Raw (covered, total) counts of lines, functions and branches of a file."""
+        lines = record['lines']
+        partial = sum(1 for lineno, branches in record['branches'].items()
+                      if lines.get(lineno, 0) > 0 and any(not taken for _, _, taken in branches))
+        branches = [taken for line_branches in record['branches'].values()
+                    for _, _, taken in line_branches]
+        functions = {}
+        for function in record['functions']:
+            functions[function['name']] = functions.get(function['name'], 0) + function['count']
+        return {
+            'lines': (sum(1 for hits in lines.values() if hits > 0), len(lines), partial),
+            'functions': (sum(1 for count in functions.values() if count > 0), len(functions), 0),
+            'branches': (sum(1 for taken in branches if taken), len(branches), 0),
+        }
+
+    def directory_stats(self, directory):
+        """Counts of a directory, summed over its subtree (memoized)."""
+        stats = self.dir_stats.get(directory)
+        if stats is not None:
+            return stats
+        subdirs, files = self.children.get(directory, ((), ()))
+        parts = [self.directory_stats(sub) for sub in subdirs] + [self.file_stats[key] for key in files]
+        stats = {metric: tuple(sum(part[metric][i] for part in parts) for i in range(3))
+                 for metric in ('lines', 'functions', 'branches')}
+        self.dir_stats[directory] = stats
+        return stats
+
+    def resolve_source(self, key):
+        """Path of a file's source on this machine, or None."""
+        original = Path(self.files[key]['path'])
+        if original.is_file():
+            return original
+        if self.source_root is None:
+            return None
+        parts = key.split('/')
+        for i in range(len(parts)):
+            candidate = self.source_root.joinpath(*parts[i:])
+            if candidate.is_file():
+                return candidate
+        return None
+
+    def tree(self, directory=''):
+        """Sidebar tree in the format written by build_tree.py."""
+        subdirs, files = self.children.get(directory, ((), ()))
+        nodes = []
+        for sub in subdirs:
+            coverage = summary(self.directory_stats(sub), 'lines')['coverage']
+            nodes.append({'name': PurePosixPath(sub).name, 'coverage': coverage,
+                          'coverageClass': get_coverage_class(coverage), 'isDirectory': True,
+                          'link': page_name(sub), 'children': self.tree(sub)})
+        for key in files:
+            coverage = summary(self.file_stats[key], 'lines')['coverage']
+            nodes.append({'name': PurePosixPath(key).name, 'coverage': coverage,
+                          'coverageClass': get_coverage_class(coverage), 'isDirectory': False,
+                          'link': page_name(self.relative(key)), 'children': []})
+        nodes.sort(key=lambda node: (not node['isDirectory'], node['name'].lower()))
+        return nodes
+
+
+def summary(stats, metric):
+    """Template summary of one metric of a stats dict."""
+    covered, total, partial = stats[metric]
+    return coverage_summary(covered, total, partial)
+
+
+class PageCache:
+    """Thread-safe LRU of rendered pages, bounded by their total size."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, name):
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is not None:
+                self.entries.move_to_end(name)
+            return entry
+
+    def put(self, name, entry):
+        with self.lock:
+            old = self.entries.pop(name, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self.entries[name] = entry
+            self.size += len(entry[1])
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted[1])
+
+
+class ReportRenderer:
+    """Renders the pages of a CoverageModel with the report templates."""
+
+    def __init__(self, model, template_dir=TEMPLATE_DIR):
+        register_ipp_lexer()
+        self.model = model
+        self.env = Environment(loader=FileSystemLoader(str(template_dir)), autoescape=True)
+        self.formatter = HtmlFormatter(nowrap=True)
+        self.date = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.function_names = None
+        self.function_names_lock = threading.Lock()
+        root = model.directory_stats('')
+        self.info = {
+            'head': model.title,
+            'encoding': 'UTF-8',
+            'version': GCOVR_VERSION,
+            'date': self.date,
+            'single_page': False,
+            'static_report': False,
+            'sort_by': 'filename',
+            'sorted': 'sorted-ascending',
+            'navigation': model.navigation,
+            'lines': summary(root, 'lines'),
+            'functions': summary(root, 'functions'),
+            'branches': summary(root, 'branches'),
+        }
+        self.globals = {
+            'info': self.info,
+            'theme': 'green',
+            'ROOT_FNAME': ROOT_PAGE,
+            'COVERAGE_HIGH': COVERAGE_HIGH,
+            'COVERAGE_MED': COVERAGE_MED,
+            'SHOW_CONDITION_COVERAGE': False,
+            'SHOW_DECISION': False,
+            'SHOW_CALLS': False,
+        }
+
+    def render(self, name):
+        """Render a page by name. Returns the HTML, or None for unknown pages."""
+        page = self.model.pages.get(name)
+        if page is None:
+            return None
+        kind, key = page
+        if kind == 'directory':
+            return self.render_directory(name, key)
+        if kind == 'source':
+            return self.render_source(name, key)
+        return self.render_functions()
+
+    def render_directory(self, name, directory):
+        model = self.model
+        subdirs, files = model.children.get(directory, ((), ()))
+        entries = []
+        for sub in sorted(subdirs):
+            stats = model.directory_stats(sub)
+            entries.append({'filename': PurePosixPath(sub).name, 'link': page_name(sub),
+                            **{metric: summary(stats, metric)
+                               for metric in ('lines', 'functions', 'branches')}})
+        for key in sorted(files):
+            stats = model.file_stats[key]
+            entries.append({'filename': PurePosixPath(key).name, 'link': page_name(model.relative(key)),
+                            **{metric: summary(stats, metric)
+                               for metric in ('lines', 'functions', 'branches')}})
+        entries.sort(key=lambda entry: entry['filename'].lower())
+
+        parent = str(PurePosixPath(directory).parent) if directory else None
+        stats = model.directory_stats(directory)
+        info = dict(self.info, **{metric: summary(stats, metric)
+                                  for metric in ('lines', 'functions', 'branches')})
+        return self.env.get_template('directory_page.html').render(
+            self.globals, info=info, entries=entries, html_filename=name, fname=name,
+            relative_path=f'{directory}/' if directory else '',
+            parent_link=(page_name('' if parent == '.' else parent) if directory else None))
+
+    def highlighted_lines(self, key):
+        """Source lines of a file as highlighted HTML (empty if the source is missing)."""
+        path = self.model.resolve_source(key)
+        if path is None:
+            return []
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            source = f.read()
+        try:
+            lexer = get_lexer_for_filename(path.name, stripnl=False)
+        except ClassNotFound:
+            lexer = TextLexer(stripnl=False)
+        lines = highlight(source, lexer, self.formatter).split('\n')
+        return lines[:source.count('\n') + (0 if source.endswith('\n') else 1)]
+
+    def render_source(self, name, key):
+        model = self.model
+        record = model.files[key]
+        line_hits = record['lines']
+        code = self.highlighted_lines(key)
+        last = max([len(code), *line_hits]) if line_hits else len(code)
+
+        source_lines = []
+        for lineno in range(1, last + 1):
+            hits = line_hits.get(lineno)
+            branches = record['branches'].get(lineno, [])
+            partial = bool(hits) and any(not taken for _, _, taken in branches)
+            if hits is None:
+                covclass = ''
+            elif hits == 0:
+                covclass = 'uncoveredLine'
+            else:
+                covclass = 'partialCoveredLine' if partial else 'coveredLine'
+            line_branches = []
+            if branches:
+                line_branches.append({
+                    'function_name': '',
+                    'taken': sum(1 for _, _, taken in branches if taken),
+                    'total': len(branches),
+                    'branches': [{'branchno': i, 'taken': bool(taken), 'count': taken or 0,
+                                  'excluded': False} for i, (_, _, taken) in enumerate(branches)],
+                })
+            source_lines.append({
+                'lineno': lineno,
+                'covclass': covclass,
+                'linecount': hits if hits is not None else '',
+                'line_branches': line_branches,
+                'source': Markup(code[lineno - 1] if lineno <= len(code) else ''),
+            })
+
+        stats = model.file_stats[key]
+        return self.env.get_template('source_page.html').render(
+            self.globals, filename=model.relative(key), html_filename=name, fname=name,
+            source_lines=source_lines,
+            lines=summary(stats, 'lines'), functions=summary(stats, 'functions'),
+            branches=summary(stats, 'branches'))
+
+    def render_functions(self):
+        model = self.model
+        # Request threads and the prewarm thread can get here together
+        with self.function_names_lock:
+            if self.function_names is None:
+                self.function_names = demangle_names(
+                    function['name'] for record in model.files.values() for function in record['functions'])
+
+        function_list = []
+        for key in sorted(model.files):
+            record = model.files[key]
+            rel = model.relative(key)
+            for function in record['functions']:
+                start, end = function['line'], function['end_line'] or function['line']
+                lines = [hits for lineno, hits in record['lines'].items() if start <= lineno <= end]
+                branches = [taken for lineno, line_branches in record['branches'].items()
+                            if start <= lineno <= end for _, _, taken in line_branches]
+                function_list.append({
+                    'name': self.function_names.get(function['name'], function['name']),
+                    'count': function['count'],
+                    'excluded': False,
+                    'filename': rel,
+                    'html_filename': page_name(rel),
+                    'line': function['line'],
+                    'line_coverage': coverage_summary(sum(1 for hits in lines if hits > 0),
+                                                      len(lines))['coverage'],
+                    'branch_coverage': coverage_summary(sum(1 for taken in branches if taken),
+                                                        len(branches))['coverage'],
+                })
+        function_list.sort(key=lambda entry: entry['name'])
+        return self.env.get_template('functions_page.html').render(
+            self.globals, function_list=function_list, html_filename=FUNCTIONS_PAGE,
+            fname=FUNCTIONS_PAGE)
+
+
+class ReportServer(ThreadingHTTPServer):
+    """HTTP server answering from the page cache, rendering on a miss."""
+
+    daemon_threads = True
+
+    def __init__(self, address, renderer, cache_bytes, static_dir=None, verbose=False):
+        super().__init__(address, ReportRequestHandler)
+        self.renderer = renderer
+        self.cache = PageCache(cache_bytes)
+        self.static_dir = Path(static_dir).resolve() if static_dir else None
+        self.verbose = verbose
+        self.visits = Counter()
+        self.tree = json.dumps(renderer.model.tree()).encode('utf-8')
+
+    def page(self, name):
+        """Return (etag, body, content type) for a report path, or None."""
+        entry = self.cache.get(name)
+        if entry is not None:
+            return entry
+
+        if name == TREE_JSON:
+            body, content_type = self.tree, 'application/json'
+        elif name.endswith(COMPACT_SUFFIX):
+            full_name = name[:-len(COMPACT_SUFFIX)] + '.html'
+            full = self.page(full_name)
+            if full is None:
+                return None
+            compact = build_compact_page(full[1].decode('utf-8'), full_name, DEFAULT_CONTEXT)
+            if compact is None:
+                return None
+            body, content_type = compact.encode('utf-8'), 'text/html; charset=utf-8'
+        elif name == FUNCTIONS_PAGE or name.startswith(INSTANCES_DIR + '/'):
+            # Instantiation fragments are cached along with the functions page;
+            # one evicted on its own is recovered by folding the page again
+            rendered = self.functions_page()
+            if rendered is None:
+                return None
+            html = rendered[0] if name == FUNCTIONS_PAGE else rendered[1].get(name)
+            if html is None:
+                return None
+            body, content_type = html.encode('utf-8'), 'text/html; charset=utf-8'
+        else:
+            html = self.renderer.render(name)
+            if html is None:
+                return None
+            body, content_type = html.encode('utf-8'), 'text/html; charset=utf-8'
+
+        entry = self.cache_entry(body, content_type)
+        self.cache.put(name, entry)
+        return entry
+
+    def functions_page(self):
+        """Render and fold the functions page, caching its instantiation fragments.
+
+        Returns (page html, {fragment path: html}), or None.
+        """
+        html = self.renderer.render(FUNCTIONS_PAGE)
+        if html is None:
+            return None
+        folded = aggregate_page(html)
+        if folded is None:
+            return html, {}
+        for fragment_name, fragment in folded[1].items():
+            self.cache.put(fragment_name, self.cache_entry(
+                fragment.encode('utf-8'), 'text/html; charset=utf-8'))
+        return folded[0], folded[1]
+
+    @staticmethod
+    def cache_entry(body, content_type):
+        return f'"{hashlib.sha1(body).hexdigest()[:20]}"', body, content_type
+
+    def static_file(self, name):
+        """Return (etag, body, content type) for a file of --static, or None."""
+        if self.static_dir is None:
+            return None
+        path = (self.static_dir / name).resolve()
+        if self.static_dir not in path.parents or not path.is_file():
+            return None
+        stat = path.stat()
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        return etag, path.read_bytes(), content_type
+
+    def prewarm(self, names):
+        """Render pages into the cache (run in a background thread)."""
+        start = time.perf_counter()
+        count = 0
+        for name in names:
+            try:
+                if self.page(name) is not None:
+                    count += 1
+            except Exception as e:
+                print(f"Warning: could not pre-render {name}: {e}", file=sys.stderr)
+        print(f"Pre-rendered {count} pages in {time.perf_counter() - start:.1f}s")
+
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'gcovr-serve'
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def respond(self, send_body):
+        name = unquote(urlsplit(self.path).path).lstrip('/') or ROOT_PAGE
+        try:
+            entry = self.server.page(name) or self.server.static_file(name)
+        except Exception as e:
+            print(f"Error rendering {name}: {e}", file=sys.stderr)
+            self.send_error(500)
+            return
+        if entry is None:
+            self.send_error(404)
+            return
+        self.server.visits[name] += 1
+
+        etag, body, content_type = entry
+        if etag in self.headers.get('If-None-Match', ''):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def load_visits(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return Counter(json.load(f))
+    except (OSError, ValueError):
+        return Counter()
+
+
+def save_visits(path, visits):
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(dict(visits.most_common()), f, indent=1)
+    except OSError as e:
+        print(f"Warning: could not write {path}: {e}", file=sys.stderr)
+
+
+def prewarm_pages(model, visits, count):
+    """The pages to pre-render: most visited first, else directories and the largest files."""
+    names = [name for name, _ in visits.most_common() if name in model.pages or name == TREE_JSON]
+    if len(names) < count:
+        directories = [name for name, (kind, _) in model.pages.items() if kind == 'directory']
+        largest = sorted((key for key in model.files), key=lambda key: -len(model.files[key]['lines']))
+        names += [name for name in directories + [page_name(model.relative(key)) for key in largest]
+                  if name not in names]
+    return names[:count]
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: serve.py <tracefile.info|coverage.json> [--source-root <dir>] [--title <name>]", file=sys.stderr)
+        print("         [--host <addr>] [--port <n>] [--cache-mb <n>] [--prewarm <pages>]", file=sys.stderr)
+        print("         [--visits <visits.json>] [--static <report_dir>] [--verbose]", file=sys.stderr)
+        print("  Serves the coverage report, rendering pages on request.", file=sys.stderr)
+        sys.exit(1)
+
+    coverage_path = sys.argv[1]
+    source_root = get_arg('--source-root')
+    title = get_arg('--title', 'Coverage')
+    host = get_arg('--host', '127.0.0.1')
+    port = int(get_arg('--port', DEFAULT_PORT))
+    cache_bytes = int(float(get_arg('--cache-mb', DEFAULT_CACHE_MB)) * 1024 * 1024)
+    prewarm = int(get_arg('--prewarm', DEFAULT_PREWARM))
+    visits_path = get_arg('--visits')
+
+    if not os.path.isfile(coverage_path):
+        print(f"Error: {coverage_path} is not a file", file=sys.stderr)
+        sys.exit(1)
+
+    start = time.perf_counter()
+    try:
+        model = CoverageModel(load_records(coverage_path), source_root, title)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error loading {coverage_path}: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Loaded {len(model.files)} files ({len(model.pages)} pages) "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    server = ReportServer((host, port), ReportRenderer(model), cache_bytes,
+                          get_arg('--static'), '--verbose' in sys.argv)
+    if visits_path:
+        server.visits = load_visits(visits_path)
+    if prewarm > 0:
+        names = prewarm_pages(model, server.visits, prewarm)
+        threading.Thread(target=server.prewarm, args=(names,), daemon=True).start()
+
+    print(f"Serving on http://{host}:{port}/ (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if visits_path:
+            save_visits(visits_path, server.visits)
+
+
+if __name__ == '__main__':
+    main()
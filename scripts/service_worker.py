@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Generate an offline service worker (sw.js) for a gcovr report.
+
+The worker precaches the report index, its directory pages and tree.json,
+and caches source pages as they are visited. Caches are named after a
+report version (a content hash of the output directory), so publishing a
+new report installs a new worker that evicts the previous cache.
+Service workers only run over http(s); file:// reports are unaffected.
+
+Run it as the last step of a build, once every other step has written its
+files, so the version covers the report as it is published.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+from build_tree import directory_links
+
+
+SW_FILENAME = 'sw.js'
+
+VERSION_RE = re.compile(r'<script>window\.GCOVR_REPORT_VERSION="[0-9a-f]*";</script>\n?')
+
+SW_TEMPLATE = '''/* GCOVR report service worker - generated by service_worker.py */
+'use strict';
+
+var VERSION = '{version}';
+var PRECACHE = {precache};
+var PREFIX = 'gcovr:' + self.registration.scope + ':';
+var CACHE = PREFIX + VERSION;
+
+self.addEventListener('install', function(event) {{
+  event.waitUntil(
+    caches.open(CACHE)
+      .then(function(cache) {{ return cache.addAll(PRECACHE); }})
+      .then(function() {{ return self.skipWaiting(); }})
+  );
+}});
+
+// Drop caches of older versions of this report (other reports on the
+// same origin use a different scope and are left alone)
+self.addEventListener('activate', function(event) {{
+  event.waitUntil(
+    caches.keys()
+      .then(function(keys) {{
+        return Promise.all(keys.filter(function(key) {{
+          return key.indexOf(PREFIX) === 0 && key !== CACHE;
+        }}).map(function(key) {{
+          return caches.delete(key);
+        }}));
+      }})
+      .then(function() {{ return self.clients.claim(); }})
+  );
+}});
+
+// Pages are immutable within a version: serve from cache, otherwise
+// fetch and remember the response
+self.addEventListener('fetch', function(event) {{
+  var request = event.request;
+  if (request.method !== 'GET' || request.url.indexOf(self.registration.scope) !== 0) return;
+
+  event.respondWith(
+    caches.open(CACHE).then(function(cache) {{
+      return cache.match(request, {{ ignoreSearch: true }}).then(function(cached) {{
+        if (cached) return cached;
+        return fetch(request).then(function(response) {{
+          if (response.ok && response.type === 'basic') {{
+            cache.put(request, response.clone());
+          }}
+          return response;
+        }});
+      }});
+    }})
+  );
+}});
+'''
+
+
+def report_version(output_dir):
+    """Content hash over every file of the report except the worker itself."""
+    output_path = Path(output_dir)
+    digest = hashlib.sha256()
+    for path in sorted(output_path.rglob('*')):
+        if not path.is_file() or path.name == SW_FILENAME:
+            continue
+        digest.update(path.relative_to(output_path).as_posix().encode('utf-8'))
+        digest.update(b'\0')
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def write_service_worker(output_dir, version, pages):
+    """Write sw.js precaching the given pages (plus index.html and tree.json)."""
+    precache = ['./', 'index.html']
+    if (Path(output_dir) / 'tree.json').is_file():
+        precache.append('tree.json')
+    for page in sorted(pages):
+        if page not in precache:
+            precache.append(page)
+
+    sw_path = Path(output_dir) / SW_FILENAME
+    with open(sw_path, 'w', encoding='utf-8') as f:
+        f.write(SW_TEMPLATE.format(version=version, precache=json.dumps(precache)))
+    return sw_path
+
+
+def inject_version(output_dir, version):
+    """Set the report version on every page, which makes gcovr.js register sw.js."""
+    script = f'<script>window.GCOVR_REPORT_VERSION="{version}";</script>\n'
+    count = 0
+    for html_file in Path(output_dir).glob('*.html'):
+        with open(html_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+        stripped = VERSION_RE.sub('', content)
+        if '</body>' not in stripped:
+            continue
+        updated = stripped.replace('</body>', f'{script}</body>', 1)
+        if updated != content:
+            with open(html_file, 'w', encoding='utf-8') as f:
+                f.write(updated)
+        count += 1
+    return count
+
+
+def generate_service_worker(output_dir):
+    """Version the finished report, write sw.js and mark the pages with the version."""
+    # Hash the pages as the other steps left them, so identical reports
+    # get identical versions whatever version they were marked with before
+    for html_file in Path(output_dir).glob('*.html'):
+        with open(html_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+        stripped = VERSION_RE.sub('', content)
+        if stripped != content:
+            with open(html_file, 'w', encoding='utf-8') as f:
+                f.write(stripped)
+    version = report_version(output_dir)
+
+    pages = []
+    tree_file = Path(output_dir) / 'tree.json'
+    if tree_file.is_file():
+        with open(tree_file, 'r', encoding='utf-8') as f:
+            pages = directory_links(json.load(f))
+    sw_path = write_service_worker(output_dir, version, pages)
+    injected = inject_version(output_dir, version)
+    return sw_path, version, injected
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: service_worker.py <gcovr_output_dir>", file=sys.stderr)
+        print("  Writes sw.js for offline/cached browsing; run after every other build step.", file=sys.stderr)
+        sys.exit(1)
+
+    output_dir = sys.argv[1]
+    if not os.path.isdir(output_dir):
+        print(f"Error: {output_dir} is not a directory", file=sys.stderr)
+        sys.exit(1)
+
+    sw_path, version, injected = generate_service_worker(output_dir)
+    print(f"Generated {sw_path} (report version {version}), marked {injected} HTML files")
+
+
+if __name__ == '__main__':
+    main()
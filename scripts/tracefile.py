@@ -0,0 +1,120 @@
+"""
+Streaming reader for lcov tracefiles (coverage.info).
+
+Yields one record per source file (SF: ... end_of_record) so callers can
+process large tracefiles without holding them in memory. Both the lcov 2.x
+function records (FNL/FNA) and the older FN/FNDA pair are understood.
+
+Record layout:
+  {
+    'path': '/abs/path/to/file.hpp',
+    'functions': [{'name': mangled, 'line': start, 'end_line': end or None,
+                   'count': calls}, ...],
+    'lines': {line: hits},
+    'branches': {line: [(block, branch, taken or None), ...]},
+  }
+"""
+
+import re
+import sys
+from pathlib import Path
+
+
+# Paths in tracefiles are absolute on the build machine; everything after
+# boost-root/ is stable across machines
+PATH_ANCHOR = '/boost-root/'
+
+PAGE_TITLE_RE = re.compile(r'<div class="source-title">([^<]*)</div>')
+
+
+def new_record(path):
+    """Empty record for the source file at path."""
+    return {'path': path, 'functions': [], 'lines': {}, 'branches': {}}
+
+
+def iter_records(tracefile):
+    """Yield one record per source file in an lcov tracefile."""
+    record = None
+    fn_locations = {}  # FNL index -> (start, end)
+    fn_lines = {}      # FN name -> start line (pre-2.0 format)
+
+    with open(tracefile, 'r', encoding='utf-8', errors='replace') as f:
+        for raw in f:
+            line = raw.rstrip('\n')
+            tag, _, value = line.partition(':')
+
+            if tag == 'SF':
+                record = new_record(value)
+                fn_locations = {}
+                fn_lines = {}
+            elif record is None:
+                continue  # TN: and anything before the first SF
+            elif tag == 'DA':
+                parts = value.split(',')
+                lineno, hits = int(parts[0]), int(parts[1])
+                record['lines'][lineno] = record['lines'].get(lineno, 0) + hits
+            elif tag == 'BRDA':
+                lineno, block, branch, taken = value.split(',', 3)
+                record['branches'].setdefault(int(lineno), []).append(
+                    (block, branch, None if taken == '-' else int(taken)))
+            elif tag == 'FNL':
+                parts = value.split(',')
+                end = int(parts[2]) if len(parts) > 2 and parts[2] else None
+                fn_locations[parts[0]] = (int(parts[1]), end)
+            elif tag == 'FNA':
+                index, count, name = value.split(',', 2)
+                start, end = fn_locations.get(index, (0, None))
+                record['functions'].append(
+                    {'name': name, 'line': start, 'end_line': end, 'count': int(count)})
+            elif tag == 'FN':
+                # FN:<start>,<end>,<name> or FN:<start>,<name>; names
+                # (demangled ones in particular) can contain commas
+                parts = value.split(',', 2)
+                if len(parts) == 3 and parts[1].isdigit():
+                    fn_lines[parts[2]] = (int(parts[0]), int(parts[1]))
+                else:
+                    start, name = value.split(',', 1)
+                    fn_lines[name] = (int(start), None)
+            elif tag == 'FNDA':
+                count, name = value.split(',', 1)
+                start, end = fn_lines.get(name, (0, None))
+                record['functions'].append(
+                    {'name': name, 'line': start, 'end_line': end, 'count': int(count)})
+            elif tag == 'end_of_record':
+                yield record
+                record = None
+
+
+def display_path(path):
+    """Path relative to boost-root when present, for messages and reports."""
+    idx = path.find(PATH_ANCHOR)
+    return path[idx + len(PATH_ANCHOR):] if idx >= 0 else path.lstrip('/')
+
+
+def source_page_map(output_dir):
+    """Map the title of every source page (its path in the report) to the page."""
+    pages = {}
+    for html_file in sorted(Path(output_dir).glob('index.*.html')):
+        if html_file.name.endswith('.compact.html'):
+            continue
+        try:
+            with open(html_file, 'r', encoding='utf-8') as f:
+                # The title sits in the page header, well before the source table
+                head = f.read(256 * 1024)
+        except Exception as e:
+            print(f"Error reading {html_file}: {e}", file=sys.stderr)
+            continue
+        match = PAGE_TITLE_RE.search(head)
+        if match:
+            pages[match.group(1)] = html_file.name
+    return pages
+
+
+def find_source_page(pages, path):
+    """Return the page whose title is the longest path suffix of path, or None."""
+    parts = path.replace('\\', '/').split('/')
+    for i in range(len(parts)):
+        page = pages.get('/'.join(parts[i:]))
+        if page:
+            return page
+    return None
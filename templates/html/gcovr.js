@@ -14,7 +14,10 @@
     initSearch();
     initSorting();
     initToggleButtons();
+    initCompactGaps();
+    initFunctionGroups();
     initTreeControls();
+    initServiceWorker();
 
     // Re-enable transitions after all init (including search restore)
     // has completed so the first paint is the final state
@@ -29,22 +32,88 @@
   // Breadcrumb Links
   // ===========================================
 
-  // Find a node in the tree by its link (HTML filename) and return
-  // the full ancestor path as an array of nodes from root to target.
-  function findPathInTree(nodes, targetLink) {
-    for (var i = 0; i < nodes.length; i++) {
-      var node = nodes[i];
-      if (node.link === targetLink) {
-        return [node];
+  // Map every link in the processed tree to the child positions leading
+  // to its node from the root, e.g. {"index.foo.html": [0, 3, 1]}. The
+  // first node in document order wins, as each page appears once.
+  function buildLinkIndex(nodes) {
+    var index = {};
+    function walk(level, positions) {
+      for (var i = 0; i < level.length; i++) {
+        var node = level[i];
+        var nodePositions = positions.concat(i);
+        if (node.link && !index.hasOwnProperty(node.link)) {
+          index[node.link] = nodePositions;
+        }
+        if (node.children) walk(node.children, nodePositions);
       }
-      if (node.children) {
-        var childPath = findPathInTree(node.children, targetLink);
-        if (childPath) {
-          return [node].concat(childPath);
+    }
+    walk(nodes, []);
+    return index;
+  }
+
+  var linkIndexCache = null;
+
+  // Return the link index for a tree, reusing the copy kept in
+  // sessionStorage by earlier pages of the same report (keyed by the
+  // tree hash that build_tree.py injects).
+  function getLinkIndex(nodes, forceRebuild) {
+    if (!forceRebuild && linkIndexCache && linkIndexCache.tree === nodes) {
+      return linkIndexCache.index;
+    }
+
+    var hash = (nodes === window.GCOVR_TREE_DATA) ? window.GCOVR_TREE_HASH : null;
+    var index = null;
+    if (hash && !forceRebuild) {
+      try {
+        var saved = JSON.parse(sessionStorage.getItem('gcovr-link-index') || 'null');
+        if (saved && saved.hash === hash) index = saved.index;
+      } catch (e) {
+        // Ignore sessionStorage errors
+      }
+    }
+    if (!index) {
+      index = buildLinkIndex(nodes);
+      if (hash) {
+        try {
+          sessionStorage.setItem('gcovr-link-index', JSON.stringify({ hash: hash, index: index }));
+        } catch (e) {
+          // Ignore quota errors; the index is rebuilt on the next page
         }
       }
     }
-    return null;
+
+    linkIndexCache = { tree: nodes, index: index };
+    return index;
+  }
+
+  // Find a node in the tree by its link (HTML filename) and return
+  // the full ancestor path as an array of nodes from root to target.
+  function findPathInTree(nodes, targetLink, forceRebuild) {
+    var positions = getLinkIndex(nodes, forceRebuild)[targetLink];
+    if (!positions) return null;
+
+    var path = [];
+    var level = nodes;
+    for (var i = 0; i < positions.length; i++) {
+      var node = level && level[positions[i]];
+      if (!node) break;
+      path.push(node);
+      level = node.children;
+    }
+
+    // A stale cached index (e.g. gcovr.js changed but the tree did not)
+    // no longer leads to the link; rebuild it once.
+    if (path.length !== positions.length || path[path.length - 1].link !== targetLink) {
+      return forceRebuild ? null : findPathInTree(nodes, targetLink, true);
+    }
+    return path;
+  }
+
+  // Compact variants (build_compact_pages.py) are not in the tree; they
+  // stand for their full page in the sidebar and the breadcrumbs
+  function currentPageName() {
+    var page = window.location.pathname.split('/').pop() || 'index.html';
+    return page.replace(/\.compact\.html$/, '.html');
   }
 
   function initBreadcrumbs() {
@@ -56,7 +125,7 @@
 
     // Find current page in tree by its HTML filename — this is unambiguous
     // since each page only appears once in the tree.
-    var currentPage = window.location.pathname.split('/').pop() || 'index.html';
+    var currentPage = currentPageName();
     var treePath = findPathInTree(window.GCOVR_TREE_DATA, currentPage);
 
     if (!treePath || treePath.length === 0) {
@@ -105,6 +174,20 @@
     }
   }
 
+  // ===========================================
+  // Service Worker
+  // ===========================================
+
+  // Registered only when service_worker.py wrote sw.js (it also
+  // injects GCOVR_REPORT_VERSION). Service workers need http(s).
+  function initServiceWorker() {
+    if (!window.GCOVR_REPORT_VERSION || !('serviceWorker' in navigator)) return;
+    if (location.protocol !== 'http:' && location.protocol !== 'https:') return;
+    navigator.serviceWorker.register('sw.js').catch(function(err) {
+      console.log('Service worker registration failed: ' + err);
+    });
+  }
+
   // ===========================================
   // Theme Toggle
   // ===========================================
@@ -164,13 +247,14 @@
 
     if (expandBtn) {
       expandBtn.addEventListener('click', function() {
-        document.querySelectorAll('.tree-item').forEach(function(item) {
-          if (!item.classList.contains('no-children')) {
-            item.classList.add('expanded');
-            var toggle = item.querySelector(':scope > .tree-item-header > .tree-folder-toggle');
-            if (toggle) toggle.textContent = '−';
-          }
-        });
+        // Expanding a folder materialises its children, which may be
+        // folders themselves, so repeat until nothing collapsed is left.
+        var pending;
+        while ((pending = document.querySelectorAll('.tree-item:not(.no-children):not(.expanded)')).length) {
+          pending.forEach(function(item) {
+            setFolderExpanded(item, true);
+          });
+        }
         saveExpandedFolders();
       });
     }
@@ -178,9 +262,7 @@
     if (collapseBtn) {
       collapseBtn.addEventListener('click', function() {
         document.querySelectorAll('.tree-item').forEach(function(item) {
-          item.classList.remove('expanded');
-          var toggle = item.querySelector(':scope > .tree-item-header > .tree-folder-toggle');
-          if (toggle) toggle.textContent = '+';
+          setFolderExpanded(item, false);
         });
         saveExpandedFolders();
       });
@@ -390,10 +472,7 @@
 
     // Check for embedded tree data first (works for local file:// access)
     if (window.GCOVR_TREE_DATA) {
-      window.GCOVR_TREE_DATA = normalizeTree(window.GCOVR_TREE_DATA);
-      deduplicateTree(window.GCOVR_TREE_DATA);
-      collapseSingleChildDirs(window.GCOVR_TREE_DATA);
-      deduplicateTree(window.GCOVR_TREE_DATA);
+      window.GCOVR_TREE_DATA = processTree(window.GCOVR_TREE_DATA, window.GCOVR_TREE_HASH);
       renderTree(treeContainer, window.GCOVR_TREE_DATA);
       return;
     }
@@ -405,10 +484,7 @@
         return response.json();
       })
       .then(function(tree) {
-        window.GCOVR_TREE_DATA = normalizeTree(tree);
-        deduplicateTree(window.GCOVR_TREE_DATA);
-        collapseSingleChildDirs(window.GCOVR_TREE_DATA);
-        deduplicateTree(window.GCOVR_TREE_DATA);
+        window.GCOVR_TREE_DATA = processTree(tree, null);
         renderTree(treeContainer, window.GCOVR_TREE_DATA);
         // Re-run breadcrumbs and search now that the tree exists
         initBreadcrumbs();
@@ -420,6 +496,45 @@
       });
   }
 
+  // Bump when normalizeTree/deduplicateTree/collapseSingleChildDirs change
+  // so trees processed by an older gcovr.js are not reused.
+  var TREE_CACHE_VERSION = 1;
+
+  // Run the normalize/dedupe/collapse passes over the raw tree. The result
+  // is kept in sessionStorage keyed by the tree hash from build_tree.py,
+  // so other pages of the same report skip the passes; a newly published
+  // report has a different hash and replaces the cached entry.
+  function processTree(tree, hash) {
+    if (hash) {
+      try {
+        var cached = JSON.parse(sessionStorage.getItem('gcovr-tree-cache') || 'null');
+        if (cached && cached.hash === hash && cached.version === TREE_CACHE_VERSION) {
+          return cached.tree;
+        }
+      } catch (e) {
+        // Ignore sessionStorage errors
+      }
+    }
+
+    tree = normalizeTree(tree);
+    deduplicateTree(tree);
+    collapseSingleChildDirs(tree);
+    deduplicateTree(tree);
+
+    if (hash) {
+      try {
+        sessionStorage.setItem('gcovr-tree-cache', JSON.stringify({
+          hash: hash,
+          version: TREE_CACHE_VERSION,
+          tree: tree
+        }));
+      } catch (e) {
+        // Ignore quota errors; the tree is processed again on the next page
+      }
+    }
+    return tree;
+  }
+
   // Collapse single-child directory chains: if a directory has exactly
   // one child and that child is also a directory, absorb the grandchildren.
   // e.g. include > boost > capy > [items] becomes include > [items]
@@ -531,6 +646,9 @@
     return result;
   }
 
+  // Tree node -> rendered .tree-item, for items created so far
+  var treeItemElements = new WeakMap();
+
   // Save expanded folder paths to localStorage
   function saveExpandedFolders() {
     var paths = [];
@@ -548,52 +666,90 @@
       return;
     }
 
+    // Only the top level is built here; folders create their children
+    // the first time they are expanded (see renderChildren).
+    var fragment = document.createDocumentFragment();
     tree.forEach(function(item) {
-      container.appendChild(createTreeItem(item, ''));
+      fragment.appendChild(createTreeItem(item, ''));
     });
+    container.appendChild(fragment);
 
     // Auto-expand to current file and highlight it
-    expandToCurrentFile(container);
+    expandToCurrentFile(container, tree);
   }
 
-  function expandToCurrentFile(container) {
-    // Get current page filename
-    var currentPage = window.location.pathname.split('/').pop() || 'index.html';
-
-    // Find the link matching current page
-    var currentLink = container.querySelector('a[href="' + currentPage + '"]');
-
-    if (currentLink) {
-      // Mark as active
-      var treeItem = currentLink.closest('.tree-item');
-      if (treeItem) {
-        treeItem.classList.add('active');
-      }
+  // Return the rendered tree items directly below a container or folder.
+  function childTreeItems(parent) {
+    var list = parent.classList.contains('tree-item')
+      ? parent.querySelector(':scope > .tree-children > .tree-children-inner')
+      : parent;
+    if (!list) return [];
+    return Array.prototype.filter.call(list.children, function(el) {
+      return el.classList.contains('tree-item');
+    });
+  }
 
-      // Expand all parent folders
-      var parent = currentLink.closest('.tree-children');
-      while (parent) {
-        var parentItem = parent.closest('.tree-item');
-        if (parentItem) {
-          parentItem.classList.add('expanded');
-          var toggle = parentItem.querySelector(':scope > .tree-item-header > .tree-folder-toggle');
-          if (toggle) toggle.textContent = '−';
+  // Find the tree item for a data-tree-path, creating the children of
+  // each ancestor on the way down. Ancestors are not expanded.
+  function findTreeItem(container, treePath) {
+    var scope = container;
+    while (scope) {
+      var items = childTreeItems(scope);
+      var next = null;
+      for (var i = 0; i < items.length; i++) {
+        var itemPath = items[i].getAttribute('data-tree-path');
+        if (itemPath === treePath) return items[i];
+        if (treePath.indexOf(itemPath + '/') === 0) {
+          next = items[i];
+          break;
         }
-        parent = parentItem ? parentItem.parentElement.closest('.tree-children') : null;
       }
+      if (!next) return null;
+      renderChildren(next);
+      scope = next;
     }
+    return null;
+  }
 
-    // Restore previously expanded folders from localStorage
+  // Expand the folders along a chain of tree nodes (root to target)
+  // and return the tree item of the last node.
+  function revealNodePath(nodePath) {
+    var el = null;
+    for (var i = 0; i < nodePath.length; i++) {
+      el = treeItemElements.get(nodePath[i]);
+      if (!el) return null;
+      if (i < nodePath.length - 1) setFolderExpanded(el, true);
+    }
+    return el;
+  }
+
+  function expandToCurrentFile(container, tree) {
+    // Get current page filename
+    var currentPage = currentPageName();
+
+    // Locate the current page in the tree data and expand its ancestors
+    var nodePath = findPathInTree(tree, currentPage);
+    var treeItem = nodePath ? revealNodePath(nodePath) : null;
+    var currentLink = treeItem
+      ? treeItem.querySelector(':scope > .tree-item-header a[href="' + CSS.escape(currentPage) + '"]')
+      : null;
+
+    if (treeItem) {
+      treeItem.classList.add('active');
+    }
+
+    // Restore previously expanded folders from localStorage. Parents sort
+    // before their descendants, so each folder is created before it is
+    // looked up.
     try {
       var saved = localStorage.getItem('gcovr-expanded-folders');
       if (saved) {
         var paths = JSON.parse(saved);
+        paths.sort();
         paths.forEach(function(path) {
-          var el = container.querySelector('.tree-item[data-tree-path="' + CSS.escape(path) + '"]');
+          var el = findTreeItem(container, path);
           if (el && !el.classList.contains('no-children')) {
-            el.classList.add('expanded');
-            var toggle = el.querySelector(':scope > .tree-item-header > .tree-folder-toggle');
-            if (toggle) toggle.textContent = '−';
+            setFolderExpanded(el, true);
           }
         });
       }
@@ -637,6 +793,8 @@
     var div = document.createElement('div');
     div.className = 'tree-item' + (isDirectory ? ' is-folder' : '') + (hasChildren ? '' : ' no-children');
     div.setAttribute('data-tree-path', treePath);
+    div._treeNode = item;
+    treeItemElements.set(item, div);
 
     var header = document.createElement('div');
     header.className = 'tree-item-header';
@@ -651,8 +809,7 @@
       toggle.addEventListener('click', function(e) {
         e.stopPropagation();
         e.preventDefault();
-        var isExpanded = div.classList.toggle('expanded');
-        toggle.textContent = isExpanded ? '−' : '+';
+        setFolderExpanded(div, !div.classList.contains('expanded'));
         saveExpandedFolders();
       });
       header.appendChild(toggle);
@@ -663,8 +820,7 @@
         // If clicking directly on a link, let it navigate
         if (e.target.closest('a')) return;
         e.preventDefault();
-        var isExpanded = div.classList.toggle('expanded');
-        toggle.textContent = isExpanded ? '−' : '+';
+        setFolderExpanded(div, !div.classList.contains('expanded'));
         saveExpandedFolders();
       });
     } else {
@@ -704,28 +860,200 @@
 
     div.appendChild(header);
 
-    // Children container (for expand/collapse)
-    if (hasChildren) {
-      var childrenWrapper = document.createElement('div');
-      childrenWrapper.className = 'tree-children';
+    return div;
+  }
 
-      var childrenInner = document.createElement('div');
-      childrenInner.className = 'tree-children-inner';
-      item.children.forEach(function(child) {
-        childrenInner.appendChild(createTreeItem(child, treePath));
-      });
+  // Children container (for expand/collapse), built on first expand so
+  // collapsed subtrees cost nothing at load.
+  function renderChildren(div) {
+    var item = div._treeNode;
+    if (div._childrenRendered || !item || !item.children || item.children.length === 0) return;
+    div._childrenRendered = true;
+
+    var treePath = div.getAttribute('data-tree-path');
+    var childrenWrapper = document.createElement('div');
+    childrenWrapper.className = 'tree-children';
+
+    var childrenInner = document.createElement('div');
+    childrenInner.className = 'tree-children-inner';
+    item.children.forEach(function(child) {
+      childrenInner.appendChild(createTreeItem(child, treePath));
+    });
 
-      childrenWrapper.appendChild(childrenInner);
-      div.appendChild(childrenWrapper);
-    }
+    childrenWrapper.appendChild(childrenInner);
+    div.appendChild(childrenWrapper);
+  }
 
-    return div;
+  function setFolderExpanded(div, expanded) {
+    if (expanded) renderChildren(div);
+    div.classList.toggle('expanded', expanded);
+    var toggle = div.querySelector(':scope > .tree-item-header > .tree-folder-toggle');
+    if (toggle) toggle.textContent = expanded ? '\u2212' : '+';
   }
 
   // ===========================================
   // Search
   // ===========================================
 
+  // Flat index over the processed tree, built once per page. Each entry
+  // holds the tree node, its lowercase data-tree-path and the index of
+  // its parent entry; entries are in document (DFS) order. Paths are
+  // only final after the client-side normalize/dedupe/collapse passes,
+  // so the index is built here rather than in build_tree.py.
+  function buildSearchIndex(tree) {
+    var entries = [];
+    var trigrams = new Map();
+
+    function add(nodes, parentPath, parentIdx) {
+      for (var i = 0; i < nodes.length; i++) {
+        var node = nodes[i];
+        var cleanedName = cleanPathName(node.name);
+        var treePath = parentPath ? (parentPath + '/' + cleanedName) : cleanedName;
+        var lower = treePath.toLowerCase();
+        var idx = entries.length;
+        entries.push({ node: node, path: lower, parent: parentIdx });
+
+        var seen = new Set();
+        for (var j = 0; j + 3 <= lower.length; j++) {
+          var gram = lower.substring(j, j + 3);
+          if (seen.has(gram)) continue;
+          seen.add(gram);
+          var list = trigrams.get(gram);
+          if (!list) trigrams.set(gram, list = []);
+          list.push(idx);
+        }
+
+        if (node.children && node.children.length > 0) {
+          add(node.children, treePath, idx);
+        }
+      }
+    }
+
+    add(tree, '', -1);
+    return { entries: entries, trigrams: trigrams };
+  }
+
+  // Return the ids of index entries whose path contains query. Queries of
+  // three or more characters only verify the entries listed under their
+  // rarest trigram.
+  function querySearchIndex(index, query) {
+    var candidates = null;
+    if (query.length >= 3) {
+      for (var i = 0; i + 3 <= query.length; i++) {
+        var list = index.trigrams.get(query.substring(i, i + 3));
+        if (!list) return [];
+        if (!candidates || list.length < candidates.length) candidates = list;
+      }
+    }
+
+    var matches = [];
+    var entries = index.entries;
+    if (candidates) {
+      for (var c = 0; c < candidates.length; c++) {
+        if (entries[candidates[c]].path.indexOf(query) !== -1) matches.push(candidates[c]);
+      }
+    } else {
+      for (var e = 0; e < entries.length; e++) {
+        if (entries[e].path.indexOf(query) !== -1) matches.push(e);
+      }
+    }
+    return matches;
+  }
+
+  // Full-text search over identifiers in the source pages, backed by the
+  // sharded index written by build_search_index.py. Only the manifest and
+  // the shards whose prefix can contain the query are fetched.
+  var searchManifestPromise = null;
+  var searchShardPromises = {};
+
+  function loadSearchManifest() {
+    if (!searchManifestPromise) {
+      searchManifestPromise = fetch('search/manifest.json')
+        .then(function(response) {
+          if (!response.ok) throw new Error('No search index');
+          return response.json();
+        })
+        .catch(function() {
+          return null;
+        });
+    }
+    return searchManifestPromise;
+  }
+
+  function loadSearchShard(key) {
+    if (!searchShardPromises[key]) {
+      searchShardPromises[key] = fetch('search/s-' + key + '.json')
+        .then(function(response) {
+          if (!response.ok) throw new Error('Missing search shard ' + key);
+          return response.json();
+        })
+        .catch(function() {
+          delete searchShardPromises[key];
+          return {};
+        });
+    }
+    return searchShardPromises[key];
+  }
+
+  // Resolve to the set of "fileId:line" keys for lines containing an
+  // identifier that starts with token
+  function sourceTokenLines(manifest, token) {
+    var keys = manifest.shards.filter(function(key) {
+      return token.indexOf(key) === 0 || key.indexOf(token) === 0;
+    });
+    return Promise.all(keys.map(loadSearchShard)).then(function(shards) {
+      var lines = new Set();
+      shards.forEach(function(shard) {
+        for (var indexed in shard) {
+          if (indexed.indexOf(token) !== 0) continue;
+          var byFile = shard[indexed];
+          for (var fileId in byFile) {
+            var line = 0;
+            byFile[fileId].forEach(function(delta) {
+              line += delta;
+              lines.add(fileId + ':' + line);
+            });
+          }
+        }
+      });
+      return lines;
+    });
+  }
+
+  // Resolve to [{file, line}] for source lines matching every identifier
+  // in the query (as prefixes), or null when the report has no index.
+  function searchSource(query) {
+    return loadSearchManifest().then(function(manifest) {
+      if (!manifest) return null;
+      var tokens = (query.toLowerCase().match(/[a-z_][a-z0-9_]*/g) || []).filter(function(token) {
+        return token.length >= manifest.minToken;
+      });
+      if (tokens.length === 0) return [];
+
+      return Promise.all(tokens.map(function(token) {
+        return sourceTokenLines(manifest, token);
+      })).then(function(sets) {
+        sets.sort(function(a, b) { return a.size - b.size; });
+        var results = [];
+        sets[0].forEach(function(key) {
+          for (var i = 1; i < sets.length; i++) {
+            if (!sets[i].has(key)) return;
+          }
+          var sep = key.indexOf(':');
+          results.push({
+            file: manifest.files[parseInt(key.substring(0, sep), 10)],
+            fileId: parseInt(key.substring(0, sep), 10),
+            line: parseInt(key.substring(sep + 1), 10)
+          });
+        });
+        results.sort(function(a, b) {
+          return a.fileId - b.fileId || a.line - b.line;
+        });
+        return results;
+      });
+    });
+  }
+
   function initSearch() {
     const searchInput = document.getElementById('file-search');
     const fileTree = document.getElementById('file-tree');
@@ -736,6 +1064,22 @@
     // Store pre-search expanded state so we can restore it
     var preSearchExpanded = null;
 
+    // Search index and the state of the previous query, so each search
+    // only touches the items whose visibility or highlight changed
+    var index = null;
+    var visibleIds = [];
+    var visibleFlags = null;
+    var matchedIds = [];
+    var matchedFlags = null;
+    var highlightedQuery = '';
+
+    // Where the CSS Custom Highlight API is available, matched text is
+    // highlighted with ranges over the label text instead of <mark>
+    // elements, so labels that stay matched are never rewritten
+    var rangeHighlight = window.CSS && CSS.highlights && typeof Highlight === 'function'
+      ? new Highlight() : null;
+    if (rangeHighlight) CSS.highlights.set('search-highlight', rangeHighlight);
+
     // Create no-results message
     var noResults = document.createElement('div');
     noResults.className = 'search-no-results';
@@ -743,6 +1087,123 @@
     noResults.style.display = 'none';
     fileTree.appendChild(noResults);
 
+    // Matches inside source code, filled asynchronously from the index
+    var MAX_SOURCE_RESULTS = 100;
+    var sourceResults = document.createElement('div');
+    sourceResults.className = 'search-source-results';
+    sourceResults.style.display = 'none';
+    fileTree.appendChild(sourceResults);
+    var sourceSearchSeq = 0;
+
+    function updateSourceResults(query) {
+      var seq = ++sourceSearchSeq;
+      if (query.length < 3) {
+        sourceResults.style.display = 'none';
+        sourceResults.innerHTML = '';
+        return;
+      }
+      searchSource(query).then(function(results) {
+        // Ignore responses for queries that have been superseded
+        if (seq !== sourceSearchSeq) return;
+        sourceResults.innerHTML = '';
+        if (!results || results.length === 0) {
+          sourceResults.style.display = 'none';
+          return;
+        }
+
+        var fragment = document.createDocumentFragment();
+        var heading = document.createElement('div');
+        heading.className = 'search-source-heading';
+        heading.textContent = 'In source (' + results.length + ')';
+        fragment.appendChild(heading);
+
+        results.slice(0, MAX_SOURCE_RESULTS).forEach(function(result) {
+          var a = document.createElement('a');
+          a.className = 'search-source-result';
+          a.href = result.file.link + '#l' + result.line;
+          a.title = result.file.name + ':' + result.line;
+          var name = document.createElement('span');
+          name.className = 'search-source-file';
+          name.textContent = result.file.name;
+          var line = document.createElement('span');
+          line.className = 'search-source-line';
+          line.textContent = ':' + result.line;
+          a.appendChild(name);
+          a.appendChild(line);
+          fragment.appendChild(a);
+        });
+
+        if (results.length > MAX_SOURCE_RESULTS) {
+          var more = document.createElement('div');
+          more.className = 'search-source-more';
+          more.textContent = (results.length - MAX_SOURCE_RESULTS) + ' more, refine the query';
+          fragment.appendChild(more);
+        }
+
+        sourceResults.appendChild(fragment);
+        sourceResults.style.display = '';
+      });
+    }
+
+    function getIndex() {
+      if (index) return index;
+      if (window.GCOVR_TREE_DATA) {
+        index = buildSearchIndex(window.GCOVR_TREE_DATA);
+      } else {
+        // Static sidebar from the Jinja template: index the rendered items
+        index = { entries: [], trigrams: new Map() };
+        fileTree.querySelectorAll('.tree-item').forEach(function(item) {
+          var label = item.querySelector(':scope > .tree-item-header > .tree-label');
+          index.entries.push({
+            node: null,
+            element: item,
+            path: (label ? label.textContent : '').trim().toLowerCase(),
+            parent: -1
+          });
+        });
+      }
+      visibleFlags = new Uint8Array(index.entries.length);
+      matchedFlags = new Uint8Array(index.entries.length);
+      return index;
+    }
+
+    // Return the tree item for an index entry, creating it (and its
+    // ancestors) if its folder has not been expanded yet.
+    function entryElement(id, create) {
+      var entry = index.entries[id];
+      if (entry.element) return entry.element;
+      var el = treeItemElements.get(entry.node);
+      if (el || !create) return el || null;
+      if (entry.parent === -1) return null;
+      var parentEl = entryElement(entry.parent, true);
+      if (!parentEl) return null;
+      renderChildren(parentEl);
+      return treeItemElements.get(entry.node) || null;
+    }
+
+    function labelTarget(item) {
+      var label = item.querySelector(':scope > .tree-item-header > .tree-label');
+      if (!label) return null;
+      return label.querySelector('a') || label;
+    }
+
+    function unmarkMatch(id) {
+      matchedFlags[id] = 0;
+      var el = entryElement(id, false);
+      if (!el) return;
+      el.classList.remove('search-match');
+      var target = labelTarget(el);
+      // Assigning textContent drops the <mark> elements
+      if (target && !rangeHighlight) target.textContent = target.textContent;
+    }
+
+    function clearMatches() {
+      matchedIds.forEach(unmarkMatch);
+      matchedIds = [];
+      highlightedQuery = '';
+      if (rangeHighlight) rangeHighlight.clear();
+    }
+
     function updateClearButton() {
       if (searchContainer) {
         searchContainer.classList.toggle('has-query', searchInput.value.trim() !== '');
@@ -782,140 +1243,160 @@
       searchInput.value = savedSearch;
       updateClearButton();
       performSearch(savedSearch);
+    } else {
+      // Build the index while idle so the first keystroke does not pay for it
+      var whenIdle = window.requestIdleCallback || function(fn) { return setTimeout(fn, 200); };
+      whenIdle(getIndex);
     }
 
     function performSearch(value) {
       var query = value.toLowerCase().trim();
-      var allItems = fileTree.querySelectorAll('.tree-item');
 
-      // Clear all highlights
-      fileTree.querySelectorAll('.search-highlight').forEach(function(mark) {
-        var parent = mark.parentNode;
-        parent.replaceChild(document.createTextNode(mark.textContent), mark);
-        parent.normalize();
-      });
+      updateSourceResults(query);
 
       // If query is empty, restore original state
       if (query === '') {
+        clearMatches();
         noResults.style.display = 'none';
-        allItems.forEach(function(item) {
-          item.style.display = '';
-          item.classList.remove('search-match');
+        fileTree.classList.remove('searching');
+        visibleIds.forEach(function(id) {
+          visibleFlags[id] = 0;
+          var el = entryElement(id, false);
+          if (el) el.classList.remove('search-visible');
         });
+        visibleIds = [];
         // Restore pre-search expanded state
         if (preSearchExpanded !== null) {
-          allItems.forEach(function(item) {
-            var path = item.getAttribute('data-tree-path');
-            var toggle = item.querySelector(':scope > .tree-item-header > .tree-folder-toggle');
-            if (toggle) {
-              if (preSearchExpanded.indexOf(path) >= 0) {
-                item.classList.add('expanded');
-                toggle.textContent = '\u2212';
-              } else {
-                item.classList.remove('expanded');
-                toggle.textContent = '+';
-              }
+          var keep = new Set(preSearchExpanded);
+          fileTree.querySelectorAll('.tree-item.expanded').forEach(function(item) {
+            if (!keep.has(item.getAttribute('data-tree-path'))) {
+              setFolderExpanded(item, false);
             }
           });
+          preSearchExpanded.forEach(function(path) {
+            var el = findTreeItem(fileTree, path);
+            if (el) setFolderExpanded(el, true);
+          });
           preSearchExpanded = null;
         }
         return;
       }
 
+      var idx = getIndex();
+
       // Save expanded state before first search
       if (preSearchExpanded === null) {
         preSearchExpanded = [];
-        allItems.forEach(function(item) {
-          if (item.classList.contains('expanded')) {
-            preSearchExpanded.push(item.getAttribute('data-tree-path'));
-          }
+        fileTree.querySelectorAll('.tree-item.expanded').forEach(function(item) {
+          preSearchExpanded.push(item.getAttribute('data-tree-path'));
         });
       }
 
-      // Determine which items match (check full path and display name)
-      var matchSet = new Set();
-
-      allItems.forEach(function(item) {
-        var path = (item.getAttribute('data-tree-path') || '').toLowerCase();
-        var label = item.querySelector(':scope > .tree-item-header > .tree-label');
-        var text = label ? label.textContent.toLowerCase() : '';
-        if (path.includes(query) || text.includes(query)) {
-          matchSet.add(item);
+      // Matches plus all of their ancestors are visible
+      var matches = querySearchIndex(idx, query);
+      var nextFlags = new Uint8Array(idx.entries.length);
+      var nextVisible = [];
+      matches.forEach(function(id) {
+        while (id !== -1 && !nextFlags[id]) {
+          nextFlags[id] = 1;
+          nextVisible.push(id);
+          id = idx.entries[id].parent;
         }
       });
 
-      // Also mark all ancestor items of matches as visible
-      var visibleSet = new Set(matchSet);
-      matchSet.forEach(function(item) {
-        var parent = item.parentElement;
-        while (parent && parent !== fileTree) {
-          if (parent.classList && parent.classList.contains('tree-item')) {
-            visibleSet.add(parent);
-          }
-          parent = parent.parentElement;
-        }
+      // Items rendered while searching stay hidden unless marked visible
+      fileTree.classList.add('searching');
+
+      visibleIds.forEach(function(id) {
+        if (nextFlags[id]) return;
+        var el = entryElement(id, false);
+        if (el) el.classList.remove('search-visible');
       });
 
-      // Apply visibility, expand parents of matches, highlight text
-      var anyVisible = false;
-      allItems.forEach(function(item) {
-        var isVisible = visibleSet.has(item);
-        item.style.display = isVisible ? '' : 'none';
-        item.classList.toggle('search-match', matchSet.has(item));
-
-        if (isVisible) {
-          anyVisible = true;
-          // Auto-expand folders that contain matches
-          var toggle = item.querySelector(':scope > .tree-item-header > .tree-folder-toggle');
-          if (toggle && visibleSet.has(item) && !matchSet.has(item) || (toggle && matchSet.has(item) && item.classList.contains('is-folder'))) {
-            item.classList.add('expanded');
-            toggle.textContent = '\u2212';
-          }
+      // Ancestors are reached before descendants, so parents are expanded
+      // (and their children created) before the children are looked up
+      nextVisible.sort(function(a, b) { return a - b; });
+      nextVisible.forEach(function(id) {
+        if (visibleFlags[id]) return;
+        var el = entryElement(id, true);
+        if (!el) return;
+        el.classList.add('search-visible');
+        // Auto-expand folders that are visible (they contain or are matches)
+        if (!el.classList.contains('no-children')) {
+          setFolderExpanded(el, true);
         }
+      });
 
-        // Highlight matched text in label
-        if (matchSet.has(item)) {
-          var label = item.querySelector(':scope > .tree-item-header > .tree-label');
-          if (label) {
-            highlightText(label, query);
-          }
-        }
+      visibleFlags = nextFlags;
+      visibleIds = nextVisible;
+
+      // Only items that left or entered the matched set change class;
+      // <mark>s of items that stay matched are redone only when the query
+      // changed, and ranges are rebuilt without touching the DOM
+      var nextMatched = new Uint8Array(idx.entries.length);
+      matches.forEach(function(id) { nextMatched[id] = 1; });
+      matchedIds.forEach(function(id) {
+        if (!nextMatched[id]) unmarkMatch(id);
       });
+      if (rangeHighlight) rangeHighlight.clear();
+      matches.forEach(function(id) {
+        var entered = !matchedFlags[id];
+        if (!entered && !rangeHighlight && query === highlightedQuery) return;
+        var el = entryElement(id, true);
+        if (!el) return;
+        if (entered) el.classList.add('search-match');
+        var target = labelTarget(el);
+        if (target) highlightText(target, query);
+      });
+      matchedFlags = nextMatched;
+      matchedIds = matches;
+      highlightedQuery = query;
+
+      noResults.style.display = matches.length > 0 ? 'none' : '';
+    }
 
-      noResults.style.display = anyVisible ? 'none' : '';
+    function highlightRanges(container, query) {
+      var node = container.firstChild;
+      if (!node || node.nodeType !== Node.TEXT_NODE) return;
+      var lowerText = node.data.toLowerCase();
+      var idx = lowerText.indexOf(query);
+      while (idx !== -1) {
+        var range = document.createRange();
+        range.setStart(node, idx);
+        range.setEnd(node, idx + query.length);
+        rangeHighlight.add(range);
+        idx = lowerText.indexOf(query, idx + query.length);
+      }
     }
 
     function highlightText(container, query) {
-      // Walk text nodes inside the label (may be inside an <a> tag)
-      var walker = document.createTreeWalker(container, NodeFilter.SHOW_TEXT, null, false);
-      var textNodes = [];
-      while (walker.nextNode()) {
-        textNodes.push(walker.currentNode);
+      if (rangeHighlight) {
+        highlightRanges(container, query);
+        return;
       }
-      textNodes.forEach(function(node) {
-        var text = node.textContent;
-        var lowerText = text.toLowerCase();
-        var idx = lowerText.indexOf(query);
-        if (idx === -1) return;
-
-        var frag = document.createDocumentFragment();
-        var lastIdx = 0;
-        while (idx !== -1) {
-          if (idx > lastIdx) {
-            frag.appendChild(document.createTextNode(text.substring(lastIdx, idx)));
-          }
-          var mark = document.createElement('mark');
-          mark.className = 'search-highlight';
-          mark.textContent = text.substring(idx, idx + query.length);
-          frag.appendChild(mark);
-          lastIdx = idx + query.length;
-          idx = lowerText.indexOf(query, lastIdx);
-        }
-        if (lastIdx < text.length) {
-          frag.appendChild(document.createTextNode(text.substring(lastIdx)));
+      var text = container.textContent;
+      var lowerText = text.toLowerCase();
+      var idx = lowerText.indexOf(query);
+      if (idx === -1) return;
+
+      var frag = document.createDocumentFragment();
+      var lastIdx = 0;
+      while (idx !== -1) {
+        if (idx > lastIdx) {
+          frag.appendChild(document.createTextNode(text.substring(lastIdx, idx)));
         }
-        node.parentNode.replaceChild(frag, node);
-      });
+        var mark = document.createElement('mark');
+        mark.className = 'search-highlight';
+        mark.textContent = text.substring(idx, idx + query.length);
+        frag.appendChild(mark);
+        lastIdx = idx + query.length;
+        idx = lowerText.indexOf(query, lastIdx);
+      }
+      if (lastIdx < text.length) {
+        frag.appendChild(document.createTextNode(text.substring(lastIdx)));
+      }
+      container.textContent = '';
+      container.appendChild(frag);
     }
   }
 
@@ -948,36 +1429,159 @@
     sortList('filename', true);
   }
 
+  // Shared collator: same ordering as localeCompare without per-call setup
+  var sortCollator = new Intl.Collator();
+
   function sortList(key, ascending) {
     const container = document.getElementById('file-list') || document.querySelector('.functions-body');
     if (!container) return;
 
     const rows = Array.from(container.children);
+    const n = rows.length;
+
+    // Decorate: read each row's sort key from the DOM once
+    var isDir = new Uint8Array(n);
+    var nums = new Float64Array(n);
+    var strs = new Array(n);
+    for (var i = 0; i < n; i++) {
+      var row = rows[i];
+      var sortEl;
+      var val = row.dataset[key] ||
+        ((sortEl = row.querySelector('[data-sort]')) ? sortEl.dataset.sort : '') || '';
+      isDir[i] = row.classList.contains('directory') ? 1 : 0;
+      nums[i] = parseFloat(val);
+      strs[i] = val;
+    }
 
-    rows.sort(function(a, b) {
+    function compare(a, b) {
       // Directories always come first
-      const aIsDir = a.classList.contains('directory');
-      const bIsDir = b.classList.contains('directory');
-      if (aIsDir && !bIsDir) return -1;
-      if (!aIsDir && bIsDir) return 1;
+      if (isDir[a] !== isDir[b]) return isDir[b] - isDir[a];
 
-      let aVal = a.dataset[key] || a.querySelector('[data-sort]')?.dataset.sort || '';
-      let bVal = b.dataset[key] || b.querySelector('[data-sort]')?.dataset.sort || '';
+      // Compare as numbers when both parse
+      if (!isNaN(nums[a]) && !isNaN(nums[b])) {
+        return ascending ? nums[a] - nums[b] : nums[b] - nums[a];
+      }
 
-      // Try to parse as numbers
-      const aNum = parseFloat(aVal);
-      const bNum = parseFloat(bVal);
+      // String comparison
+      return ascending ? sortCollator.compare(strs[a], strs[b]) : sortCollator.compare(strs[b], strs[a]);
+    }
 
-      if (!isNaN(aNum) && !isNaN(bNum)) {
-        return ascending ? aNum - bNum : bNum - aNum;
+    // Rows already in order (e.g. the initial sort of a server-sorted
+    // page) need no DOM writes at all
+    var sorted = true;
+    for (var j = 1; j < n; j++) {
+      if (compare(j - 1, j) > 0) {
+        sorted = false;
+        break;
       }
+    }
+    if (sorted) return;
 
-      // String comparison
-      return ascending ? aVal.localeCompare(bVal) : bVal.localeCompare(aVal);
+    var order = new Uint32Array(n);
+    for (var k = 0; k < n; k++) order[k] = k;
+    order.sort(compare);
+
+    // Undecorate: move the rows in a single append
+    var fragment = document.createDocumentFragment();
+    for (var m = 0; m < n; m++) {
+      fragment.appendChild(rows[order[m]]);
+    }
+    container.appendChild(fragment);
+  }
+
+  // ===========================================
+  // Compact Source Pages
+  // ===========================================
+
+  // Compact pages (build_compact_pages.py) replace runs of lines without
+  // uncovered code by gap rows. Clicking a gap pulls those rows from the
+  // full page; where fetch is unavailable (file://) it opens the full
+  // page at the first hidden line instead.
+  function initCompactGaps() {
+    var table = document.querySelector('.source-table.compact[data-full-page]');
+    if (!table) return;
+
+    var fullPage = table.getAttribute('data-full-page');
+    var fullDocPromise = null;
+
+    function loadFullPage() {
+      if (!fullDocPromise) {
+        fullDocPromise = fetch(fullPage)
+          .then(function(response) {
+            if (!response.ok) throw new Error('Cannot load ' + fullPage);
+            return response.text();
+          })
+          .then(function(text) {
+            return new DOMParser().parseFromString(text, 'text/html');
+          });
+      }
+      return fullDocPromise;
+    }
+
+    table.addEventListener('click', function(e) {
+      var button = e.target.closest('.gap-expand');
+      if (!button) return;
+      var gap = button.closest('.gap-row');
+      var from = parseInt(gap.getAttribute('data-from'), 10);
+      var to = parseInt(gap.getAttribute('data-to'), 10);
+      button.disabled = true;
+
+      loadFullPage()
+        .then(function(doc) {
+          var fragment = document.createDocumentFragment();
+          for (var n = from; n <= to; n++) {
+            var anchor = doc.getElementById('l' + n);
+            var row = anchor ? anchor.closest('tr') : null;
+            if (row) fragment.appendChild(document.importNode(row, true));
+          }
+          gap.parentNode.replaceChild(fragment, gap);
+        })
+        .catch(function() {
+          window.location.href = fullPage + '#l' + from;
+        });
     });
+  }
+
+  // ===========================================
+  // Template Instantiation Groups
+  // ===========================================
+
+  // aggregate_functions.py folds the instantiations of a function template
+  // into one row and moves their rows to a fragment, fetched the first time
+  // the group is expanded. Where fetch is unavailable (file://) the button
+  // opens the function's source instead.
+  function initFunctionGroups() {
+    var body = document.querySelector('.functions-body');
+    if (!body) return;
+
+    body.addEventListener('click', function(e) {
+      var button = e.target.closest('.instances-toggle');
+      if (!button) return;
+      var row = button.closest('.function-group');
+      var instances = row.querySelector('.function-instances');
+
+      if (instances.dataset.loaded) {
+        instances.hidden = !instances.hidden;
+        button.setAttribute('aria-expanded', String(!instances.hidden));
+        return;
+      }
 
-    rows.forEach(function(row) {
-      container.appendChild(row);
+      button.disabled = true;
+      fetch(row.getAttribute('data-instances-page'))
+        .then(function(response) {
+          if (!response.ok) throw new Error('Cannot load instances');
+          return response.text();
+        })
+        .then(function(text) {
+          instances.innerHTML = text;
+          instances.dataset.loaded = 'true';
+          instances.hidden = false;
+          button.setAttribute('aria-expanded', 'true');
+          button.disabled = false;
+        })
+        .catch(function() {
+          window.location.href = row.querySelector('.col-function a').getAttribute('href');
+        });
     });
   }
 
@@ -986,37 +1590,32 @@
   // ===========================================
 
   function initToggleButtons() {
-    const buttons = document.querySelectorAll('.button_toggle_coveredLine, .button_toggle_uncoveredLine, .button_toggle_partialCoveredLine, .button_toggle_excludedLine');
+    const buttons = document.querySelectorAll('.button_toggle_coveredLine, .button_toggle_uncoveredLine, .button_toggle_partialCoveredLine, .button_toggle_excludedLine, .btn-toggle');
+
+    // The header buttons carry the line class in value, the simpler
+    // toggle buttons in a data attribute (persists after toggle)
+    function lineClassOf(button) {
+      return button.dataset.lineClass || button.value;
+    }
 
     buttons.forEach(function(button) {
       button.addEventListener('click', function() {
-        const lineClass = this.value;
+        const lineClass = lineClassOf(this);
+        if (!lineClass) return;
         const showClass = 'show_' + lineClass;
+        const show = !this.classList.contains(showClass);
 
-        // Toggle the button state
-        this.classList.toggle(showClass);
-
-        // Toggle visibility of lines
-        const lines = document.querySelectorAll('.' + lineClass);
-        lines.forEach(function(line) {
-          line.classList.toggle(showClass);
+        // One state class per table; style.css does the rest, so the
+        // cost does not depend on the number of lines
+        document.querySelectorAll('.source-table').forEach(function(table) {
+          table.classList.toggle('hide_' + lineClass, !show);
         });
-      });
-    });
-
-    // Also handle simpler toggle buttons
-    const simpleToggles = document.querySelectorAll('.btn-toggle');
-    simpleToggles.forEach(function(button) {
-      button.addEventListener('click', function() {
-        // Use data attribute to get line class (persists after toggle)
-        const lineClass = this.dataset.lineClass;
-        if (!lineClass) return;
 
-        const showClass = 'show_' + lineClass;
-        this.classList.toggle(showClass);
-        const lines = document.querySelectorAll('.' + lineClass);
-        lines.forEach(function(line) {
-          line.classList.toggle(showClass);
+        // Keep every button for this line class in sync
+        buttons.forEach(function(other) {
+          if (lineClassOf(other) === lineClass) {
+            other.classList.toggle(showClass, show);
+          }
         });
       });
     });